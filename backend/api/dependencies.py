@@ -0,0 +1,60 @@
+from fastapi import Request
+from core.container import AppContainer
+from services.advanced_analysis_service import AnalysisPipelineService
+from services.analytics_service import AnalyticsService
+from services.export_service import ResultsExporter
+from services.job_queue_service import AnalysisJobQueue, AnalysisWorkerPool
+from services.llm_calls import LLMCallPolicy
+from services.llm_scheduler import LLMScheduler
+from services.llm_usage_service import LLMUsageRecorder
+from services.scenario_service import ScenarioService
+from services.storage_service import StorageService
+from services.transcription_service import TranscriptionService
+
+
+def get_container(request: Request) -> AppContainer:
+    return request.app.state.container
+
+
+def get_scenario_service(request: Request) -> ScenarioService:
+    return get_container(request).scenario_service
+
+
+def get_storage_service(request: Request) -> StorageService:
+    return get_container(request).storage_service
+
+
+def get_analysis_service(request: Request) -> AnalysisPipelineService:
+    return get_container(request).analysis_service
+
+
+def get_transcription_service(request: Request) -> TranscriptionService:
+    return get_container(request).transcription_service
+
+
+def get_analytics_service(request: Request) -> AnalyticsService:
+    return get_container(request).analytics_service
+
+
+def get_results_exporter(request: Request) -> ResultsExporter:
+    return get_container(request).results_exporter
+
+
+def get_job_queue(request: Request) -> AnalysisJobQueue:
+    return get_container(request).job_queue
+
+
+def get_job_workers(request: Request) -> AnalysisWorkerPool:
+    return get_container(request).job_workers
+
+
+def get_llm_usage(request: Request) -> LLMUsageRecorder:
+    return get_container(request).storage_service.llm_usage
+
+
+def get_llm_scheduler(request: Request) -> LLMScheduler:
+    return get_container(request).llm_scheduler
+
+
+def get_llm_calls(request: Request) -> LLMCallPolicy:
+    return get_container(request).llm_calls
@@ -0,0 +1,51 @@
+import time
+from starlette.datastructures import MutableHeaders
+from core.metrics import REQUEST_DURATION, server_timing_header, start_request_timings
+
+
+class ServerTimingMiddleware:
+    """
+    Records request latency by route and collects the spans of each request.
+
+    With `header=True` the spans are summed per stage into a Server-Timing
+    response header. For streaming responses the header is sent with the
+    first bytes, so it covers only the stages finished before streaming began.
+    """
+
+    def __init__(self, app, header: bool = False):
+        self.app = app
+        self.header = header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings = start_request_timings()
+        responded = False
+
+        def observe(status: int) -> float:
+            elapsed = time.perf_counter() - started
+            # The route template rather than the path, so job ids etc. don't become separate series
+            route = scope.get("route")
+            REQUEST_DURATION.observe(
+                elapsed, method=scope["method"], route=getattr(route, "path", "unmatched"), status=status
+            )
+            return elapsed
+
+        async def send_with_timing(message):
+            nonlocal responded
+            if message["type"] == "http.response.start":
+                responded = True
+                elapsed = observe(message["status"])
+                if self.header:
+                    MutableHeaders(scope=message).append("Server-Timing", server_timing_header(timings, elapsed))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except Exception:
+            if not responded:
+                observe(500)
+            raise
@@ -1,20 +1,32 @@
+import asyncio
+import json
 from enum import EnumType
-from fastapi import APIRouter, HTTPException, Body
-from pydantic import BaseModel
-from core.models import PracticeAttempt, FeedbackAnalysis,InputType
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Body, Response
+from pydantic import BaseModel, Field, HttpUrl
+from core.config import settings
+from core.models import AnalysisJob, JobStatus, PracticeAttempt, FeedbackAnalysis,InputType, new_attempt_id
 from fastapi import UploadFile, File
-from services.transcription_service import TranscriptionService
-# Import the new pipeline service
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from api.dependencies import (
+    get_analysis_service, get_job_queue, get_job_workers, get_llm_calls, get_llm_scheduler, get_scenario_service,
+    get_storage_service, get_transcription_service
+)
+from services.job_queue_service import AnalysisJobQueue, AnalysisWorkerPool, CallbackURLError, check_callback_url
+from services.llm_calls import LLMCallPolicy
+from services.llm_scheduler import LLMOverloadedError, LLMScheduler
+from services.transcription_service import AudioTooLargeError, TranscriptionService
 from services.advanced_analysis_service import AnalysisPipelineService
 from services.scenario_service import ScenarioService
 from services.storage_service import StorageService
 
 router = APIRouter()
-# Instantiate the new pipeline service
-analysis_service = AnalysisPipelineService()
-scenario_service = ScenarioService()
-storage_service = StorageService()
-transcription_service = TranscriptionService()
+
+
+async def _save_failed_usage(storage_service: StorageService, attempts: List[tuple]):
+    """Write the LLM calls of (attempt_id, scenario_id, user_id) attempts whose analysis failed"""
+    await run_in_threadpool(storage_service.llm_usage.save_failed, attempts)
 
 
 class PracticeRequest(BaseModel):
@@ -22,78 +34,362 @@ class PracticeRequest(BaseModel):
     user_response: str
     user_id: str = "default_user"
 
+
+class JobRequest(PracticeRequest):
+    callback_url: Optional[HttpUrl] = None
+
+
+class BatchPracticeRequest(BaseModel):
+    items: List[PracticeRequest] = Field(..., min_length=1)
+    max_concurrency: Optional[int] = Field(None, ge=1)
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    scenario_id: str
+    user_id: str
+    feedback: Optional[FeedbackAnalysis] = None
+    error: Optional[str] = None
+
+
+class BatchPracticeResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchItemResult]
+
 @router.post("/submit", response_model=FeedbackAnalysis)
-async def submit_practice(request: PracticeRequest):
+async def submit_practice(
+    request: PracticeRequest,
+    analysis_service: AnalysisPipelineService = Depends(get_analysis_service),
+    scenario_service: ScenarioService = Depends(get_scenario_service),
+    storage_service: StorageService = Depends(get_storage_service)
+):
     """Submit a practice attempt and receive AI feedback from the pipeline."""
+    attempt = PracticeAttempt(
+        scenario_id=request.scenario_id,
+        user_response=request.user_response,
+        user_id=request.user_id
+    )
     try:
-        attempt = PracticeAttempt(
-            scenario_id=request.scenario_id,
-            user_response=request.user_response,
-            user_id=request.user_id
-        )
         scenario = scenario_service.get_scenario(attempt.scenario_id)
         if not scenario:
             raise HTTPException(status_code=404, detail="Scenario not found")
 
         # Use the new AnalysisPipelineService
-        feedback = analysis_service.analyze_response(
+        feedback = await analysis_service.analyze_response_async(
             attempt_id=attempt.id,
             scenario=scenario,
             user_response=attempt.user_response,
-            user_id=attempt.user_id # user_id is passed but not used in this version
+            user_id=attempt.user_id
         )
         
-        storage_service.save_attempt(attempt)
-        storage_service.save_feedback(feedback)
+        await run_in_threadpool(storage_service.save_result, attempt, feedback)
         
         return feedback
         
+    except (HTTPException, LLMOverloadedError):
+        # 404s and 503s pass through as they are
+        await _save_failed_usage(storage_service, [(attempt.id, attempt.scenario_id, attempt.user_id)])
+        raise
     except Exception as e:
         print(f"An error occurred in submit_practice: {e}")
+        await _save_failed_usage(storage_service, [(attempt.id, attempt.scenario_id, attempt.user_id)])
         raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
 
+def _sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _stream_payload(name: str, result) -> tuple:
+    """Map a pipeline stage to its SSE event, keyed like FeedbackAnalysis so clients can merge them"""
+    if name == "medical":
+        return "medical_accuracy", {"medical_accuracy": result.model_dump()}
+    if name == "combined_communication":
+        return "communication", {
+            "communication_clarity": result.clarity.model_dump(),
+            "empathy_tone": result.empathy.model_dump(),
+            "completeness": result.completeness.model_dump()
+        }
+    return name, result.model_dump(mode="json")
+
+@router.post("/submit_stream")
+async def submit_practice_stream(
+    request: PracticeRequest,
+    analysis_service: AnalysisPipelineService = Depends(get_analysis_service),
+    scenario_service: ScenarioService = Depends(get_scenario_service),
+    storage_service: StorageService = Depends(get_storage_service)
+):
+    """
+    Submit a practice attempt and stream the feedback as Server-Sent Events.
+
+    Emits `medical_accuracy` and `communication` as each specialist finishes,
+    then `feedback` with the weighted FeedbackAnalysis once it is saved, or
+    `error` if the analysis fails.
+    """
+    scenario = scenario_service.get_scenario(request.scenario_id)
+    if not scenario:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    attempt = PracticeAttempt(
+        scenario_id=request.scenario_id,
+        user_response=request.user_response,
+        user_id=request.user_id
+    )
+
+    async def events():
+        try:
+            async for name, result in analysis_service.analyze_response_stream(
+                attempt_id=attempt.id,
+                scenario=scenario,
+                user_response=attempt.user_response,
+                user_id=attempt.user_id
+            ):
+                if name == "feedback":
+                    await run_in_threadpool(storage_service.save_result, attempt, result)
+                yield _sse_event(*_stream_payload(name, result))
+        except LLMOverloadedError as e:
+            await _save_failed_usage(storage_service, [(attempt.id, attempt.scenario_id, attempt.user_id)])
+            yield _sse_event("error", {"detail": f"The analysis service is busy, please retry: {e}",
+                                       "retry_after": e.retry_after_header})
+        except Exception as e:
+            print(f"An error occurred in submit_practice_stream: {e}")
+            await _save_failed_usage(storage_service, [(attempt.id, attempt.scenario_id, attempt.user_id)])
+            yield _sse_event("error", {"detail": f"An internal error occurred: {e}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/submit_batch", response_model=BatchPracticeResponse)
+async def submit_practice_batch(
+    request: BatchPracticeRequest,
+    analysis_service: AnalysisPipelineService = Depends(get_analysis_service),
+    scenario_service: ScenarioService = Depends(get_scenario_service),
+    storage_service: StorageService = Depends(get_storage_service)
+):
+    """Analyze many practice attempts in one call and save them together. Errors are reported per item."""
+    if len(request.items) > settings.batch_max_items:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {settings.batch_max_items} items")
+    max_concurrency = min(request.max_concurrency or settings.batch_max_concurrency, settings.batch_max_concurrency)
+
+    results = [
+        BatchItemResult(index=index, scenario_id=item.scenario_id, user_id=item.user_id)
+        for index, item in enumerate(request.items)
+    ]
+    scenarios = {
+        scenario_id: scenario_service.get_scenario(scenario_id)
+        for scenario_id in {item.scenario_id for item in request.items}
+    }
+
+    attempts, submissions = [], []
+    for index, item in enumerate(request.items):
+        scenario = scenarios[item.scenario_id]
+        if not scenario:
+            results[index].error = "Scenario not found"
+            continue
+        attempt = PracticeAttempt(scenario_id=item.scenario_id, user_response=item.user_response, user_id=item.user_id)
+        attempts.append((index, attempt))
+        submissions.append((attempt.id, scenario, attempt.user_response, attempt.user_id))
+
+    try:
+        analyses = await analysis_service.analyze_batch_async(submissions, max_concurrency=max_concurrency)
+    except Exception as e:
+        print(f"An error occurred in submit_practice_batch: {e}")
+        await _save_failed_usage(storage_service, [
+            (attempt.id, attempt.scenario_id, attempt.user_id) for _, attempt in attempts
+        ])
+        raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
+
+    to_save, failed_attempts = [], []
+    for (index, attempt), analysis in zip(attempts, analyses):
+        if isinstance(analysis, Exception):
+            print(f"Batch item {index} failed: {analysis}")
+            results[index].error = f"Analysis failed: {analysis}"
+            failed_attempts.append((attempt.id, attempt.scenario_id, attempt.user_id))
+        else:
+            to_save.append((index, attempt, analysis))
+    if failed_attempts:
+        await _save_failed_usage(storage_service, failed_attempts)
+
+    if to_save and not await run_in_threadpool(
+        storage_service.save_results, [(attempt, feedback) for _, attempt, feedback in to_save]
+    ):
+        for index, _, _ in to_save:
+            results[index].error = "Could not save result"
+    else:
+        for index, _, feedback in to_save:
+            results[index].feedback = feedback
+
+    failed = sum(1 for result in results if result.error)
+    return BatchPracticeResponse(succeeded=len(results) - failed, failed=failed, results=results)
+
+@router.post("/jobs", response_model=AnalysisJob, status_code=202)
+async def submit_practice_job(
+    request: JobRequest,
+    job_queue: AnalysisJobQueue = Depends(get_job_queue),
+    job_workers: AnalysisWorkerPool = Depends(get_job_workers),
+    scenario_service: ScenarioService = Depends(get_scenario_service)
+):
+    """Queue a practice attempt for analysis and return immediately.
+
+    Poll GET /jobs/{job_id} for the result, or pass callback_url to have the
+    finished job POSTed to you (https, on a host in JOB_WEBHOOK_ALLOWED_HOSTS).
+    """
+    if not scenario_service.get_scenario(request.scenario_id):
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    attempt = PracticeAttempt(
+        scenario_id=request.scenario_id,
+        user_response=request.user_response,
+        user_id=request.user_id
+    )
+    callback_url = str(request.callback_url) if request.callback_url else None
+    if callback_url:
+        try:
+            await run_in_threadpool(check_callback_url, callback_url)
+        except CallbackURLError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    job = await run_in_threadpool(job_queue.enqueue, attempt, callback_url)
+    job_workers.notify()
+    return job
+
+@router.get("/jobs")
+async def get_job_queue_stats(
+    job_queue: AnalysisJobQueue = Depends(get_job_queue),
+    job_workers: AnalysisWorkerPool = Depends(get_job_workers)
+):
+    """Job counts by status and the number of in-process workers"""
+    counts = await run_in_threadpool(job_queue.counts)
+    return {"jobs": counts, "in_process_workers": job_workers.concurrency if job_workers.running else 0}
+
+@router.get("/jobs/{job_id}", response_model=AnalysisJob)
+async def get_practice_job(
+    job_id: str,
+    job_queue: AnalysisJobQueue = Depends(get_job_queue),
+    storage_service: StorageService = Depends(get_storage_service)
+):
+    """Status of an analysis job, with its feedback once it has succeeded"""
+    job = await run_in_threadpool(job_queue.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == JobStatus.SUCCEEDED:
+        job.feedback = await run_in_threadpool(storage_service.get_feedback_by_attempt_id, job.attempt_id)
+    return job
+
 @router.post("/submit_voice", response_model=FeedbackAnalysis)
 async def submit_practice_voice(
     scenario_id: str = File(...),
     user_id: str = File(...),
-    audio_file: UploadFile = File(...)
+    audio_file: UploadFile = File(...),
+    response: Response = None,
+    analysis_service: AnalysisPipelineService = Depends(get_analysis_service),
+    scenario_service: ScenarioService = Depends(get_scenario_service),
+    storage_service: StorageService = Depends(get_storage_service),
+    transcription_service: TranscriptionService = Depends(get_transcription_service)
 ):
     """
     Submit a voice-based practice attempt, transcribe it, and receive AI feedback.
     """
+    scenario = scenario_service.get_scenario(scenario_id)
+    if not scenario:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+
+    # Weights and the user's history don't depend on the transcript, so resolve them
+    # while transcribing; only the specialist chains wait for the text
+    context_task = asyncio.create_task(analysis_service.prepare_analysis(scenario, user_id))
+    # Retrieve the task's outcome even if the request fails before awaiting it
+    context_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+    attempt_id = new_attempt_id()
     try:
-        # 1. Transcribe the audio file to get the user's response text
-        user_response_text = await transcription_service.transcribe_audio(audio_file)
+        # 1. Transcribe the audio file to get the user's response text (re-sent audio hits the cache)
+        user_response_text, cache_hit = await transcription_service.transcribe_upload(audio_file, attempt_id)
+        response.headers["X-Transcript-Cache"] = "hit" if cache_hit else "miss"
 
         if not user_response_text:
             raise HTTPException(status_code=400, detail="Audio could not be transcribed or was empty.")
 
         # 2. Now, proceed with the existing logic using the transcribed text
         attempt = PracticeAttempt(
+            id=attempt_id,
             scenario_id=scenario_id,
             user_response=user_response_text,
             user_id=user_id,
             input_type=InputType.VOICE # Set the input type to voice
         )
-        
-        scenario = scenario_service.get_scenario(attempt.scenario_id)
-        if not scenario:
-            raise HTTPException(status_code=404, detail="Scenario not found")
 
         # 3. Reuse your entire advanced analysis pipeline
-        feedback = analysis_service.analyze_response(
+        feedback = await analysis_service.analyze_response_async(
             attempt_id=attempt.id,
             scenario=scenario,
             user_response=attempt.user_response,
-            user_id=attempt.user_id
+            user_id=attempt.user_id,
+            context=await context_task
         )
         
-        # 4. Save the results as usual
-        storage_service.save_attempt(attempt)
-        storage_service.save_feedback(feedback)
+        # 4. Save the results as usual (off the event loop)
+        await run_in_threadpool(storage_service.save_result, attempt, feedback)
         
         return feedback
         
+    except AudioTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except (HTTPException, LLMOverloadedError):
+        await _save_failed_usage(storage_service, [(attempt_id, scenario_id, user_id)])
+        raise
     except Exception as e:
         print(f"An error occurred in submit_practice_voice: {e}")
-        raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
\ No newline at end of file
+        await _save_failed_usage(storage_service, [(attempt_id, scenario_id, user_id)])
+        raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
+    finally:
+        context_task.cancel()  # no-op once it has finished
+
+@router.delete("/weights_cache")
+async def invalidate_weights_cache(
+    scenario_id: Optional[str] = None,
+    analysis_service: AnalysisPipelineService = Depends(get_analysis_service),
+    scenario_service: ScenarioService = Depends(get_scenario_service)
+):
+    """Invalidate cached scenario weights for one scenario's type, or all of them"""
+    scenario = None
+    if scenario_id:
+        scenario = scenario_service.get_scenario(scenario_id)
+        if not scenario:
+            raise HTTPException(status_code=404, detail="Scenario not found")
+    deleted = await run_in_threadpool(analysis_service.invalidate_weights, scenario)
+    return {"invalidated": deleted}
+
+@router.post("/weights_cache/warm")
+async def warm_weights_cache(
+    analysis_service: AnalysisPipelineService = Depends(get_analysis_service),
+    scenario_service: ScenarioService = Depends(get_scenario_service)
+):
+    """Generate weights for every scenario type that is not cached yet"""
+    warmed = await analysis_service.warm_weights_cache(scenario_service.get_all_scenarios())
+    return {"scenario_types": warmed}
+
+@router.get("/llm_cache/stats")
+async def get_llm_cache_stats(analysis_service: AnalysisPipelineService = Depends(get_analysis_service)):
+    """Hit/miss counters and size of the LLM response cache"""
+    return await run_in_threadpool(analysis_service.response_cache.stats)
+
+@router.delete("/llm_cache")
+async def clear_llm_cache(analysis_service: AnalysisPipelineService = Depends(get_analysis_service)):
+    """Drop every cached LLM response and reset the counters"""
+    cleared = await run_in_threadpool(analysis_service.response_cache.clear)
+    return {"cleared": cleared}
+
+@router.get("/llm_scheduler/stats")
+async def get_llm_scheduler_stats(scheduler: LLMScheduler = Depends(get_llm_scheduler)):
+    """Current in-flight limit, queue depth and admission counters of the LLM scheduler"""
+    return scheduler.stats()
+
+@router.get("/llm_calls/stats")
+async def get_llm_call_stats(llm_calls: LLMCallPolicy = Depends(get_llm_calls)):
+    """Latency percentiles, retries, timeouts and hedges of each kind of LLM call"""
+    return llm_calls.stats()
+
+@router.get("/transcript_cache/stats")
+async def get_transcript_cache_stats(
+    transcription_service: TranscriptionService = Depends(get_transcription_service)
+):
+    """Hit/miss counters and size of the transcript cache"""
+    return await run_in_threadpool(transcription_service.transcript_cache.stats)
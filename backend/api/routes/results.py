@@ -1,25 +1,125 @@
-from typing import List
-from fastapi import APIRouter, HTTPException
-from core.models import FeedbackAnalysis, PracticeAttempt
-from services.storage_service import StorageService
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from core.models import FeedbackAnalysis, FeedbackPage, AttemptPage, AnalyticsSummary, AttemptUsage, UsageReport
+from api.dependencies import get_analytics_service, get_llm_usage, get_results_exporter, get_storage_service
+from services.analytics_service import AnalyticsService
+from services.export_service import ExportFormatUnavailable, ResultsExporter, EXPORT_FORMATS
+from services.llm_usage_service import LLMUsageRecorder
+from services.storage_service import StorageService, ResultFilters
 
 router = APIRouter()
-storage_service = StorageService()
 
-@router.get("/feedback", response_model=List[FeedbackAnalysis])
-async def get_all_feedback(limit: int = 50):
-    """Get all feedback results"""
-    return storage_service.get_all_feedback(limit)
+def result_filters(
+    user_id: Optional[str] = None,
+    scenario_id: Optional[str] = None,
+    start: Optional[datetime] = Query(None, description="Only results at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only results before this time"),
+    min_score: Optional[float] = Query(None, ge=0, le=10),
+    max_score: Optional[float] = Query(None, ge=0, le=10)
+) -> ResultFilters:
+    return ResultFilters(
+        user_id=user_id, scenario_id=scenario_id, start=start, end=end,
+        min_score=min_score, max_score=max_score
+    )
 
-@router.get("/attempts", response_model=List[PracticeAttempt])
-async def get_all_attempts(limit: int = 50):
-    """Get all practice attempts"""
-    return storage_service.get_attempts(limit)
+@router.get("/feedback", response_model=FeedbackPage)
+async def get_all_feedback(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    filters: ResultFilters = Depends(result_filters),
+    storage_service: StorageService = Depends(get_storage_service)
+):
+    """Get a page of feedback results, newest first"""
+    try:
+        items, next_cursor = await run_in_threadpool(storage_service.get_feedback_page, limit, cursor, filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FeedbackPage(items=items, next_cursor=next_cursor)
+
+@router.get("/attempts", response_model=AttemptPage)
+async def get_all_attempts(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    filters: ResultFilters = Depends(result_filters),
+    storage_service: StorageService = Depends(get_storage_service)
+):
+    """Get a page of practice attempts, newest first"""
+    try:
+        items, next_cursor = await run_in_threadpool(storage_service.get_attempts_page, limit, cursor, filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return AttemptPage(items=items, next_cursor=next_cursor)
+
+@router.get("/analytics", response_model=AnalyticsSummary)
+async def get_analytics(
+    bucket: str = Query("day", pattern="^(day|week|month)$", description="Granularity of the trend series"),
+    filters: ResultFilters = Depends(result_filters),
+    analytics_service: AnalyticsService = Depends(get_analytics_service)
+):
+    """Get aggregate statistics for the dashboard over the filtered window"""
+    return await run_in_threadpool(analytics_service.get_summary, filters, bucket)
+
+@router.get("/export")
+async def export_results(
+    format: str = Query("csv", pattern="^(csv|jsonl|parquet)$"),
+    filters: ResultFilters = Depends(result_filters),
+    results_exporter: ResultsExporter = Depends(get_results_exporter)
+):
+    """Stream all matching results as CSV, JSON Lines or Parquet"""
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    try:
+        # Checked before the response starts; a missing package can't be reported after the 200
+        body = results_exporter.iter_format(format, filters)
+    except ExportFormatUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/usage", response_model=UsageReport)
+async def get_llm_usage_report(
+    group_by: str = Query("scenario", pattern="^(scenario|user|stage|model)$"),
+    user_id: Optional[str] = None,
+    scenario_id: Optional[str] = None,
+    start: Optional[datetime] = Query(None, description="Only calls at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only calls before this time"),
+    llm_usage: LLMUsageRecorder = Depends(get_llm_usage)
+):
+    """LLM token usage, latency and estimated cost, in total and per scenario, user, stage or model"""
+    return await run_in_threadpool(llm_usage.get_report, group_by, user_id, scenario_id, start, end)
+
+@router.get("/usage/{attempt_id}", response_model=AttemptUsage)
+async def get_attempt_llm_usage(
+    attempt_id: str,
+    llm_usage: LLMUsageRecorder = Depends(get_llm_usage)
+):
+    """Every LLM call made for one attempt"""
+    usage = await run_in_threadpool(llm_usage.get_attempt_usage, attempt_id)
+    if not usage:
+        raise HTTPException(status_code=404, detail="No LLM usage recorded for this attempt")
+    return usage
 
 @router.get("/feedback/{attempt_id}", response_model=FeedbackAnalysis)
-async def get_feedback_by_attempt(attempt_id: str):
+async def get_feedback_by_attempt(
+    attempt_id: str,
+    storage_service: StorageService = Depends(get_storage_service)
+):
     """Get feedback for a specific attempt"""
-    feedback = storage_service.get_feedback_by_attempt_id(attempt_id)
+    feedback = await run_in_threadpool(storage_service.get_feedback_by_attempt_id, attempt_id)
     if not feedback:
         raise HTTPException(status_code=404, detail="Feedback not found")
-    return feedback
\ No newline at end of file
+    return feedback
+
+@router.get("/storage/metrics")
+async def get_storage_metrics(storage_service: StorageService = Depends(get_storage_service)):
+    """Get JSON result writer queue depth, lag and counters, and the RAG index size"""
+    return {
+        **storage_service.writer.metrics(),
+        "feedback_index": storage_service.feedback_index.stats()
+    }
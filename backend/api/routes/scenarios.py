@@ -1,18 +1,25 @@
-from typing import List
-from fastapi import APIRouter, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException
 from core.models import Scenario
+from api.dependencies import get_scenario_service
 from services.scenario_service import ScenarioService
 
 router = APIRouter()
-scenario_service = ScenarioService()
 
 @router.get("/", response_model=List[Scenario])
-async def get_scenarios():
-    """Get all available scenarios"""
+async def get_scenarios(
+    difficulty: Optional[str] = None,
+    medical_area: Optional[str] = None,
+    patient_type: Optional[str] = None,
+    scenario_service: ScenarioService = Depends(get_scenario_service)
+):
+    """Get all available scenarios, optionally filtered by attributes"""
+    if difficulty or medical_area or patient_type:
+        return scenario_service.find_scenarios(difficulty, medical_area, patient_type)
     return scenario_service.get_all_scenarios()
 
 @router.get("/{scenario_id}", response_model=Scenario)
-async def get_scenario(scenario_id: str):
+async def get_scenario(scenario_id: str, scenario_service: ScenarioService = Depends(get_scenario_service)):
     """Get a specific scenario by ID"""
     scenario = scenario_service.get_scenario(scenario_id)
     if not scenario:
@@ -11,8 +11,121 @@ class Settings(BaseSettings):
     data_dir: str = "./data"
     scenarios_dir: str = "./data/scenarios"
     results_dir: str = "./data/results"
+    # Seconds between checks of scenarios_dir for added/changed files (0 disables)
+    scenario_refresh_interval: float = 30.0
     database_url: str = "sqlite:///./healthcare_app.db"
+    # SQLite: how long a writer waits for the lock held by another worker
+    sqlite_busy_timeout_ms: int = 5000
+    # Connection pool for server databases such as PostgreSQL
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_recycle: int = 1800
     
+    # Pooled HTTP client shared by all LLM calls
+    llm_max_connections: int = 100
+    llm_request_timeout: float = 120.0
+    
+    # Admission control for outbound LLM calls: the in-flight limit adapts between min and max
+    # (AIMD on 429s, timeouts and calls slower than the latency threshold; 0 disables that signal)
+    llm_max_concurrency: int = 32
+    llm_min_concurrency: int = 2
+    llm_latency_threshold_seconds: float = 30.0
+    # Requests per second sent to the provider (0 = unlimited) and the burst allowed above it
+    llm_rate_limit_per_second: float = 0.0
+    llm_rate_limit_burst: float = 10.0
+    # Processes calling the provider with these settings (API workers plus scripts/run_worker.py
+    # processes); each scheduler works per process, so the concurrency and rate limits are split among them
+    llm_processes: int = 1
+    # Calls waiting for a slot; beyond this, or past the queue timeout, requests get 503 + Retry-After
+    llm_max_queued: int = 256
+    llm_queue_timeout_seconds: float = 15.0
+    llm_batch_queue_timeout_seconds: float = 300.0
+    
+    # Each LLM call (by name: medical, combined_communication, weights, transcription) gets a
+    # timeout per attempt (llm_call_timeouts overrides it per name, e.g. {"transcription": 90})
+    # and up to llm_max_retries retries on transient errors with jittered exponential backoff
+    llm_call_timeout_seconds: float = 60.0
+    llm_call_timeouts: dict = {}
+    llm_max_retries: int = 2
+    llm_retry_base_delay: float = 0.5
+    llm_retry_max_delay: float = 8.0
+    # Hedging: send a duplicate of a call still running after its p95 latency (over the last
+    # llm_latency_window calls) and keep whichever answer comes first
+    llm_hedging: bool = False
+    llm_hedge_quantile: float = 0.95
+    llm_latency_window: int = 200
+    
+    # Prices used to estimate the cost in /results/usage (USD per million tokens)
+    llm_input_cost_per_million: float = 0.0
+    llm_output_cost_per_million: float = 0.0
+    
+    # Add a Server-Timing header with per-stage durations to every response
+    server_timing_header: bool = False
+    
+    # RAG context: past feedback items retrieved by similarity to the scenario's key points
+    rag_top_k: int = 5
+    rag_token_budget: int = 250
+    rag_min_similarity: float = 0.15
+    rag_index_max_users: int = 500
+    rag_index_max_attempts: int = 5000
+    rag_index_dimensions: int = 1 << 18
+    # Seconds before a loaded index rereads the database for feedback saved by other processes
+    rag_index_refresh_seconds: float = 30.0
+    # Searches per user whose results are reused until new feedback is indexed for that user
+    rag_result_cache_size: int = 32
+    
+    # Voice uploads are spooled to disk (upload_spool_dir, default: system temp dir) and
+    # transcribed in chunks split at pauses; peak memory is about
+    # transcription_concurrency chunks of at most transcription_max_chunk_seconds
+    max_upload_bytes: int = 25 * 1024 * 1024
+    upload_spool_dir: Optional[str] = None
+    transcription_chunk_seconds: float = 30.0
+    transcription_max_chunk_seconds: float = 60.0
+    # Mean amplitude, as a fraction of full scale, below which a window counts as silence
+    transcription_silence_threshold: float = 0.01
+    transcription_min_silence_ms: int = 300
+    transcription_concurrency: int = 4
+    
+    # Transcripts of previously seen audio, keyed by a BLAKE2 hash of the bytes
+    transcript_cache_backend: str = "sqlite"
+    transcript_cache_path: str = "./data/transcript_cache.db"
+    transcript_cache_max_entries: int = 5000
+    transcript_cache_ttl_seconds: float = 7 * 86400.0
+    
+    # /practice/submit_batch limits
+    batch_max_items: int = 500
+    batch_max_concurrency: int = 8
+    
+    # Asynchronous analysis jobs (/practice/jobs); 0 workers leaves them to scripts/run_worker.py
+    job_workers: int = 4
+    job_poll_interval: float = 1.0
+    job_lease_seconds: float = 300.0
+    job_max_attempts: int = 3
+    job_webhook_timeout: float = 10.0
+    # Signs webhook bodies with HMAC-SHA256 in the X-Signature header when set
+    job_webhook_secret: Optional[str] = None
+    # Hosts callback_url may point at (exact names, or "*.example.com" for subdomains); the URL
+    # must be https and resolve to public addresses only. Empty disables webhooks.
+    job_webhook_allowed_hosts: list = []
+    
+    # Write the JSON result files from a background queue instead of the request path
+    json_write_behind: bool = False
+    json_write_queue_size: int = 1000
+    json_write_batch_size: int = 50
+    
+    # Scenario weights cache
+    weights_cache_lease_seconds: float = 60.0
+    # Seconds a process reuses weights it has read before checking the shared table again
+    weights_cache_memory_ttl_seconds: float = 60.0
+    warm_weights_cache_on_startup: bool = False
+
+    # Cache of specialist LLM outputs for identical submissions: memory, sqlite, redis or none
+    llm_cache_backend: str = "memory"
+    llm_cache_ttl_seconds: float = 86400.0
+    llm_cache_max_entries: int = 1000
+    llm_cache_path: str = "./data/llm_cache.db"
+    llm_cache_redis_url: str = "redis://localhost:6379/0"
+
     backend_cors_origins: list = ["http://localhost:8501"]
     
     class Config:
@@ -0,0 +1,93 @@
+import httpx
+from langchain_openai import ChatOpenAI
+from sqlalchemy.engine import Engine
+from core.config import settings
+from core.database import create_db_engine, create_session_factory
+from core.migrations import run_migrations
+from services.advanced_analysis_service import AnalysisPipelineService
+from services.analytics_service import AnalyticsService
+from services.export_service import ResultsExporter
+from services.job_queue_service import AnalysisJobQueue, AnalysisWorkerPool
+from services.llm_cache import create_llm_cache
+from services.llm_calls import LLMCallPolicy
+from services.llm_scheduler import LLMScheduler
+from services.scenario_service import ScenarioService
+from services.storage_service import StorageService
+from services.transcription_service import TranscriptionService
+
+
+def create_llm(http_client: httpx.Client = None, http_async_client: httpx.AsyncClient = None) -> ChatOpenAI:
+    """Create the chat model shared by analysis and transcription"""
+    return ChatOpenAI(
+        model=settings.llm_model,
+        api_key=settings.gemini_api_key,
+        base_url=settings.gemini_base_url,
+        temperature=0.1,
+        # LLMCallPolicy retries with jitter and per-call timeouts, so the SDK's own retries are off
+        max_retries=0,
+        http_client=http_client,
+        http_async_client=http_async_client
+    )
+
+
+class AppContainer:
+    """
+    Owns the long-lived resources of the API process.
+
+    One container is built in the FastAPI lifespan and routes receive its
+    services through `api.dependencies`, so the process has a single engine
+    pool, a single pooled HTTP client for the LLM and one instance of each
+    service. Tests and tools can pass their own engine or llm.
+    """
+
+    def __init__(self, engine: Engine = None, llm=None):
+        self.engine = engine or create_db_engine()
+        run_migrations(self.engine)
+        self.SessionLocal = create_session_factory(self.engine)
+
+        # One scheduler admits every outbound LLM call of the process; the call policy
+        # adds timeouts, retries and hedging on top of it
+        self.llm_scheduler = LLMScheduler()
+        self.llm_calls = LLMCallPolicy(self.llm_scheduler)
+
+        self._http_client = None
+        self._http_async_client = None
+        if llm is None:
+            limits = httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_connections
+            )
+            timeout = httpx.Timeout(settings.llm_request_timeout)
+            self._http_client = httpx.Client(limits=limits, timeout=timeout)
+            self._http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+            llm = create_llm(self._http_client, self._http_async_client)
+        self.llm = llm
+
+        self.scenario_service = ScenarioService()
+        self.storage_service = StorageService(engine=self.engine, session_factory=self.SessionLocal)
+        self.llm_cache = create_llm_cache()
+        self.analysis_service = AnalysisPipelineService(
+            llm=self.llm, storage_service=self.storage_service, response_cache=self.llm_cache,
+            call_policy=self.llm_calls
+        )
+        self.transcription_service = TranscriptionService(
+            client=self.llm, usage_recorder=self.storage_service.llm_usage, call_policy=self.llm_calls
+        )
+        self.analytics_service = AnalyticsService(self.SessionLocal)
+        self.results_exporter = ResultsExporter(self.SessionLocal)
+        self.job_queue = AnalysisJobQueue(self.SessionLocal)
+        self.job_workers = AnalysisWorkerPool(
+            self.job_queue, self.analysis_service, self.scenario_service, self.storage_service
+        )
+
+    async def aclose(self):
+        """Stop job workers, flush queued writes and release pooled connections"""
+        await self.job_workers.stop()
+        self.storage_service.close()
+        self.llm_cache.close()
+        self.transcription_service.transcript_cache.close()
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+        if self._http_client is not None:
+            self._http_client.close()
+        self.engine.dispose()
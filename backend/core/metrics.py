@@ -0,0 +1,161 @@
+"""
+In-process latency metrics.
+
+Code on the hot path wraps each stage in `span("stage")`. Every span is
+recorded in the `stage_duration_seconds` histogram, which `/metrics` serves
+in the Prometheus text format, and in the timings of the current request,
+which the Server-Timing middleware reports back to the client. The request
+timings live in a context variable, so spans in tasks and worker threads
+started by the request are attributed to it.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Starlette appends the charset to text/* media types
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative histogram with one series per label combination"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # labels -> [bucket counts..., sum, count]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+            for bound, count in zip(self.buckets, values):
+                bucket_labels = ",".join(labels + [f'le="{_format_value(bound)}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {count}")
+            suffix = f"{{{','.join(labels)}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {values[-2]}")
+            lines.append(f"{self.name}_count{suffix} {values[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, documentation, labelnames, buckets)
+            return self._metrics[name]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.histogram(
+    "stage_duration_seconds",
+    "Time spent in each stage of the submission pipeline",
+    ("stage", "outcome")
+)
+REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the start of its response",
+    ("method", "route", "status")
+)
+
+# (stage, seconds, outcome) of the spans finished while handling the current request
+_request_timings: ContextVar[Optional[List[Tuple[str, float, str]]]] = ContextVar("request_timings", default=None)
+
+
+class Span:
+    """A timed stage; set `outcome` (e.g. "hit"/"miss") before it ends to label the measurement"""
+
+    def __init__(self, stage: str, outcome: str = "ok"):
+        self.stage = stage
+        self.outcome = outcome
+        self.started = time.perf_counter()
+
+
+@contextmanager
+def span(stage: str, outcome: str = "ok") -> Iterator[Span]:
+    """Time the enclosed block as `stage`; an exception records it with outcome "error" """
+    current = Span(stage, outcome)
+    try:
+        yield current
+    except BaseException:
+        current.outcome = "error"
+        raise
+    finally:
+        record(stage, time.perf_counter() - current.started, current.outcome)
+
+
+def record(stage: str, seconds: float, outcome: str = "ok"):
+    """Record a duration measured elsewhere"""
+    STAGE_DURATION.observe(seconds, stage=stage, outcome=outcome)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds, outcome))
+
+
+def start_request_timings() -> List[Tuple[str, float, str]]:
+    """Collect the spans of the current context (and tasks it starts) into a new list"""
+    timings: List[Tuple[str, float, str]] = []
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: List[Tuple[str, float, str]], total: Optional[float] = None) -> str:
+    """Format timings as a Server-Timing value; repeated stages are summed and their count given in desc"""
+    stages: Dict[str, List] = {}
+    for stage, seconds, outcome in list(timings):
+        entry = stages.setdefault(stage, [0.0, 0, []])
+        entry[0] += seconds
+        entry[1] += 1
+        if outcome != "ok" and outcome not in entry[2]:
+            entry[2].append(outcome)
+    metrics = []
+    for stage, (seconds, count, outcomes) in stages.items():
+        desc = " ".join(([f"x{count}"] if count > 1 else []) + outcomes)
+        metrics.append(f"{stage};dur={seconds * 1000:.1f}" + (f';desc="{desc}"' if desc else ""))
+    if total is not None:
+        metrics.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(metrics)
@@ -0,0 +1,128 @@
+"""
+Schema migrations for existing databases.
+
+`Base.metadata.create_all` only creates missing tables, so changes to tables
+that already exist in a `healthcare_app.db` are applied here. Each migration
+is recorded in the `schema_version` table and only runs once; migrations are
+written to be no-ops on a freshly created schema. Concurrent runs from
+several workers are serialized by a database lock.
+"""
+
+import json
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import JSON, column, inspect, select, table, text
+from sqlalchemy.engine import Connection, Engine
+from core.models import (
+    Base, FEEDBACK_CATEGORIES, FeedbackAnalysisDB, LLMUsageDB, PracticeAttemptDB, SchemaVersionDB
+)
+
+LEGACY_DETAIL_FIELDS = ("explanation", "strengths", "improvements", "examples")
+BACKFILL_BATCH_SIZE = 500
+# Key of the Postgres advisory lock taken while migrating
+MIGRATION_LOCK_KEY = 7215001
+
+
+def _add_result_indexes(conn: Connection):
+    """Index the columns used by the results and RAG lookups"""
+    for model in (PracticeAttemptDB, FeedbackAnalysisDB):
+        for index in model.__table__.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+
+def _feedback_details_json(conn: Connection):
+    """Fold the 16 per-category text columns of feedback_analyses into one JSON column"""
+    columns = {c["name"] for c in inspect(conn).get_columns(FeedbackAnalysisDB.__tablename__)}
+    legacy_columns = [
+        f"{category}_{field}"
+        for category in FEEDBACK_CATEGORIES
+        for field in LEGACY_DETAIL_FIELDS
+        if f"{category}_{field}" in columns
+    ]
+    if "details" not in columns:
+        conn.execute(text(f"ALTER TABLE {FeedbackAnalysisDB.__tablename__} ADD COLUMN details JSON"))
+    if not legacy_columns:
+        return
+
+    legacy = table(FeedbackAnalysisDB.__tablename__, column("id"), *(column(name) for name in legacy_columns))
+    target = table(FeedbackAnalysisDB.__tablename__, column("id"), column("details", JSON))
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(legacy).where(legacy.c.id > last_id).order_by(legacy.c.id).limit(BACKFILL_BATCH_SIZE)
+        ).mappings().all()
+        if not rows:
+            break
+        for row in rows:
+            details = {}
+            for category in FEEDBACK_CATEGORIES:
+                explanation = row.get(f"{category}_explanation")
+                details[category] = {
+                    "explanation": explanation or "",
+                    **{
+                        field: json.loads(row.get(f"{category}_{field}") or "[]")
+                        for field in ("strengths", "improvements", "examples")
+                    }
+                }
+            conn.execute(target.update().where(target.c.id == row["id"]).values(details=details))
+        last_id = rows[-1]["id"]
+
+    for name in legacy_columns:
+        try:
+            with conn.begin_nested():
+                conn.execute(text(f"ALTER TABLE {FeedbackAnalysisDB.__tablename__} DROP COLUMN {name}"))
+        except Exception as e:
+            # Older SQLite builds cannot drop columns; the unused nullable columns are harmless
+            print(f"Could not drop legacy column {name}: {e}")
+
+
+def _llm_usage_failed(conn: Connection):
+    """Mark LLM calls made for analyses that failed"""
+    columns = {c["name"] for c in inspect(conn).get_columns(LLMUsageDB.__tablename__)}
+    if "failed" not in columns:
+        conn.execute(text(
+            f"ALTER TABLE {LLMUsageDB.__tablename__} ADD COLUMN failed BOOLEAN NOT NULL DEFAULT FALSE"
+        ))
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "add_result_indexes", _add_result_indexes),
+    (2, "feedback_details_json", _feedback_details_json),
+    (3, "llm_usage_failed", _llm_usage_failed),
+]
+
+
+def _lock(conn: Connection):
+    """Hold off other processes' migrations until this connection's transaction ends"""
+    if conn.dialect.name == "sqlite":
+        # Takes the write lock now rather than at the first write, so readers of schema_version queue up
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    elif conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def run_migrations(engine: Engine) -> List[str]:
+    """
+    Create missing tables and apply pending migrations. Returns the names applied.
+
+    Every worker runs this at startup, so the check and the migrations run in
+    one transaction under a database lock; a worker that starts while another
+    is migrating waits and then finds nothing left to do.
+    """
+    applied = []
+    with engine.connect() as conn:
+        _lock(conn)
+        Base.metadata.create_all(bind=conn)
+        done = set(conn.execute(select(SchemaVersionDB.version)).scalars())
+        for version, name, migrate in MIGRATIONS:
+            if version in done:
+                continue
+            migrate(conn)
+            conn.execute(SchemaVersionDB.__table__.insert().values(
+                version=version, name=name, applied_at=datetime.now()
+            ))
+            applied.append((version, name))
+        conn.commit()
+    for version, name in applied:
+        print(f"Applied migration {version}: {name}")
+    return [name for _, name in applied]
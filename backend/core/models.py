@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import List, Dict, Optional
 from pydantic import BaseModel, Field, conint
 from enum import Enum
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Enum as SQLEnum
+from sqlalchemy import Boolean, Column, Integer, String, Float, DateTime, Text, JSON, Index, Enum as SQLEnum
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -89,9 +89,12 @@ class Scenario(BaseModel):
     key_points: List[str]
 
 
+def new_attempt_id() -> str:
+    return f"attempt_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+
+
 class PracticeAttempt(BaseModel):
-    id: str = Field(
-        default_factory=lambda: f"attempt_{datetime.now().strftime('%Y%m%d%H%M%S%f')}")
+    id: str = Field(default_factory=new_attempt_id)
     scenario_id: str
     user_response: str
     user_id: str = "default_user"  # Added for personalization
@@ -128,46 +131,251 @@ class FeedbackAnalysis(BaseModel):
     timestamp: datetime = Field(default_factory=datetime.now)
 
 
+class FeedbackPage(BaseModel):
+    """A page of feedback, newest first; pass next_cursor back to get the following page."""
+    items: List[FeedbackAnalysis]
+    next_cursor: Optional[str] = None
+
+
+class AttemptPage(BaseModel):
+    """A page of practice attempts, newest first; pass next_cursor back to get the following page."""
+    items: List[PracticeAttempt]
+    next_cursor: Optional[str] = None
+
+
+class ScoreStats(BaseModel):
+    average: Optional[float] = None
+    minimum: Optional[float] = None
+    maximum: Optional[float] = None
+
+
+class HistogramBucket(BaseModel):
+    """Number of attempts whose overall score falls in [lower, lower + 1)"""
+    lower: int
+    count: int
+
+
+class TrendPoint(BaseModel):
+    period: str
+    attempts: int
+    average_score: float
+
+
+class ScenarioStats(ScoreStats):
+    scenario_id: str
+    attempts: int
+
+
+class AnalyticsSummary(BaseModel):
+    """Aggregated results for the dashboard, computed in the database"""
+    total_attempts: int
+    attempts_last_7_days: int
+    overall: ScoreStats
+    categories: Dict[str, ScoreStats]
+    histogram: List[HistogramBucket]
+    trend: List[TrendPoint]
+    scenarios: List[ScenarioStats]
+    recent_average: Optional[float] = Field(None, description="Average of the newest attempts in the window")
+    earlier_average: Optional[float] = Field(None, description="Average of the oldest attempts in the window")
+
+
+class LLMCall(BaseModel):
+    """
+    Token usage and wall time of one LLM call; cached calls were served from a
+    cache without one, failed calls were made for an analysis that failed
+    """
+    stage: str
+    model: Optional[str] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    duration_ms: float = 0.0
+    cached: bool = False
+    failed: bool = False
+    timestamp: datetime = Field(default_factory=datetime.now)
+
+
+class UsageRollup(BaseModel):
+    """LLM usage summed over a group of calls"""
+    key: Optional[str] = None
+    calls: int
+    cached_calls: int
+    failed_calls: int = 0
+    attempts: int
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    average_duration_ms: Optional[float] = None
+    max_duration_ms: Optional[float] = None
+    estimated_cost: float = Field(0.0, description="From the LLM_*_COST_PER_MILLION settings")
+
+
+class UsageReport(BaseModel):
+    group_by: str
+    totals: UsageRollup
+    groups: List[UsageRollup]
+
+
+class AttemptUsage(BaseModel):
+    attempt_id: str
+    totals: UsageRollup
+    calls: List[LLMCall]
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class AnalysisJob(BaseModel):
+    """State of an asynchronous analysis submitted to /practice/jobs"""
+    job_id: str
+    status: JobStatus
+    attempt_id: str
+    scenario_id: str
+    user_id: str
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    feedback: Optional[FeedbackAnalysis] = None
+
+
 class PracticeAttemptDB(Base):
     __tablename__ = "practice_attempts"
     id = Column(String, primary_key=True)
-    scenario_id = Column(String, nullable=False)
+    scenario_id = Column(String, nullable=False, index=True)
     user_response = Column(Text, nullable=False)
     user_id = Column(String, default="default_user")  # Add user_id to DB model
     input_type = Column(SQLEnum(InputType), default=InputType.TEXT)
-    timestamp = Column(DateTime, default=datetime.now)
+    timestamp = Column(DateTime, default=datetime.now, index=True)
+
+    __table_args__ = (
+        Index("ix_practice_attempts_user_id_timestamp", "user_id", "timestamp"),
+    )
+
+
+# Feedback categories stored per row; scores get their own columns so they can be aggregated in SQL
+FEEDBACK_CATEGORIES = ("medical_accuracy", "communication_clarity", "empathy_tone", "completeness")
 
 
 class FeedbackAnalysisDB(Base):
     __tablename__ = "feedback_analyses"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    attempt_id = Column(String, nullable=False)
-    scenario_id = Column(String, nullable=False)
+    attempt_id = Column(String, nullable=False, index=True)
+    scenario_id = Column(String, nullable=False, index=True)
 
     medical_accuracy_score = Column(Float)
-    medical_accuracy_explanation = Column(Text)
-    medical_accuracy_strengths = Column(Text)
-    medical_accuracy_improvements = Column(Text)
-    medical_accuracy_examples = Column(Text)
-
     communication_clarity_score = Column(Float)
-    communication_clarity_explanation = Column(Text)
-    communication_clarity_strengths = Column(Text)
-    communication_clarity_improvements = Column(Text)
-    communication_clarity_examples = Column(Text)
-
     empathy_tone_score = Column(Float)
-    empathy_tone_explanation = Column(Text)
-    empathy_tone_strengths = Column(Text)
-    empathy_tone_improvements = Column(Text)
-    empathy_tone_examples = Column(Text)
-
     completeness_score = Column(Float)
-    completeness_explanation = Column(Text)
-    completeness_strengths = Column(Text)
-    completeness_improvements = Column(Text)
-    completeness_examples = Column(Text)
+
+    # {category: {explanation, strengths, improvements, examples}} for each of FEEDBACK_CATEGORIES
+    details = Column(JSON, nullable=False, default=dict)
 
     overall_score = Column(Float)
     general_feedback = Column(Text)
-    timestamp = Column(DateTime, default=datetime.now)
+    timestamp = Column(DateTime, default=datetime.now, index=True)
+
+
+class SchemaVersionDB(Base):
+    """Migrations applied by core.migrations"""
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.now)
+
+
+class ScenarioWeightsDB(Base):
+    """Shared cache of generated weights, keyed by scenario type.
+
+    A row with no weights and an unexpired lease means another worker is
+    currently generating the weights for that key.
+    """
+    __tablename__ = "scenario_weights_cache"
+    cache_key = Column(String, primary_key=True)
+    weights = Column(Text, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now)
+
+
+class DailySummaryDB(Base):
+    """Running per-day totals, updated in place for every saved feedback"""
+    __tablename__ = "daily_summaries"
+    date = Column(String, primary_key=True)
+    total_attempts = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0.0)
+
+
+class DailyScenarioCountDB(Base):
+    __tablename__ = "daily_scenario_counts"
+    date = Column(String, primary_key=True)
+    scenario_id = Column(String, primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+
+
+class DailyScoreBucketDB(Base):
+    """Histogram of overall scores per day, one row per whole-point bucket (0-10)"""
+    __tablename__ = "daily_score_buckets"
+    date = Column(String, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+
+
+class LegacySummaryImportDB(Base):
+    """Days whose old-format summary file has been folded into the aggregates; the key makes it happen once"""
+    __tablename__ = "legacy_summary_imports"
+    date = Column(String, primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    imported_at = Column(DateTime, default=datetime.now)
+
+
+class AnalysisJobDB(Base):
+    """Queue of analyses for the job workers.
+
+    Workers claim queued rows, or running rows whose lease has lapsed
+    because their worker died, by moving them to running with a new lease.
+    """
+    __tablename__ = "analysis_jobs"
+    id = Column(String, primary_key=True)
+    status = Column(SQLEnum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+    attempt_id = Column(String, nullable=False)
+    scenario_id = Column(String, nullable=False)
+    user_id = Column(String, nullable=False)
+    user_response = Column(Text, nullable=False)
+    input_type = Column(SQLEnum(InputType), default=InputType.TEXT)
+    callback_url = Column(String, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    worker_id = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_analysis_jobs_status_created_at", "status", "created_at"),
+    )
+
+
+class LLMUsageDB(Base):
+    """One row per LLM call (or cache hit standing in for one), saved with the attempt's feedback"""
+    __tablename__ = "llm_usage"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # Null for calls not tied to one attempt, such as generating a scenario type's weights
+    attempt_id = Column(String, nullable=True, index=True)
+    scenario_id = Column(String, nullable=True, index=True)
+    user_id = Column(String, nullable=True, index=True)
+    stage = Column(String, nullable=False)
+    model = Column(String, nullable=True)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    duration_ms = Column(Float, nullable=False, default=0.0)
+    cached = Column(Boolean, nullable=False, default=False)
+    # Made for an analysis that failed, so no feedback was saved with it
+    failed = Column(Boolean, nullable=False, default=False)
+    timestamp = Column(DateTime, default=datetime.now, index=True)
@@ -1,11 +1,43 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from api.middleware import ServerTimingMiddleware
 from api.routes import practice, scenarios, results
 from core.config import settings
+from core.container import AppContainer
+from core.metrics import PROMETHEUS_CONTENT_TYPE, registry
+from services.llm_scheduler import LLMOverloadedError
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Tests and tools may install their own container before startup
+    container = getattr(app.state, "container", None) or AppContainer()
+    app.state.container = container
+
+    warm_task = None
+    if settings.warm_weights_cache_on_startup:
+        # Runs in the background so slow LLM calls don't delay startup
+        warm_task = asyncio.create_task(container.analysis_service.warm_weights_cache(
+            container.scenario_service.get_all_scenarios()
+        ))
+
+    # In-process job workers; with JOB_WORKERS=0 jobs wait for scripts/run_worker.py
+    container.job_workers.start()
+
+    yield
+
+    if warm_task and not warm_task.done():
+        warm_task.cancel()
+    # Writes out any queued JSON results and releases pooled connections
+    await container.aclose()
+    app.state.container = None
 
 app = FastAPI(
     title=settings.project_name,
-    openapi_url=f"{settings.api_v1_str}/openapi.json"
+    openapi_url=f"{settings.api_v1_str}/openapi.json",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -17,6 +49,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-stage latency: histograms for /metrics and, if enabled, a Server-Timing header
+app.add_middleware(ServerTimingMiddleware, header=settings.server_timing_header)
+
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloadedError):
+    """LLM calls beyond what the scheduler admits fail fast with 503 instead of piling up"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"The analysis service is busy, please retry: {exc}"},
+        headers={"Retry-After": exc.retry_after_header}
+    )
+
 # Include routers
 app.include_router(
     practice.router,
@@ -40,4 +84,9 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Latency histograms in the Prometheus text format"""
+    return Response(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,265 @@
+"""
+Offline throughput and latency benchmark of the API.
+
+Runs the FastAPI app in-process against a throwaway SQLite database, with
+the chat model replaced by scripts/fake_llm.py's FakeChatModel, and drives the
+practice and results endpoints at a fixed concurrency through an ASGI
+client. Reports req/s and p50/p95/p99 latency per endpoint, plus a
+per-stage breakdown read from the Server-Timing headers, and writes
+everything to a JSON file that can be diffed across commits.
+"""
+
+import os
+import argparse
+import array
+import asyncio
+import io
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+from core.config import settings
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PHASES = ("submit", "submit_voice", "results")
+RESULTS_ENDPOINTS = ("feedback", "attempts", "analytics", "usage")
+SAMPLE_RATE = 16000
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Linearly interpolated percentile of already sorted values"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    values = sorted(values)
+    stats = {"p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99),
+             "mean": sum(values) / len(values) if values else None, "max": values[-1] if values else None}
+    return {name: round(value, 2) if value is not None else None for name, value in stats.items()}
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """{stage: milliseconds} from a Server-Timing header"""
+    stages = {}
+    for metric in filter(None, (part.strip() for part in header.split(","))):
+        name, *params = metric.split(";")
+        for param in params:
+            if param.startswith("dur="):
+                stages[name] = float(param[4:])
+    return stages
+
+
+def make_wav(seconds: float, seed: int) -> bytes:
+    """Speech-like audio: bursts of noise separated by pauses, so it is chunked like a recording"""
+    rng = random.Random(seed)
+    samples = array.array("h")
+    while len(samples) < seconds * SAMPLE_RATE:
+        burst = int(rng.uniform(1.0, 4.0) * SAMPLE_RATE)
+        samples.extend(rng.randint(-8000, 8000) for _ in range(burst))
+        samples.extend([0] * int(rng.uniform(0.3, 0.8) * SAMPLE_RATE))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(SAMPLE_RATE)
+        writer.writeframes(samples[:int(seconds * SAMPLE_RATE)].tobytes())
+    return buffer.getvalue()
+
+
+class PhaseRecorder:
+    """Latencies, statuses and stage timings of the requests of one phase"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.stages: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.elapsed: Dict[str, float] = defaultdict(float)
+
+    async def call(self, name: str, request):
+        started = time.perf_counter()
+        try:
+            response = await request
+        except Exception as e:
+            self.errors[name] += 1
+            print(f"{name} request failed: {e}")
+            return
+        self.latencies[name].append((time.perf_counter() - started) * 1000)
+        self.statuses[name][response.status_code] += 1
+        if response.status_code >= 400:
+            self.errors[name] += 1
+        for stage, milliseconds in parse_server_timing(response.headers.get("server-timing", "")).items():
+            self.stages[name][stage].append(milliseconds)
+
+    def report(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "requests": len(latencies),
+                "errors": self.errors[name],
+                "status_codes": {str(code): count for code, count in sorted(self.statuses[name].items())},
+                "requests_per_second": round(len(latencies) / self.elapsed[name], 2) if self.elapsed[name] else None,
+                "latency_ms": summarize(latencies),
+                "stages_ms": {stage: summarize(values) for stage, values in self.stages[name].items()},
+            }
+            for name, latencies in self.latencies.items()
+        }
+
+
+async def run_phase(recorder: PhaseRecorder, names: List[str], count: int, concurrency: int, make_request):
+    """Send count requests with at most concurrency in flight; names share the wall time of the phase"""
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < count:
+            index = next_index
+            next_index += 1
+            name, request = make_request(index)
+            await recorder.call(name, request)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    for name in names:
+        # Requests per second of each endpoint are counted against the whole phase
+        recorder.elapsed[name] = elapsed
+
+
+async def run_benchmark(args) -> dict:
+    # Settings are read when the app and its services are built, so configure them first
+    workdir = tempfile.mkdtemp(prefix="benchmark_")
+    settings.database_url = f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+    settings.results_dir = os.path.join(workdir, "results")
+    settings.scenarios_dir = os.path.join(BACKEND_DIR, "data", "scenarios")
+    settings.llm_cache_backend = args.llm_cache
+    settings.transcript_cache_backend = "none"
+    settings.job_workers = 0
+    settings.warm_weights_cache_on_startup = False
+    settings.server_timing_header = True
+
+    import main
+    from core.container import AppContainer
+    from scripts.fake_llm import FakeChatModel
+
+    llm = FakeChatModel(latency=args.latency, jitter=args.jitter, seed=args.seed)
+    main.app.state.container = AppContainer(llm=llm)
+    scenario_ids = [s.id for s in main.app.state.container.scenario_service.get_all_scenarios()]
+    if not scenario_ids:
+        raise SystemExit(f"No scenarios found in {settings.scenarios_dir}")
+    audio = [make_wav(args.audio_seconds, args.seed + i) for i in range(min(args.voice_requests, 8))]
+    api = settings.api_v1_str
+    recorder = PhaseRecorder()
+
+    def submit(index: int):
+        return "submit", client.post(f"{api}/practice/submit", json={
+            "scenario_id": scenario_ids[index % len(scenario_ids)],
+            "user_response": f"Hello, I'm the nurse looking after you today (run {index}). Can you confirm your name?",
+            "user_id": f"bench_user_{index % args.users}",
+        })
+
+    def submit_voice(index: int):
+        return "submit_voice", client.post(f"{api}/practice/submit_voice", data={
+            "scenario_id": scenario_ids[index % len(scenario_ids)],
+            "user_id": f"bench_user_{index % args.users}",
+        }, files={"audio_file": (f"bench_{index}.wav", audio[index % len(audio)], "audio/wav")})
+
+    def results(index: int):
+        endpoint = RESULTS_ENDPOINTS[index % len(RESULTS_ENDPOINTS)]
+        params = {"limit": 50} if endpoint in ("feedback", "attempts") else {}
+        return f"results/{endpoint}", client.get(f"{api}/results/{endpoint}", params=params)
+
+    phases = {
+        "submit": (["submit"], args.requests, submit),
+        "submit_voice": (["submit_voice"], args.voice_requests, submit_voice),
+        "results": ([f"results/{e}" for e in RESULTS_ENDPOINTS], args.results_requests, results),
+    }
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for phase in args.phases:
+                names, count, make_request = phases[phase]
+                if count <= 0:
+                    continue
+                # Warm-up requests prime caches and connections and are not recorded
+                await run_phase(PhaseRecorder(), names, min(args.warmup, count), args.concurrency, make_request)
+                print(f"Running {count} {phase} requests at concurrency {args.concurrency}...")
+                await run_phase(recorder, names, count, args.concurrency, make_request)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+        },
+        "endpoints": recorder.report(),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict):
+    print(f"\n{'endpoint':<20} {'req':>5} {'err':>4} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in report["endpoints"].items():
+        latency = stats["latency_ms"]
+        print(f"{name:<20} {stats['requests']:>5} {stats['errors']:>4} {stats['requests_per_second'] or 0:>8} "
+              f"{latency['p50']:>9} {latency['p95']:>9} {latency['p99']:>9}")
+        for stage, timing in stats["stages_ms"].items():
+            if stage != "total":
+                print(f"    {stage:<34} p50 {timing['p50']:>8}  p95 {timing['p95']:>8}  p99 {timing['p99']:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the API offline with a fake LLM.")
+    parser.add_argument("--requests", type=int, default=200, help="Text submissions to /practice/submit.")
+    parser.add_argument("--voice-requests", type=int, default=50, help="Voice submissions to /practice/submit_voice.")
+    parser.add_argument("--results-requests", type=int, default=200, help="Requests spread over the /results endpoints.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at the same time.")
+    parser.add_argument("--phases", type=lambda value: value.split(","), default=list(PHASES),
+                        help=f"Comma separated phases to run, in order ({','.join(PHASES)}).")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean fake LLM latency in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Fake LLM latency varies uniformly by +/- this much.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the fake LLM's answers and of the test audio.")
+    parser.add_argument("--users", type=int, default=20, help="Distinct user ids the submissions are spread over.")
+    parser.add_argument("--audio-seconds", type=float, default=20.0, help="Length of the generated voice recordings.")
+    parser.add_argument("--warmup", type=int, default=5, help="Unrecorded requests sent before each phase.")
+    parser.add_argument("--llm-cache", type=str, default="none", choices=["none", "memory"],
+                        help="LLM response cache during the run (submissions are unique, so it only sees misses).")
+    parser.add_argument("--output", type=str, default="benchmark_results.json", help="JSON report path.")
+
+    args = parser.parse_args()
+    unknown = set(args.phases) - set(PHASES)
+    if unknown:
+        parser.error(f"unknown phases: {', '.join(sorted(unknown))}")
+
+    report = asyncio.run(run_benchmark(args))
+    print_report(report)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
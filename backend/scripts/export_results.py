@@ -0,0 +1,40 @@
+import os
+import argparse
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.config import settings
+from core.database import create_db_engine, create_session_factory
+from services.export_service import ExportFormatUnavailable, ResultsExporter, EXPORT_FORMATS
+from services.storage_service import ResultFilters
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream practice results to CSV, JSON Lines or Parquet.")
+    parser.add_argument("--format", type=str, choices=list(EXPORT_FORMATS), default="csv", help="Output format.")
+    parser.add_argument("--output", type=str, help="Output file path (defaults to results_dir/export_<timestamp>.<ext>).")
+    parser.add_argument("--database-url", type=str, default=settings.database_url, help="SQLAlchemy URL of the database to export.")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows fetched per database round trip.")
+    parser.add_argument("--user-id", type=str, help="Only export results for this user.")
+    parser.add_argument("--scenario-id", type=str, help="Only export results for this scenario.")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Only results at or after this ISO timestamp.")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Only results before this ISO timestamp.")
+    
+    args = parser.parse_args()
+    
+    output = args.output or os.path.join(
+        settings.results_dir,
+        f"export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{EXPORT_FORMATS[args.format][1]}"
+    )
+    session_factory = create_session_factory(create_db_engine(args.database_url))
+    exporter = ResultsExporter(session_factory, chunk_size=args.chunk_size)
+    filters = ResultFilters(user_id=args.user_id, scenario_id=args.scenario_id, start=args.start, end=args.end)
+    
+    started = datetime.now()
+    try:
+        written = exporter.export_to_file(output, args.format, filters)
+    except ExportFormatUnavailable as e:
+        parser.error(str(e))
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"Exported {written} bytes to {output} in {elapsed:.2f}s")
@@ -0,0 +1,118 @@
+"""
+Offline stand-in for the chat model, used by scripts/benchmark.py and the tests.
+
+FakeChatModel is a LangChain chat model, so callbacks, token usage and
+structured output go through the same code paths as with ChatOpenAI. Answers
+are derived from a hash of the prompt and the seed, so the same prompt always
+gets the same answer; only the simulated latency is random.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional, Type
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+
+from core.models import CombinedCommunicationAnalysis, MedicalAccuracyDetail, ScenarioWeights
+
+FAKE_TRANSCRIPT = (
+    "Hello, my name is Alex and I will be looking after you today. Can you confirm your name and "
+    "date of birth for me? I understand this might feel worrying, so please stop me at any point "
+    "if you have questions about what happens next."
+)
+
+
+def _message_text(message: BaseMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    # Multimodal content: keep the text parts and the size of the rest
+    return " ".join(
+        part.get("text", "") if isinstance(part, dict) and part.get("type") == "text" else f"<{len(str(part))}>"
+        for part in message.content
+    )
+
+
+def _detail(rng: random.Random, topic: str) -> Dict[str, Any]:
+    return {
+        "score": rng.randint(4, 9),
+        "explanation": f"The response covers most of the expected {topic} points but misses some detail.",
+        "strengths": [f"Clear attempt at {topic}"],
+        "improvements": [f"Be more specific about {topic}", "Check the patient's understanding"],
+    }
+
+
+def fake_structured_output(schema: Type[BaseModel], rng: random.Random) -> BaseModel:
+    """A schema-valid answer for the output schemas the analysis pipeline asks for"""
+    if schema is ScenarioWeights:
+        raw = [rng.uniform(0.5, 1.5) for _ in range(4)]
+        total = sum(raw)
+        medical, clarity, empathy, completeness = (value / total for value in raw)
+        return ScenarioWeights(
+            medical_accuracy=medical, communication_clarity=clarity, empathy_tone=empathy,
+            completeness=completeness, rationale="Safety and clear explanations matter most here"
+        )
+    if schema is MedicalAccuracyDetail:
+        return MedicalAccuracyDetail(**_detail(rng, "medical accuracy"), examples=["Confirm allergies first"])
+    if schema is CombinedCommunicationAnalysis:
+        return CombinedCommunicationAnalysis(
+            clarity=_detail(rng, "clarity"), empathy=_detail(rng, "empathy"), completeness=_detail(rng, "completeness")
+        )
+    raise ValueError(f"FakeChatModel has no canned output for {schema.__name__}")
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers after latency ± jitter seconds, reporting ~4 characters per token"""
+
+    model_name: str = "fake-chat-model"
+    latency: float = 0.2
+    jitter: float = 0.05
+    seed: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def _result(self, messages: List[BaseMessage], schema: Optional[Type[BaseModel]]) -> ChatResult:
+        prompt = "\n".join(_message_text(message) for message in messages)
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode("utf-8")).digest()
+        rng = random.Random(digest)
+        content = fake_structured_output(schema, rng).model_dump_json() if schema else FAKE_TRANSCRIPT
+        input_tokens, output_tokens = max(1, len(prompt) // 4), max(1, len(content) // 4)
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+            response_metadata={"model_name": self.model_name},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None,
+                  response_schema: Optional[Type[BaseModel]] = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._delay())
+        return self._result(messages, response_schema)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         response_schema: Optional[Type[BaseModel]] = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        return self._result(messages, response_schema)
+
+    def with_structured_output(self, schema: Type[BaseModel], **kwargs: Any):
+        return self.bind(response_schema=schema) | RunnableLambda(
+            lambda message: schema.model_validate(json.loads(message.content))
+        )
@@ -0,0 +1,32 @@
+import os
+import argparse
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import inspect
+from core.config import settings
+from core.database import create_db_engine
+from core.migrations import run_migrations
+
+def migrate(database_url: str):
+    print(f"Migrating database: {database_url}")
+    engine = create_db_engine(database_url)
+    applied = run_migrations(engine)
+    if applied:
+        print(f"Applied {len(applied)} migration(s): {', '.join(applied)}")
+    else:
+        print("Database schema is already up to date.")
+    
+    inspector = inspect(engine)
+    for table_name in ("practice_attempts", "feedback_analyses"):
+        indexes = [index["name"] for index in inspector.get_indexes(table_name)]
+        print(f"{table_name} indexes: {', '.join(indexes)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upgrade an existing healthcare_app.db to the current schema.")
+    parser.add_argument("--database-url", type=str, default=settings.database_url, help="SQLAlchemy URL of the database to migrate (defaults to DATABASE_URL).")
+    
+    args = parser.parse_args()
+    
+    migrate(args.database_url)
@@ -0,0 +1,39 @@
+import os
+import argparse
+import asyncio
+import signal
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.config import settings
+from core.container import AppContainer
+
+async def run(concurrency: int):
+    container = AppContainer()
+    container.job_workers.concurrency = concurrency
+    container.job_workers.start()
+    print(f"Processing analysis jobs from {settings.database_url} with {concurrency} worker(s). Press Ctrl+C to stop.")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+    except NotImplementedError:
+        pass  # Windows has no SIGTERM handler support; Ctrl+C still works
+    try:
+        await stop.wait()
+    finally:
+        print("Stopping workers; unfinished jobs are retried once their lease expires.")
+        await container.aclose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run analysis job workers outside the API process.")
+    parser.add_argument("--concurrency", type=int, default=max(settings.job_workers, 1), help="Number of jobs analyzed at the same time.")
+    
+    args = parser.parse_args()
+    
+    try:
+        asyncio.run(run(args.concurrency))
+    except KeyboardInterrupt:
+        pass
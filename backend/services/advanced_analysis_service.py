@@ -1,44 +1,61 @@
-from typing import Dict, Any, List
+import asyncio
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple, Union
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableParallel, RunnablePassthrough
+from langchain_core.runnables import RunnableConfig, RunnableLambda, RunnableParallel, RunnablePassthrough
 from pydantic import BaseModel, Field
 
 from core.config import settings
+from core.metrics import span
 from core.models import (
     Scenario, FeedbackAnalysis, ScoreDetail,
     MedicalAccuracyDetail,ScenarioWeights,CombinedCommunicationAnalysis
 )
+from services.feedback_index import FeedbackItem
+from services.llm_cache import LLMResponseCache, create_llm_cache, normalize_response_text
+from services.llm_calls import LLMCallPolicy
+from services.llm_scheduler import BATCH, llm_priority
 from services.storage_service import StorageService
+from services.weights_cache_service import ScenarioWeightsCache
 from prompts.analysis_system_prompts import get_analysis_system_prompt
 
 
 
+class AnalysisContext(BaseModel):
+    """Inputs of the analysis that do not depend on the user's response"""
+    weights: ScenarioWeights
+    rag_context: str = ""
+
+
 class AnalysisPipelineService:
-    def __init__(self):
-        self.llm = ChatOpenAI(
+    def __init__(self, llm: Optional[ChatOpenAI] = None, storage_service: Optional[StorageService] = None,
+                 response_cache: Optional[LLMResponseCache] = None, call_policy: Optional[LLMCallPolicy] = None):
+        self.llm = llm or ChatOpenAI(
             model=settings.llm_model,
             api_key=settings.gemini_api_key,
             base_url=settings.gemini_base_url,
             temperature=0.1
         )
         
-        self.storage_service = StorageService()
+        self.storage_service = storage_service or StorageService()
         
-        # Cache for scenario weights to avoid regenerating
-        self._weights_cache: Dict[str, ScenarioWeights] = {}
+        # Cache for scenario weights to avoid regenerating, shared across workers
+        self.weights_cache = ScenarioWeightsCache(self.storage_service.SessionLocal)
 
-    def _generate_scenario_weights(self, scenario: Scenario) -> ScenarioWeights:
-        """Generate appropriate weights for this scenario type"""
-        
-        # Check cache first
-        cache_key = f"{scenario.medical_area}_{scenario.difficulty}_{scenario.patient_type}"
-        if cache_key in self._weights_cache:
-            print(f"Using cached weights for scenario type: {cache_key}")
-            return self._weights_cache[cache_key]
-        
-        print(f"Generating new weights for scenario type: {cache_key}")
-        
+        # Specialist outputs for identical (scenario, response, context) submissions
+        self.response_cache = response_cache or create_llm_cache()
+
+        # Admission control, timeouts, retries and hedging of LLM calls, shared with transcription
+        self.llm_calls = call_policy or LLMCallPolicy()
+
+    def _model_name(self) -> str:
+        return getattr(self.llm, "model_name", None) or settings.llm_model
+
+    def _weights_cache_key(self, scenario: Scenario) -> str:
+        return f"{scenario.medical_area}_{scenario.difficulty.value}_{scenario.patient_type}"
+
+    def _build_weight_chain(self):
+        """Build the chain that asks the LLM for scenario-specific weights"""
         weight_prompt = ChatPromptTemplate.from_messages([
             ("system", get_analysis_system_prompt("weight_generation")),
             ("user", """
@@ -54,9 +71,10 @@ class AnalysisPipelineService:
             """)
         ])
         
-        chain = weight_prompt | self.llm.with_structured_output(ScenarioWeights)
-        
-        weights = chain.invoke({
+        return weight_prompt | self.llm.with_structured_output(ScenarioWeights)
+
+    def _weight_chain_inputs(self, scenario: Scenario) -> Dict[str, Any]:
+        return {
             "title": scenario.title,
             "description": scenario.description,
             "context": scenario.context,
@@ -64,9 +82,10 @@ class AnalysisPipelineService:
             "difficulty": scenario.difficulty,
             "patient_type": scenario.patient_type,
             "key_points": ", ".join(scenario.key_points)
-        })
-        
-        # Ensure weights sum to 1.0 (normalize if needed)
+        }
+
+    def _normalize_weights(self, weights: ScenarioWeights) -> ScenarioWeights:
+        """Ensure weights sum to 1.0 (normalize if needed)"""
         total = weights.medical_accuracy + weights.communication_clarity + weights.empathy_tone + weights.completeness
         if abs(total - 1.0) > 0.01:  # Allow small floating point variance
             weights.medical_accuracy /= total
@@ -74,89 +93,240 @@ class AnalysisPipelineService:
             weights.empathy_tone /= total
             weights.completeness /= total
             print(f"Normalized weights to sum to 1.0 (was {total})")
-        
-        # Cache the weights
-        self._weights_cache[cache_key] = weights        
         return weights
 
-    def _create_specialist_chain(self, system_prompt: str, output_schema: Any, user_prompt_template: str):
+    def _generate_scenario_weights(self, scenario: Scenario) -> ScenarioWeights:
+        """Generate appropriate weights for this scenario type"""
+        cache_key = self._weights_cache_key(scenario)
+
+        with span("weights", outcome="hit") as timing:
+            def generate() -> ScenarioWeights:
+                timing.outcome = "miss"
+                print(f"Generating new weights for scenario type: {cache_key}")
+                chain, inputs = self._build_weight_chain(), self._weight_chain_inputs(scenario)
+                try:
+                    with self.storage_service.llm_usage.track("weights", self._model_name(), scenario_id=scenario.id) as usage:
+                        weights = self.llm_calls.run("weights", lambda: chain.invoke(inputs, usage.config()))
+                finally:
+                    # No attempt's save will pick the call up, so write it now
+                    self.storage_service.llm_usage.save_unattributed()
+                return self._normalize_weights(weights)
+
+            return self.weights_cache.get_or_create(cache_key, generate)
+
+    async def _generate_scenario_weights_async(self, scenario: Scenario) -> ScenarioWeights:
+        """Async variant of _generate_scenario_weights"""
+        cache_key = self._weights_cache_key(scenario)
+
+        with span("weights", outcome="hit") as timing:
+            async def generate() -> ScenarioWeights:
+                timing.outcome = "miss"
+                print(f"Generating new weights for scenario type: {cache_key}")
+                chain, inputs = self._build_weight_chain(), self._weight_chain_inputs(scenario)
+                try:
+                    with self.storage_service.llm_usage.track("weights", self._model_name(), scenario_id=scenario.id) as usage:
+                        weights = await self.llm_calls.arun("weights", lambda: chain.ainvoke(inputs, usage.config()))
+                finally:
+                    await asyncio.to_thread(self.storage_service.llm_usage.save_unattributed)
+                return self._normalize_weights(weights)
+
+            return await self.weights_cache.aget_or_create(cache_key, generate)
+
+    def invalidate_weights(self, scenario: Optional[Scenario] = None) -> int:
+        """Drop cached weights for one scenario's type, or for every type"""
+        cache_key = self._weights_cache_key(scenario) if scenario else None
+        return self.weights_cache.invalidate(cache_key)
+
+    async def warm_weights_cache(self, scenarios: List[Scenario]) -> int:
+        """Make sure weights exist for every given scenario. Returns the number of distinct types."""
+        distinct = {self._weights_cache_key(s): s for s in scenarios}
+        # Background work; requests from users go first
+        with llm_priority(BATCH):
+            results = await asyncio.gather(
+                *(self._generate_scenario_weights_async(s) for s in distinct.values()),
+                return_exceptions=True
+            )
+        for key, result in zip(distinct, results):
+            if isinstance(result, Exception):
+                print(f"Error warming weights for scenario type {key}: {result}")
+        return len(distinct)
+
+    def _create_specialist_chain(self, name: str, system_prompt: str, output_schema: Any, user_prompt_template: str):
         """A factory function to create a single analysis chain."""
         prompt = ChatPromptTemplate.from_messages([
             ("system", system_prompt),
             ("user", user_prompt_template)
         ])
-        return prompt | self.llm.with_structured_output(output_schema)
+        chain = prompt | self.llm.with_structured_output(output_schema)
+        return self._with_response_cache(
+            name, chain, system_prompt, output_schema, user_prompt_template, prompt.input_variables
+        )
+
+    def _response_cache_key(self, system_prompt: str, output_schema: Any, user_prompt_template: str,
+                            variables: List[str], inputs: Dict[str, Any]) -> str:
+        """Content address of a specialist call: the prompt text plus every value formatted into it"""
+        values = {name: inputs.get(name) for name in variables}
+        if "user_response" in values:
+            values["user_response"] = normalize_response_text(values["user_response"])
+        return self.response_cache.make_key(
+            model=self._model_name(),
+            system_prompt=system_prompt,
+            user_prompt_template=user_prompt_template,
+            output_schema=output_schema.__name__,
+            inputs=values
+        )
+
+    def _with_response_cache(self, name: str, chain, system_prompt: str, output_schema: Any,
+                             user_prompt_template: str, variables: List[str]):
+        """Serve a specialist chain from the response cache, calling the LLM only on a miss.
+
+        Every call is timed as the stage llm.<name>, labelled hit or miss when the cache is on,
+        and its token usage is recorded for the attempt_id in the inputs. Calls that reach the
+        LLM go through the call policy under the name of the specialist.
+        """
+        cache = self.response_cache
+        llm_calls = self.llm_calls
+        stage = f"llm.{name}"
+
+        def cache_key(inputs: Dict[str, Any]) -> str:
+            return self._response_cache_key(system_prompt, output_schema, user_prompt_template, variables, inputs)
+
+        def track(inputs: Dict[str, Any]):
+            return self.storage_service.llm_usage.track(
+                stage, self._model_name(), inputs.get("attempt_id"), inputs.get("scenario_id"), inputs.get("user_id")
+            )
+
+        def invoke(inputs: Dict[str, Any], config: RunnableConfig):
+            with span(stage) as timing, track(inputs) as usage:
+                if not cache.enabled:
+                    return llm_calls.run(name, lambda: chain.invoke(inputs, usage.config(config)))
+                key = cache_key(inputs)
+                cached = cache.get(key, output_schema)
+                if cached is not None:
+                    timing.outcome = "hit"
+                    usage.cached = True
+                    return cached
+                timing.outcome = "miss"
+                result = llm_calls.run(name, lambda: chain.invoke(inputs, usage.config(config)))
+                cache.set(key, result)
+                return result
+
+        async def ainvoke(inputs: Dict[str, Any], config: RunnableConfig):
+            with span(stage) as timing, track(inputs) as usage:
+                if not cache.enabled:
+                    return await llm_calls.arun(name, lambda: chain.ainvoke(inputs, usage.config(config)))
+                key = cache_key(inputs)
+                if cache.backend.blocking:
+                    cached = await asyncio.to_thread(cache.get, key, output_schema)
+                else:
+                    cached = cache.get(key, output_schema)
+                if cached is not None:
+                    timing.outcome = "hit"
+                    usage.cached = True
+                    return cached
+                timing.outcome = "miss"
+                result = await llm_calls.arun(name, lambda: chain.ainvoke(inputs, usage.config(config)))
+                if cache.backend.blocking:
+                    await asyncio.to_thread(cache.set, key, result)
+                else:
+                    cache.set(key, result)
+                return result
+
+        return RunnableLambda(invoke, afunc=ainvoke)
 
     def _aggregate_results_with_weights(self, parallel_output: Dict[str, Any], attempt_id: str, 
                                       past_feedback_exists: bool, weights: ScenarioWeights) -> FeedbackAnalysis:
         """Aggregate all analysis results into final feedback using weighted scoring"""
-        medical = parallel_output['medical']
-        combined_comm = parallel_output['combined_communication']
-        passthrough = parallel_output['passthrough']
-        clarity = combined_comm.clarity
-        empathy = combined_comm.empathy
-        completeness = combined_comm.completeness
-
-        # Calculate weighted overall score
-        weighted_score = (
-            medical.score * weights.medical_accuracy +
-            clarity.score * weights.communication_clarity +
-            empathy.score * weights.empathy_tone +
-            completeness.score * weights.completeness
-        )
-        overall_score = round(weighted_score, 2)
+        with span("aggregation"):
+            medical = parallel_output['medical']
+            combined_comm = parallel_output['combined_communication']
+            passthrough = parallel_output['passthrough']
+            clarity = combined_comm.clarity
+            empathy = combined_comm.empathy
+            completeness = combined_comm.completeness
 
-        # Generate feedback mentioning the weighting rationale
-        general_feedback = f"Overall Score: {overall_score}/10 (weighted scoring applied). "
+            # Calculate weighted overall score
+            weighted_score = (
+                medical.score * weights.medical_accuracy +
+                clarity.score * weights.communication_clarity +
+                empathy.score * weights.empathy_tone +
+                completeness.score * weights.completeness
+            )
+            overall_score = round(weighted_score, 2)
+
+            # Generate feedback mentioning the weighting rationale
+            general_feedback = f"Overall Score: {overall_score}/10 (weighted scoring applied). "
         
-        # Identify top performing categories
-        category_scores = [
-            ("medical accuracy", medical.score, weights.medical_accuracy),
-            ("clarity", clarity.score, weights.communication_clarity),
-            ("empathy", empathy.score, weights.empathy_tone),
-            ("completeness", completeness.score, weights.completeness)
-        ]
+            # Identify top performing categories
+            category_scores = [
+                ("medical accuracy", medical.score, weights.medical_accuracy),
+                ("clarity", clarity.score, weights.communication_clarity),
+                ("empathy", empathy.score, weights.empathy_tone),
+                ("completeness", completeness.score, weights.completeness)
+            ]
         
-        strengths = [name for name, score, weight in category_scores if score > 8]
-        if strengths:
-            general_feedback += f"Your key strengths were in {', '.join(strengths)}. "
+            strengths = [name for name, score, weight in category_scores if score > 8]
+            if strengths:
+                general_feedback += f"Your key strengths were in {', '.join(strengths)}. "
+
+            # Add weight context
+            highest_weight_category = max(category_scores, key=lambda x: x[2])
+            general_feedback += f"For this scenario type, {highest_weight_category[0]} was weighted most heavily ({highest_weight_category[2]:.1%}) because {weights.rationale.lower()}. "
+
+            if past_feedback_exists:
+                general_feedback += "Considering your past performance, it's great to see you're applying feedback effectively. Keep up the great work. "
+            else:
+                general_feedback += "This is a great starting point. "
 
-        # Add weight context
-        highest_weight_category = max(category_scores, key=lambda x: x[2])
-        general_feedback += f"For this scenario type, {highest_weight_category[0]} was weighted most heavily ({highest_weight_category[2]:.1%}) because {weights.rationale.lower()}. "
+            general_feedback += "Continue practicing to refine your skills further."
+
+            return FeedbackAnalysis(
+                attempt_id=attempt_id,
+                scenario_id=passthrough['scenario_id'],
+                medical_accuracy=ScoreDetail(
+                    score=medical.score,
+                    explanation=medical.explanation,
+                    strengths=medical.strengths,
+                    improvements=medical.improvements,
+                    examples=medical.examples if hasattr(medical, 'examples') else []
+                ),
+                communication_clarity=ScoreDetail(**clarity.dict()),
+                empathy_tone=ScoreDetail(**empathy.dict()),
+                completeness=ScoreDetail(**completeness.dict()),
+                overall_score=overall_score,
+                general_feedback=general_feedback
+            )
 
-        if past_feedback_exists:
-            general_feedback += "Considering your past performance, it's great to see you're applying feedback effectively. Keep up the great work. "
+    def _rag_queries(self, scenario: Scenario) -> List[str]:
+        return scenario.key_points or [scenario.title]
+
+    def get_rag_context(self, user_id: str, scenario: Scenario) -> str:
+        """Get past feedback of this user that is relevant to the scenario's key points"""
+        index = self.storage_service.feedback_index
+        with span("rag", outcome="hit" if index.is_fresh(user_id) else "miss"):
+            items = index.search(user_id, self._rag_queries(scenario), scenario.id)
+        return self._format_rag_context(items)
+
+    async def get_rag_context_async(self, user_id: str, scenario: Scenario) -> str:
+        """Async variant of get_rag_context; only a user whose index must be (re)loaded needs a worker thread"""
+        index = self.storage_service.feedback_index
+        if index.is_fresh(user_id):
+            with span("rag", outcome="hit"):
+                items = index.search(user_id, self._rag_queries(scenario), scenario.id)
         else:
-            general_feedback += "This is a great starting point. "
-
-        general_feedback += "Continue practicing to refine your skills further."
-
-        return FeedbackAnalysis(
-            attempt_id=attempt_id,
-            scenario_id=passthrough['scenario_id'],
-            medical_accuracy=ScoreDetail(
-                score=medical.score,
-                explanation=medical.explanation,
-                strengths=medical.strengths,
-                improvements=medical.improvements,
-                examples=medical.examples if hasattr(medical, 'examples') else []
-            ),
-            communication_clarity=ScoreDetail(**clarity.dict()),
-            empathy_tone=ScoreDetail(**empathy.dict()),
-            completeness=ScoreDetail(**completeness.dict()),
-            overall_score=overall_score,
-            general_feedback=general_feedback
-        )
+            with span("rag", outcome="miss"):
+                items = await asyncio.to_thread(index.search, user_id, self._rag_queries(scenario), scenario.id)
+        return self._format_rag_context(items)
 
-    def get_rag_context(self, user_id: str):
-        """Get relevant context from past feedback for this user"""
-        past_feedback_list = self.storage_service.get_recent_feedback_for_user(user_id)
+    def _format_rag_context(self, items: List[FeedbackItem]) -> str:
         rag_context = ""
-        if past_feedback_list:
-            feedback_points = "\n".join(f"- {fb}" for fb in past_feedback_list)
+        if items:
+            feedback_points = "\n".join(
+                f"- [{item.category.replace('_', ' ').title()}] {item.text}" for item in items
+            )
             rag_context = (
-                "**IMPORTANT CONTEXT**: This user has received the following feedback on previous attempts. "
+                "**IMPORTANT CONTEXT**: This user received the following feedback on earlier attempts "
+                "covering this scenario's key points. "
                 "Pay close attention to see if they have improved in these areas.\n"
                 "---\n"
                 f"{feedback_points}\n"
@@ -164,14 +334,8 @@ class AnalysisPipelineService:
             )
         return rag_context
     
-    def analyze_response(self, attempt_id: str, scenario: Scenario, user_response: str, user_id: str) -> FeedbackAnalysis:
-        """Main analysis method with cost-optimized weighted scoring system"""
-        
-        # Step 1: Generate/retrieve weights for this scenario type
-        weights = self._generate_scenario_weights(scenario)
-        
-        # Get RAG context for analyses
-        rag_context = self.get_rag_context(user_id)
+    def _specialist_chains(self) -> Dict[str, Any]:
+        """The specialist chains by output key; RAG context arrives as the rag_context input"""
         base_user_prompt = """
             Scenario Context: {context}
             Key Points to Cover: {key_points}
@@ -182,30 +346,171 @@ class AnalysisPipelineService:
             Please provide your analysis based ONLY on your specific role.
             """
 
-        enhanced_user_prompt = rag_context + base_user_prompt
+        enhanced_user_prompt = "{rag_context}" + base_user_prompt
 
-        parallel_chains = RunnableParallel(
-            medical=self._create_specialist_chain(
+        return {
+            "medical": self._create_specialist_chain(
+                name="medical",
                 system_prompt=get_analysis_system_prompt("enhanced_medical"),
                 output_schema=MedicalAccuracyDetail,
                 user_prompt_template=base_user_prompt
             ),
-            combined_communication=self._create_specialist_chain(
+            "combined_communication": self._create_specialist_chain(
+                name="combined_communication",
                 system_prompt=get_analysis_system_prompt("combined_communication"),
                 output_schema=CombinedCommunicationAnalysis,
                 user_prompt_template=enhanced_user_prompt
-            ),
-            passthrough=RunnablePassthrough()
-        )
+            )
+        }
+
+    def _build_specialist_chains(self) -> RunnableParallel:
+        """The specialist chains run side by side"""
+        return RunnableParallel(**self._specialist_chains(), passthrough=RunnablePassthrough())
 
-        full_pipeline = parallel_chains | (
-            lambda x: self._aggregate_results_with_weights(x, attempt_id, rag_context != "", weights))
+    def _build_analysis_pipeline(self, attempt_id: str, weights: ScenarioWeights):
+        """Build the parallel specialist chains followed by weighted aggregation"""
+        return self._build_specialist_chains() | (
+            lambda x: self._aggregate_results_with_weights(
+                x, attempt_id, x['passthrough']['rag_context'] != "", weights))
 
-        final_feedback = full_pipeline.invoke({
+    def _pipeline_inputs(self, scenario: Scenario, user_response: str, rag_context: str = "",
+                         attempt_id: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
+        # attempt_id and user_id aren't prompt variables; they attribute LLM usage to the attempt
+        return {
             "context": scenario.context,
             "key_points": ", ".join(scenario.key_points),
             "user_response": user_response,
-            "scenario_id": scenario.id
-        })
+            "scenario_id": scenario.id,
+            "rag_context": rag_context,
+            "attempt_id": attempt_id,
+            "user_id": user_id
+        }
+
+    def analyze_response(self, attempt_id: str, scenario: Scenario, user_response: str, user_id: str) -> FeedbackAnalysis:
+        """Main analysis method with cost-optimized weighted scoring system"""
+        
+        # Step 1: Generate/retrieve weights for this scenario type
+        weights = self._generate_scenario_weights(scenario)
         
-        return final_feedback
\ No newline at end of file
+        # Get RAG context for analyses
+        rag_context = self.get_rag_context(user_id, scenario)
+
+        full_pipeline = self._build_analysis_pipeline(attempt_id, weights)
+        final_feedback = full_pipeline.invoke(
+            self._pipeline_inputs(scenario, user_response, rag_context, attempt_id, user_id)
+        )
+        
+        return final_feedback
+
+    async def prepare_analysis(self, scenario: Scenario, user_id: str) -> AnalysisContext:
+        """Resolve the weights and RAG context concurrently; neither depends on the response text"""
+        weights, rag_context = await asyncio.gather(
+            self._generate_scenario_weights_async(scenario),
+            self.get_rag_context_async(user_id, scenario)
+        )
+        return AnalysisContext(weights=weights, rag_context=rag_context)
+
+    async def analyze_response_async(self, attempt_id: str, scenario: Scenario, user_response: str, user_id: str,
+                                     context: Optional[AnalysisContext] = None) -> FeedbackAnalysis:
+        """Non-blocking variant of analyze_response for use inside the event loop.
+
+        Pass a context from prepare_analysis that was started earlier, e.g.
+        alongside transcription, to skip waiting on weights and RAG here.
+        """
+        context = context or await self.prepare_analysis(scenario, user_id)
+
+        full_pipeline = self._build_analysis_pipeline(attempt_id, context.weights)
+        return await full_pipeline.ainvoke(
+            self._pipeline_inputs(scenario, user_response, context.rag_context, attempt_id, user_id)
+        )
+
+    async def analyze_response_stream(self, attempt_id: str, scenario: Scenario, user_response: str,
+                                      user_id: str, context: Optional[AnalysisContext] = None
+                                      ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of analyze_response_async.
+
+        Yields ("medical", MedicalAccuracyDetail) and ("combined_communication",
+        CombinedCommunicationAnalysis) in the order the specialists finish, then
+        ("feedback", FeedbackAnalysis) with the weighted result.
+        """
+        context = context or await self.prepare_analysis(scenario, user_id)
+        weights, rag_context = context.weights, context.rag_context
+        inputs = self._pipeline_inputs(scenario, user_response, rag_context, attempt_id, user_id)
+
+        tasks = {
+            asyncio.create_task(chain.ainvoke(inputs)): name
+            for name, chain in self._specialist_chains().items()
+        }
+        outputs: Dict[str, Any] = {"passthrough": inputs}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    outputs[tasks[task]] = task.result()
+                    yield tasks[task], outputs[tasks[task]]
+        finally:
+            # The client went away or a specialist failed; don't leave LLM calls running
+            for task in pending:
+                task.cancel()
+
+        yield "feedback", self._aggregate_results_with_weights(outputs, attempt_id, rag_context != "", weights)
+
+    async def analyze_batch_async(self, submissions: List[Tuple[str, Scenario, str, str]],
+                                  max_concurrency: int = 8) -> List[Union[FeedbackAnalysis, Exception]]:
+        """
+        Analyze many (attempt_id, scenario, user_response, user_id) submissions at once.
+
+        Weights are resolved once per scenario and RAG context once per (user, scenario),
+        then every submission goes through a single `abatch` of the specialist
+        chains capped at max_concurrency. Results line up with submissions;
+        a failed item yields its exception instead of failing the batch.
+        The LLM calls run at batch priority, behind interactive submissions.
+        """
+        with llm_priority(BATCH):
+            return await self._analyze_batch(submissions, max_concurrency)
+
+    async def _analyze_batch(self, submissions: List[Tuple[str, Scenario, str, str]],
+                             max_concurrency: int) -> List[Union[FeedbackAnalysis, Exception]]:
+        scenarios = {scenario.id: scenario for _, scenario, _, _ in submissions}
+        rag_keys = list(dict.fromkeys((user_id, scenario.id) for _, scenario, _, user_id in submissions))
+
+        # Weights and RAG lookups are independent of each other, so all of them run together
+        resolved = await asyncio.gather(
+            *(self._generate_scenario_weights_async(s) for s in scenarios.values()),
+            *(self.get_rag_context_async(user_id, scenarios[scenario_id]) for user_id, scenario_id in rag_keys),
+            return_exceptions=True
+        )
+        weights_by_scenario = dict(zip(scenarios, resolved[:len(scenarios)]))
+        rag_by_key = dict(zip(rag_keys, resolved[len(scenarios):]))
+
+        results: List[Union[FeedbackAnalysis, Exception, None]] = [None] * len(submissions)
+        pending, inputs = [], []
+        for index, (attempt_id, scenario, user_response, user_id) in enumerate(submissions):
+            weights, rag_context = weights_by_scenario[scenario.id], rag_by_key[(user_id, scenario.id)]
+            if isinstance(weights, Exception):
+                results[index] = weights
+            elif isinstance(rag_context, Exception):
+                results[index] = rag_context
+            else:
+                pending.append(index)
+                inputs.append(self._pipeline_inputs(scenario, user_response, rag_context, attempt_id, user_id))
+
+        outputs = await self._build_specialist_chains().abatch(
+            inputs, config={"max_concurrency": max_concurrency}, return_exceptions=True
+        ) if inputs else []
+
+        for index, output in zip(pending, outputs):
+            if isinstance(output, Exception):
+                results[index] = output
+                continue
+            attempt_id, scenario = submissions[index][0], submissions[index][1]
+            try:
+                results[index] = self._aggregate_results_with_weights(
+                    output, attempt_id, output['passthrough']['rag_context'] != "",
+                    weights_by_scenario[scenario.id]
+                )
+            except Exception as e:
+                results[index] = e
+        return results
@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import Integer, cast, func
+from core.models import (
+    AnalyticsSummary, FEEDBACK_CATEGORIES, FeedbackAnalysisDB, HistogramBucket,
+    ScenarioStats, ScoreStats, TrendPoint
+)
+from services.storage_service import ResultFilters, filter_feedback_query
+
+TREND_BUCKETS = ("day", "week", "month")
+# Number of attempts averaged at each end of the window for the improvement indicator
+TREND_SAMPLE_SIZE = 5
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+class AnalyticsService:
+    """
+    Dashboard aggregates computed with SQL over feedback_analyses.
+
+    Every statistic is a GROUP BY/aggregate query, so the response size
+    depends on the number of buckets and scenarios, not on the number of
+    feedback rows in the window.
+    """
+
+    def __init__(self, session_factory):
+        self.SessionLocal = session_factory
+
+    def _period_expression(self, dialect: str, bucket: str):
+        timestamp = FeedbackAnalysisDB.timestamp
+        if dialect == "postgresql":
+            formats = {"day": "YYYY-MM-DD", "week": "IYYY-\"W\"IW", "month": "YYYY-MM"}
+            return func.to_char(timestamp, formats[bucket])
+        if bucket == "week":
+            # ISO week, as on PostgreSQL: the week and year of the week's Thursday
+            # (strftime's %G/%V need SQLite 3.46)
+            thursday = func.date(timestamp, "-3 days", "weekday 4")
+            week = (cast(func.strftime("%j", thursday), Integer) - 1) // 7 + 1
+            return func.printf("%s-W%02d", func.strftime("%Y", thursday), week)
+        formats = {"day": "%Y-%m-%d", "month": "%Y-%m"}
+        return func.strftime(formats[bucket], timestamp)
+
+    def _bucket_expression(self, dialect: str):
+        score = FeedbackAnalysisDB.overall_score
+        if dialect == "postgresql":
+            # CAST rounds on PostgreSQL; floor first so 7.9 lands in bucket 7
+            return cast(func.floor(score), Integer)
+        return cast(score, Integer)
+
+    def _stats(self, average, minimum, maximum) -> ScoreStats:
+        return ScoreStats(average=_round(average), minimum=minimum, maximum=maximum)
+
+    def get_summary(self, filters: Optional[ResultFilters] = None, bucket: str = "day") -> AnalyticsSummary:
+        """Compute overall, per-category, histogram, trend and per-scenario statistics"""
+        if bucket not in TREND_BUCKETS:
+            raise ValueError(f"bucket must be one of {', '.join(TREND_BUCKETS)}")
+        filters = filters or ResultFilters()
+        db = self.SessionLocal()
+        try:
+            def base(*columns):
+                return filter_feedback_query(db.query(*columns).select_from(FeedbackAnalysisDB), filters)
+
+            score = FeedbackAnalysisDB.overall_score
+            category_columns = []
+            for category in FEEDBACK_CATEGORIES:
+                column = getattr(FeedbackAnalysisDB, f"{category}_score")
+                category_columns += [func.avg(column), func.min(column), func.max(column)]
+
+            totals = base(
+                func.count(FeedbackAnalysisDB.id), func.avg(score), func.min(score), func.max(score),
+                *category_columns
+            ).one()
+            total_attempts = totals[0] or 0
+
+            categories = {
+                category: self._stats(*totals[4 + 3 * i: 7 + 3 * i])
+                for i, category in enumerate(FEEDBACK_CATEGORIES)
+            }
+
+            last_week = datetime.now() - timedelta(days=7)
+            attempts_last_7_days = base(func.count(FeedbackAnalysisDB.id)) \
+                .filter(FeedbackAnalysisDB.timestamp > last_week).scalar() or 0
+
+            dialect = db.get_bind().dialect.name
+            lower = self._bucket_expression(dialect)
+            histogram = [
+                HistogramBucket(lower=row[0], count=row[1])
+                for row in base(lower, func.count(FeedbackAnalysisDB.id))
+                .group_by(lower).order_by(lower).all()
+                if row[0] is not None
+            ]
+
+            period = self._period_expression(dialect, bucket)
+            trend = [
+                TrendPoint(period=row[0], attempts=row[1], average_score=_round(row[2]))
+                for row in base(period, func.count(FeedbackAnalysisDB.id), func.avg(score))
+                .group_by(period).order_by(period).all()
+            ]
+
+            scenarios = [
+                ScenarioStats(
+                    scenario_id=row[0], attempts=row[1],
+                    average=_round(row[2]), minimum=row[3], maximum=row[4]
+                )
+                for row in base(
+                    FeedbackAnalysisDB.scenario_id, func.count(FeedbackAnalysisDB.id),
+                    func.avg(score), func.min(score), func.max(score)
+                )
+                .group_by(FeedbackAnalysisDB.scenario_id).order_by(FeedbackAnalysisDB.scenario_id).all()
+            ]
+
+            def edge_average(newest: bool) -> Optional[float]:
+                order = FeedbackAnalysisDB.timestamp.desc() if newest else FeedbackAnalysisDB.timestamp.asc()
+                sample = base(score.label("score")) \
+                    .order_by(order).limit(TREND_SAMPLE_SIZE).subquery()
+                return _round(db.query(func.avg(sample.c.score)).scalar())
+
+            return AnalyticsSummary(
+                total_attempts=total_attempts,
+                attempts_last_7_days=attempts_last_7_days,
+                overall=self._stats(*totals[1:4]),
+                categories=categories,
+                histogram=histogram,
+                trend=trend,
+                scenarios=scenarios,
+                recent_average=edge_average(newest=True),
+                earlier_average=edge_average(newest=False)
+            )
+        finally:
+            db.close()
@@ -0,0 +1,181 @@
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Tuple
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from core.models import DailySummaryDB, DailyScenarioCountDB, DailyScoreBucketDB, LegacySummaryImportDB
+
+# (date, attempt_id, scenario_id, score, timestamp)
+SummaryEntry = Tuple[str, str, str, float, str]
+
+
+def score_bucket(score: float) -> int:
+    """Whole-point histogram bucket for a 0-10 score"""
+    return min(max(int(score), 0), 10)
+
+
+class DailySummaryStore:
+    """
+    Daily practice aggregates kept as running counters.
+
+    Each saved feedback increments the day's count, score sum, per-scenario
+    count and score bucket with single-row upserts inside the caller's
+    transaction, so recording an attempt costs the same no matter how many
+    attempts the day already has. Per-attempt rows are appended to
+    `attempts_YYYY-MM-DD.jsonl`, and `summary_YYYY-MM-DD.json` is rewritten
+    from the aggregates rather than from the attempt list.
+    """
+
+    def __init__(self, session_factory, summaries_dir: str):
+        self.SessionLocal = session_factory
+        self.summaries_dir = summaries_dir
+
+    def summary_path(self, date: str) -> str:
+        return os.path.join(self.summaries_dir, f"summary_{date}.json")
+
+    def log_path(self, date: str) -> str:
+        return os.path.join(self.summaries_dir, f"attempts_{date}.jsonl")
+
+    def _increment(self, db: Session, model, keys: Dict, increments: Dict):
+        """Atomically add increments to the row identified by keys, creating it if needed"""
+        dialect = db.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+            stmt = insert(model).values(**keys, **increments)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(keys),
+                set_={name: getattr(model, name) + stmt.excluded[name] for name in increments}
+            )
+            db.execute(stmt)
+            return
+
+        conditions = [getattr(model, name) == value for name, value in keys.items()]
+        updated = db.execute(
+            update(model).where(*conditions).values(
+                **{name: getattr(model, name) + value for name, value in increments.items()}
+            )
+        ).rowcount
+        if not updated:
+            db.add(model(**keys, **increments))
+            db.flush()
+
+    def record(self, db: Session, scenario_id: str, overall_score: float, timestamp: datetime) -> str:
+        """Add one attempt to the day's aggregates in the caller's transaction. Returns the date key."""
+        date = timestamp.strftime("%Y-%m-%d")
+        self._increment(db, DailySummaryDB, {"date": date},
+                        {"total_attempts": 1, "score_sum": overall_score})
+        self._increment(db, DailyScenarioCountDB, {"date": date, "scenario_id": scenario_id},
+                        {"attempts": 1})
+        self._increment(db, DailyScoreBucketDB, {"date": date, "bucket": score_bucket(overall_score)},
+                        {"attempts": 1})
+        return date
+
+    def record_many(self, db: Session, attempts: List[Tuple[str, float, datetime]]) -> List[str]:
+        """Add (scenario_id, score, timestamp) attempts with one upsert per distinct row. Returns the date keys."""
+        dates = []
+        totals: Dict[str, List[float]] = {}
+        scenario_counts: Dict[Tuple[str, str], int] = {}
+        bucket_counts: Dict[Tuple[str, int], int] = {}
+        for scenario_id, overall_score, timestamp in attempts:
+            date = timestamp.strftime("%Y-%m-%d")
+            dates.append(date)
+            total = totals.setdefault(date, [0, 0.0])
+            total[0] += 1
+            total[1] += overall_score
+            scenario_counts[(date, scenario_id)] = scenario_counts.get((date, scenario_id), 0) + 1
+            bucket = (date, score_bucket(overall_score))
+            bucket_counts[bucket] = bucket_counts.get(bucket, 0) + 1
+
+        for date, (count, score_sum) in totals.items():
+            self._increment(db, DailySummaryDB, {"date": date},
+                            {"total_attempts": count, "score_sum": score_sum})
+        for (date, scenario_id), count in scenario_counts.items():
+            self._increment(db, DailyScenarioCountDB, {"date": date, "scenario_id": scenario_id},
+                            {"attempts": count})
+        for (date, bucket), count in bucket_counts.items():
+            self._increment(db, DailyScoreBucketDB, {"date": date, "bucket": bucket},
+                            {"attempts": count})
+        return dates
+
+    def get_summary(self, date: str) -> Dict:
+        """Build the day's summary from the aggregates (without the per-attempt list)"""
+        db = self.SessionLocal()
+        try:
+            totals = db.get(DailySummaryDB, date)
+            total = totals.total_attempts if totals else 0
+            scenarios = db.query(DailyScenarioCountDB).filter(DailyScenarioCountDB.date == date).all()
+            buckets = db.query(DailyScoreBucketDB).filter(DailyScoreBucketDB.date == date).all()
+            return {
+                "date": date,
+                "total_attempts": total,
+                "average_score": round(totals.score_sum / total, 2) if total else 0,
+                "scenarios_practiced": {row.scenario_id: row.attempts for row in scenarios},
+                "score_histogram": {str(row.bucket): row.attempts for row in sorted(buckets, key=lambda r: r.bucket)},
+                "attempts_log": os.path.basename(self.log_path(date))
+            }
+        finally:
+            db.close()
+
+    def _import_legacy_summary(self, date: str):
+        """
+        Move the attempt list of an old-format summary file into the append-only log and aggregates.
+
+        A legacy_summary_imports row is inserted in the same transaction as the
+        counters, so when several writers find the same file only the first
+        one imports it.
+        """
+        summary_path = self.summary_path(date)
+        if os.path.exists(self.log_path(date)) or not os.path.exists(summary_path):
+            return
+        with open(summary_path, 'r') as f:
+            legacy = json.load(f)
+        attempts = legacy.get("attempts")
+        if not attempts:
+            return
+
+        db = self.SessionLocal()
+        try:
+            db.add(LegacySummaryImportDB(date=date, attempts=len(attempts), imported_at=datetime.now()))
+            try:
+                db.flush()
+            except IntegrityError:
+                # Another writer has imported this day
+                db.rollback()
+                return
+            for attempt in attempts:
+                self._increment(db, DailySummaryDB, {"date": date},
+                                {"total_attempts": 1, "score_sum": attempt["score"]})
+                self._increment(db, DailyScenarioCountDB, {"date": date, "scenario_id": attempt["scenario_id"]},
+                                {"attempts": 1})
+                self._increment(db, DailyScoreBucketDB, {"date": date, "bucket": score_bucket(attempt["score"])},
+                                {"attempts": 1})
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self._append_log(date, attempts)
+
+    def _append_log(self, date: str, rows: List[Dict]):
+        lines = "".join(json.dumps(row, default=str, ensure_ascii=False) + "\n" for row in rows)
+        with open(self.log_path(date), 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+    def write_entries(self, entries: List[SummaryEntry], save_json):
+        """Append attempts to the daily logs and rewrite each affected summary snapshot once"""
+        by_date: Dict[str, List[Dict]] = {}
+        for date, attempt_id, scenario_id, score, timestamp in entries:
+            by_date.setdefault(date, []).append({
+                "attempt_id": attempt_id,
+                "scenario_id": scenario_id,
+                "score": score,
+                "timestamp": timestamp
+            })
+        for date, rows in by_date.items():
+            self._import_legacy_summary(date)
+            self._append_log(date, rows)
+            save_json(self.get_summary(date), self.summary_path(date))
@@ -0,0 +1,181 @@
+import csv
+import io
+import json
+from typing import Dict, Iterator, List, Optional
+from core.models import FeedbackAnalysisDB, PracticeAttemptDB
+from services.storage_service import ResultFilters, filter_feedback_query
+
+EXPORT_FIELDS = [
+    'attempt_id', 'scenario_id', 'timestamp', 'overall_score',
+    'medical_accuracy_score', 'communication_clarity_score',
+    'empathy_tone_score', 'completeness_score', 'user_id'
+]
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+class ExportFormatUnavailable(RuntimeError):
+    """The export format needs an optional package that is not installed"""
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ExportFormatUnavailable("Parquet export requires pyarrow (pip install pyarrow)") from e
+    return pa, pq
+
+
+class _ChunkSink:
+    """Write-only file object that hands out what was written since the last drain.
+
+    tell() keeps counting the total so Parquet footers get correct offsets.
+    """
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        written = self._buffer.write(data)
+        self._position += written
+        return written
+
+    def tell(self) -> int:
+        return self._position
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate(0)
+        return data
+
+
+class ResultsExporter:
+    """
+    Streams feedback results joined with their attempt's user_id.
+
+    A single outer-joined query is read through a server-side cursor in
+    chunks, and each format writer emits output chunk by chunk, so memory
+    use does not grow with the size of the table.
+    """
+
+    def __init__(self, session_factory, chunk_size: int = 1000):
+        self.SessionLocal = session_factory
+        self.chunk_size = chunk_size
+
+    def iter_chunks(self, filters: Optional[ResultFilters] = None) -> Iterator[List[Dict]]:
+        """Yield lists of export rows, at most chunk_size each"""
+        filters = filters or ResultFilters()
+        db = self.SessionLocal()
+        try:
+            columns = [
+                FeedbackAnalysisDB.attempt_id,
+                FeedbackAnalysisDB.scenario_id,
+                FeedbackAnalysisDB.timestamp,
+                FeedbackAnalysisDB.overall_score,
+                FeedbackAnalysisDB.medical_accuracy_score,
+                FeedbackAnalysisDB.communication_clarity_score,
+                FeedbackAnalysisDB.empathy_tone_score,
+                FeedbackAnalysisDB.completeness_score,
+            ]
+            query = db.query(*columns).select_from(FeedbackAnalysisDB)
+            if filters.user_id is None:
+                # filter_feedback_query joins attempts itself when filtering by user
+                query = query.outerjoin(PracticeAttemptDB, PracticeAttemptDB.id == FeedbackAnalysisDB.attempt_id)
+            query = filter_feedback_query(query, filters).add_columns(PracticeAttemptDB.user_id)
+            result = db.execute(
+                query.order_by(FeedbackAnalysisDB.id).statement.execution_options(
+                    stream_results=True, yield_per=self.chunk_size
+                )
+            )
+            for partition in result.partitions():
+                yield [
+                    {**row._asdict(), "user_id": row.user_id or 'unknown'}
+                    for row in partition
+                ]
+        finally:
+            db.close()
+
+    def iter_csv(self, filters: Optional[ResultFilters] = None) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for chunk in self.iter_chunks(filters):
+            writer.writerows(chunk)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+
+    def iter_jsonl(self, filters: Optional[ResultFilters] = None) -> Iterator[str]:
+        for chunk in self.iter_chunks(filters):
+            yield "".join(json.dumps(row, default=str, ensure_ascii=False) + "\n" for row in chunk)
+
+    def iter_parquet(self, filters: Optional[ResultFilters] = None) -> Iterator[bytes]:
+        """One Parquet row group per chunk; requires the optional pyarrow package"""
+        pa, pq = _import_pyarrow()
+
+        schema = pa.schema([
+            ('attempt_id', pa.string()),
+            ('scenario_id', pa.string()),
+            ('timestamp', pa.timestamp('us')),
+            ('overall_score', pa.float64()),
+            ('medical_accuracy_score', pa.float64()),
+            ('communication_clarity_score', pa.float64()),
+            ('empathy_tone_score', pa.float64()),
+            ('completeness_score', pa.float64()),
+            ('user_id', pa.string()),
+        ])
+        sink = _ChunkSink()
+        with pq.ParquetWriter(sink, schema) as writer:
+            for chunk in self.iter_chunks(filters):
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                yield sink.drain()
+        yield sink.drain()
+
+    def iter_format(self, export_format: str, filters: Optional[ResultFilters] = None) -> Iterator:
+        """
+        Iterator over the export in the given format.
+
+        Raises ExportFormatUnavailable right away, rather than once iteration
+        starts, if the format needs a package that is missing.
+        """
+        if export_format == "csv":
+            return self.iter_csv(filters)
+        if export_format == "jsonl":
+            return self.iter_jsonl(filters)
+        if export_format == "parquet":
+            _import_pyarrow()
+            return self.iter_parquet(filters)
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    def export_to_file(self, path: str, export_format: str = "csv",
+                       filters: Optional[ResultFilters] = None) -> int:
+        """Write an export to disk. Returns the number of bytes written."""
+        written = 0
+        parts = self.iter_format(export_format, filters)
+        with open(path, 'wb') as f:
+            for part in parts:
+                data = part.encode('utf-8') if isinstance(part, str) else part
+                f.write(data)
+                written += len(data)
+        return written
@@ -0,0 +1,331 @@
+"""
+Per-user vector index over past feedback, used to build RAG context.
+
+Every saved feedback is split into items (each category's explanation and
+each of its improvements). Items are embedded on the CPU with feature hashing
+of word unigrams and bigrams, which needs no model download and gives the
+same vectors in every process. The vectors are sparse and L2-normalized, and
+a user's distinct item texts are stored as an inverted file (one posting list
+per hashed feature), so scoring against the scenario's key points only
+touches the postings of the features those key points contain. Indexes are
+built from the database the first time a user is searched and then updated
+in place as feedback is saved. Feedback saved by other processes is picked
+up by reloading the rows newer than the index every rag_index_refresh_seconds.
+Each user's recent search results are kept until new feedback is indexed for
+that user, so repeated submissions skip embedding and scoring.
+"""
+
+import math
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import settings
+from core.models import FEEDBACK_CATEGORIES, FeedbackAnalysis, FeedbackAnalysisDB, PracticeAttemptDB
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the their them "
+    "they this to was were will with you your".split()
+)
+# Added to the similarity of items from an earlier attempt at the same scenario
+SAME_SCENARIO_BONUS = 0.1
+# Feedback is timestamped before it is committed, so a refresh also rereads
+# rows this much older than the newest one indexed; indexed attempts are skipped
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+
+def _features(text: str) -> List[str]:
+    words = [w for w in _TOKEN.findall(text.lower()) if w not in _STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def embed_text(text: str, dimensions: int) -> Dict[int, float]:
+    """Hashed bag-of-words vector of a text as {feature index: weight}, L2-normalized"""
+    vector: Dict[int, float] = {}
+    for feature in _features(text):
+        h = zlib.crc32(feature.encode("utf-8"))
+        # The top bit picks the sign so colliding features tend to cancel out
+        index = h % dimensions
+        vector[index] = vector.get(index, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+    norm = math.sqrt(sum(v * v for v in vector.values()))
+    return {index: v / norm for index, v in vector.items() if v} if norm else {}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return max(1, len(text) // 4)
+
+
+@dataclass
+class FeedbackItem:
+    """One retrievable piece of past feedback"""
+    category: str
+    text: str
+    scenario_id: str
+    timestamp: datetime
+
+
+def feedback_items(scenario_id: str, timestamp: datetime, details: Dict[str, dict]) -> List[FeedbackItem]:
+    """Split stored feedback details ({category: {explanation, improvements, ...}}) into items"""
+    items = []
+    for category in FEEDBACK_CATEGORIES:
+        detail = details.get(category) or {}
+        texts = [detail.get("explanation") or ""] + list(detail.get("improvements") or [])
+        items.extend(
+            FeedbackItem(category, text.strip(), scenario_id, timestamp)
+            for text in texts if text and text.strip()
+        )
+    return items
+
+
+class UserFeedbackIndex:
+    """Inverted file of one user's items; identical texts share a row that keeps the newest metadata"""
+
+    MIN_PRUNE = 64
+
+    def __init__(self, dimensions: int, max_results: int = 32):
+        self.dimensions = dimensions
+        self.items: List[FeedbackItem] = []
+        # Search key -> selected items; cleared whenever an attempt is added
+        self.results: "OrderedDict[tuple, List[FeedbackItem]]" = OrderedDict()
+        self.max_results = max_results
+        self.loaded = False
+        # Newest feedback timestamp indexed, and when the database was last read (monotonic)
+        self.newest: Optional[datetime] = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        # feature -> (rows, weights), appended to as items arrive; arrays are built on first use
+        self._postings: Dict[int, Tuple[List[int], List[float]]] = {}
+        self._posting_arrays: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        # Scenario of each row, grown by doubling so adding stays amortized O(1)
+        self._scenarios = np.zeros(64, dtype=np.int32)
+        self._scenario_codes: Dict[str, int] = {}
+        self._rows: Dict[str, int] = {}
+        # attempt_id -> timestamp of the indexed attempts a refresh could read again; older
+        # ones are pruned, and re-adding one would only refresh its items' metadata
+        self._attempt_ids: Dict[str, datetime] = {}
+        self._prune_at = self.MIN_PRUNE
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _scenario_code(self, scenario_id: str) -> int:
+        return self._scenario_codes.setdefault(scenario_id, len(self._scenario_codes) + 1)
+
+    def add_many(self, attempts: List[Tuple[str, List[FeedbackItem]]]):
+        """Add the items of (attempt_id, items) pairs, skipping attempts indexed within the refresh overlap"""
+        for attempt_id, items in attempts:
+            if attempt_id in self._attempt_ids or not items:
+                continue
+            self._attempt_ids[attempt_id] = items[0].timestamp
+            self.results.clear()
+            for item in items:
+                if self.newest is None or item.timestamp > self.newest:
+                    self.newest = item.timestamp
+                key = item.text.lower()
+                row = self._rows.get(key)
+                if row is not None:
+                    self.items[row] = item
+                    self._scenarios[row] = self._scenario_code(item.scenario_id)
+                    continue
+
+                row = self._rows[key] = len(self.items)
+                self.items.append(item)
+                if row >= len(self._scenarios):
+                    self._scenarios = np.resize(self._scenarios, 2 * len(self._scenarios))
+                self._scenarios[row] = self._scenario_code(item.scenario_id)
+                for feature, weight in embed_text(item.text, self.dimensions).items():
+                    rows, weights = self._postings.setdefault(feature, ([], []))
+                    rows.append(row)
+                    weights.append(weight)
+                    self._posting_arrays.pop(feature, None)
+        if len(self._attempt_ids) >= self._prune_at:
+            cutoff = self.newest - REFRESH_OVERLAP
+            self._attempt_ids = {a: t for a, t in self._attempt_ids.items() if t >= cutoff}
+            self._prune_at = max(self.MIN_PRUNE, 2 * len(self._attempt_ids))
+
+    def _posting(self, feature: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        arrays = self._posting_arrays.get(feature)
+        if arrays is None and feature in self._postings:
+            rows, weights = self._postings[feature]
+            arrays = self._posting_arrays[feature] = (
+                np.array(rows, dtype=np.int64), np.array(weights, dtype=np.float32)
+            )
+        return arrays
+
+    def search(self, queries: List[Dict[int, float]], scenario_id: Optional[str], k: int,
+               min_similarity: float) -> List[FeedbackItem]:
+        """Items with the highest cosine similarity to any query, best first"""
+        count = len(self.items)
+        if not count or not queries:
+            return []
+        scores = np.zeros(count, dtype=np.float32)
+        for query in queries:
+            similarity = np.zeros(count, dtype=np.float32)
+            for feature, weight in query.items():
+                posting = self._posting(feature)
+                if posting is not None:
+                    # A row appears at most once per posting list, so += is safe
+                    similarity[posting[0]] += weight * posting[1]
+            np.maximum(scores, similarity, out=scores)
+        code = self._scenario_codes.get(scenario_id)
+        if code is not None:
+            scores += SAME_SCENARIO_BONUS * (self._scenarios[:count] == code)
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [self.items[i] for i in top if scores[i] >= min_similarity]
+
+
+class FeedbackVectorIndex:
+    """
+    LRU of per-user indexes, loaded from the database on first use.
+
+    StorageService calls add_feedback after each commit. A user who is not
+    loaded is skipped, because their next load reads the new feedback from
+    the database; a load racing with a save is resolved by skipping
+    attempts that are already indexed. Saves made by other processes only
+    reach the database, so a loaded index older than refresh_seconds reads
+    the rows saved since its newest item before it is searched.
+    """
+
+    def __init__(self, session_factory, max_users: int = None, dimensions: int = None,
+                 max_attempts: int = None, refresh_seconds: float = None, max_results: int = None):
+        self.SessionLocal = session_factory
+        self.max_users = max_users or settings.rag_index_max_users
+        self.dimensions = dimensions or settings.rag_index_dimensions
+        self.max_attempts = max_attempts or settings.rag_index_max_attempts
+        self.refresh_seconds = settings.rag_index_refresh_seconds if refresh_seconds is None else refresh_seconds
+        self.max_results = settings.rag_result_cache_size if max_results is None else max_results
+        self.result_hits = 0
+        self.result_misses = 0
+        self._users: "OrderedDict[str, UserFeedbackIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, user_id: str) -> UserFeedbackIndex:
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                entry = self._users[user_id] = UserFeedbackIndex(self.dimensions, self.max_results)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            return entry
+
+    def _load(self, user_id: str, entry: UserFeedbackIndex):
+        """Read the user's newest attempts, or on a loaded index the ones saved since its newest item"""
+        checked_at = time.monotonic()
+        db = self.SessionLocal()
+        try:
+            query = db.query(
+                FeedbackAnalysisDB.attempt_id, FeedbackAnalysisDB.scenario_id,
+                FeedbackAnalysisDB.timestamp, FeedbackAnalysisDB.details
+            ).join(
+                PracticeAttemptDB, PracticeAttemptDB.id == FeedbackAnalysisDB.attempt_id
+            ).filter(
+                PracticeAttemptDB.user_id == user_id
+            )
+            if entry.loaded and entry.newest is not None:
+                query = query.filter(FeedbackAnalysisDB.timestamp >= entry.newest - REFRESH_OVERLAP)
+            rows = query.order_by(PracticeAttemptDB.timestamp.desc()).limit(self.max_attempts).all()
+        finally:
+            db.close()
+        # Oldest first, so repeated texts end up with their newest metadata
+        entry.add_many([
+            (row.attempt_id, feedback_items(row.scenario_id, row.timestamp, row.details or {}))
+            for row in reversed(rows)
+        ])
+        entry.loaded = True
+        entry.checked_at = checked_at
+
+    def _is_fresh(self, entry: UserFeedbackIndex) -> bool:
+        return entry.loaded and time.monotonic() - entry.checked_at < self.refresh_seconds
+
+    def is_fresh(self, user_id: str) -> bool:
+        """Whether searching the user needs no database read"""
+        entry = self._users.get(user_id)
+        return entry is not None and self._is_fresh(entry)
+
+    def add_feedback(self, user_id: str, feedback: FeedbackAnalysis):
+        """Index newly saved feedback if the user's index is in memory"""
+        with self._lock:
+            entry = self._users.get(user_id)
+        if entry is None:
+            return
+        details = {category: getattr(feedback, category).model_dump() for category in FEEDBACK_CATEGORIES}
+        with entry.lock:
+            entry.add_many([(feedback.attempt_id, feedback_items(feedback.scenario_id, feedback.timestamp, details))])
+
+    def search(self, user_id: str, queries: List[str], scenario_id: Optional[str] = None,
+               k: int = None, token_budget: int = None, min_similarity: float = None) -> List[FeedbackItem]:
+        """
+        Past feedback items most relevant to the query texts, within a token budget.
+
+        Loads or refreshes the user's index from the database if needed, so
+        call it from a worker thread unless is_fresh(user_id) is true.
+        """
+        k = k or settings.rag_top_k
+        token_budget = token_budget or settings.rag_token_budget
+        min_similarity = settings.rag_min_similarity if min_similarity is None else min_similarity
+
+        key = (scenario_id, tuple(queries), k, token_budget, min_similarity)
+        entry = self._entry(user_id)
+        with entry.lock:
+            if not self._is_fresh(entry):
+                self._load(user_id, entry)
+            # The refresh above clears the cached results if it indexed anything new
+            selected = entry.results.get(key)
+            if selected is not None:
+                entry.results.move_to_end(key)
+                with self._lock:
+                    self.result_hits += 1
+                return list(selected)
+            with self._lock:
+                self.result_misses += 1
+
+            query_vectors = [vector for vector in (embed_text(q, self.dimensions) for q in queries) if vector]
+            # Over-fetch so items that don't fit the budget can be replaced by shorter ones
+            candidates = entry.search(query_vectors, scenario_id, 4 * k, min_similarity)
+            selected, used = [], 0
+            for item in candidates:
+                cost = estimate_tokens(item.text)
+                if used + cost > token_budget:
+                    continue
+                selected.append(item)
+                used += cost
+                if len(selected) == k:
+                    break
+
+            if entry.max_results > 0:
+                entry.results[key] = selected
+                while len(entry.results) > entry.max_results:
+                    entry.results.popitem(last=False)
+        return list(selected)
+
+    def invalidate(self, user_id: Optional[str] = None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = list(self._users.values())
+        lookups = self.result_hits + self.result_misses
+        return {
+            "users": len(entries),
+            "items": sum(len(entry) for entry in entries),
+            "dimensions": self.dimensions,
+            "result_hits": self.result_hits,
+            "result_misses": self.result_misses,
+            "result_hit_ratio": round(self.result_hits / lookups, 4) if lookups else 0.0,
+        }
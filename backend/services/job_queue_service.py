@@ -0,0 +1,445 @@
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+import httpx
+from pydantic import BaseModel
+from sqlalchemy import and_, func, or_
+from core.config import settings
+from core.models import (
+    AnalysisJob, AnalysisJobDB, FeedbackAnalysis, JobStatus, PracticeAttempt
+)
+from services.llm_scheduler import BATCH, llm_priority
+
+
+class CallbackURLError(ValueError):
+    """A callback_url the server refuses to send job results to"""
+
+
+def _host_allowed(host: str) -> bool:
+    for allowed in settings.job_webhook_allowed_hosts:
+        allowed = allowed.lower()
+        if host == allowed or (allowed.startswith("*.") and host.endswith(allowed[1:])):
+            return True
+    return False
+
+
+def check_callback_url(url: str) -> str:
+    """
+    Make sure a webhook URL is https, on an allowed host and resolves to public
+    addresses only, so job results can't be sent to internal services.
+
+    Does a DNS lookup, so call it from a worker thread. Raises CallbackURLError.
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme != "https":
+        raise CallbackURLError("callback_url must use https")
+    if not host or not _host_allowed(host):
+        raise CallbackURLError(f"callback_url host {host or '(none)'} is not in JOB_WEBHOOK_ALLOWED_HOSTS")
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parts.port or 443, proto=socket.IPPROTO_TCP)}
+    except socket.gaierror as e:
+        raise CallbackURLError(f"callback_url host {host} does not resolve: {e}")
+    for address in addresses:
+        # Drop any IPv6 zone id before parsing
+        if not ipaddress.ip_address(address.split("%")[0]).is_global:
+            raise CallbackURLError(f"callback_url host {host} resolves to a non-public address")
+    return url
+
+
+class ClaimedJob(BaseModel):
+    """A job a worker holds the lease on"""
+    job_id: str
+    attempt: PracticeAttempt
+    callback_url: Optional[str] = None
+    attempts: int
+
+
+class AnalysisJobQueue:
+    """
+    Durable queue of analyses stored in the `analysis_jobs` table.
+
+    Any process sharing the database can enqueue or work on jobs. A claim
+    is a conditional UPDATE that only one worker can win; the winner holds
+    a lease, and a job whose worker dies is picked up again once the lease
+    lapses, up to job_max_attempts times.
+    """
+
+    CLAIM_CANDIDATES = 5
+
+    def __init__(self, session_factory):
+        self.SessionLocal = session_factory
+        self.lease_seconds = settings.job_lease_seconds
+        self.max_attempts = settings.job_max_attempts
+
+    def _to_model(self, row: AnalysisJobDB, feedback: Optional[FeedbackAnalysis] = None) -> AnalysisJob:
+        return AnalysisJob(
+            job_id=row.id,
+            status=row.status,
+            attempt_id=row.attempt_id,
+            scenario_id=row.scenario_id,
+            user_id=row.user_id,
+            created_at=row.created_at,
+            started_at=row.started_at,
+            finished_at=row.finished_at,
+            attempts=row.attempts,
+            error=row.error,
+            feedback=feedback
+        )
+
+    def enqueue(self, attempt: PracticeAttempt, callback_url: Optional[str] = None) -> AnalysisJob:
+        """Queue an attempt for analysis"""
+        db = self.SessionLocal()
+        try:
+            row = AnalysisJobDB(
+                id=f"job_{uuid.uuid4().hex}",
+                status=JobStatus.QUEUED,
+                attempt_id=attempt.id,
+                scenario_id=attempt.scenario_id,
+                user_id=attempt.user_id,
+                user_response=attempt.user_response,
+                input_type=attempt.input_type,
+                callback_url=callback_url,
+                attempts=0,
+                created_at=attempt.timestamp
+            )
+            db.add(row)
+            db.commit()
+            return self._to_model(row)
+        finally:
+            db.close()
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        db = self.SessionLocal()
+        try:
+            row = db.get(AnalysisJobDB, job_id)
+            return self._to_model(row) if row else None
+        finally:
+            db.close()
+
+    def claim(self, worker_id: str) -> Optional[ClaimedJob]:
+        """Take the oldest runnable job, or return None when there is nothing to do"""
+        now = datetime.now()
+        runnable = or_(
+            AnalysisJobDB.status == JobStatus.QUEUED,
+            and_(AnalysisJobDB.status == JobStatus.RUNNING, AnalysisJobDB.lease_expires_at < now)
+        )
+        db = self.SessionLocal()
+        try:
+            candidates = [
+                job_id for (job_id,) in db.query(AnalysisJobDB.id).filter(runnable)
+                .order_by(AnalysisJobDB.created_at).limit(self.CLAIM_CANDIDATES).all()
+            ]
+            for job_id in candidates:
+                claimed = db.query(AnalysisJobDB).filter(AnalysisJobDB.id == job_id, runnable).update({
+                    "status": JobStatus.RUNNING,
+                    "worker_id": worker_id,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "started_at": now,
+                    "attempts": AnalysisJobDB.attempts + 1
+                }, synchronize_session=False)
+                db.commit()
+                if claimed != 1:
+                    continue  # another worker got it first
+
+                row = db.get(AnalysisJobDB, job_id)
+                if row.attempts > self.max_attempts:
+                    # Its workers kept dying mid-job; stop retrying
+                    row.status = JobStatus.FAILED
+                    row.error = row.error or f"Gave up after {self.max_attempts} attempts"
+                    row.finished_at = now
+                    db.commit()
+                    continue
+                return ClaimedJob(
+                    job_id=row.id,
+                    attempt=PracticeAttempt(
+                        id=row.attempt_id,
+                        scenario_id=row.scenario_id,
+                        user_response=row.user_response,
+                        user_id=row.user_id,
+                        input_type=row.input_type,
+                        timestamp=row.created_at
+                    ),
+                    callback_url=row.callback_url,
+                    attempts=row.attempts
+                )
+            return None
+        finally:
+            db.close()
+
+    def _finish(self, job_id: str, worker_id: str, status: JobStatus, error: Optional[str] = None) -> Optional[AnalysisJob]:
+        db = self.SessionLocal()
+        try:
+            row = db.get(AnalysisJobDB, job_id)
+            if row is None or row.worker_id != worker_id:
+                # The lease lapsed and another worker owns the job now
+                return None
+            row.status = status
+            row.error = error
+            row.lease_expires_at = None
+            if status != JobStatus.QUEUED:
+                row.finished_at = datetime.now()
+            db.commit()
+            return self._to_model(row)
+        finally:
+            db.close()
+
+    def renew(self, job_id: str, worker_id: str) -> bool:
+        """Extend the lease of a running job; False if this worker no longer holds it"""
+        db = self.SessionLocal()
+        try:
+            renewed = db.query(AnalysisJobDB).filter(
+                AnalysisJobDB.id == job_id,
+                AnalysisJobDB.worker_id == worker_id,
+                AnalysisJobDB.status == JobStatus.RUNNING
+            ).update({
+                "lease_expires_at": datetime.now() + timedelta(seconds=self.lease_seconds)
+            }, synchronize_session=False)
+            db.commit()
+            return renewed == 1
+        finally:
+            db.close()
+
+    def release(self, job_id: str, worker_id: str) -> bool:
+        """Put a job this worker is giving up on (e.g. at shutdown) back in the queue without using an attempt"""
+        db = self.SessionLocal()
+        try:
+            released = db.query(AnalysisJobDB).filter(
+                AnalysisJobDB.id == job_id,
+                AnalysisJobDB.worker_id == worker_id,
+                AnalysisJobDB.status == JobStatus.RUNNING
+            ).update({
+                "status": JobStatus.QUEUED,
+                "worker_id": None,
+                "lease_expires_at": None,
+                "attempts": AnalysisJobDB.attempts - 1
+            }, synchronize_session=False)
+            db.commit()
+            return released == 1
+        finally:
+            db.close()
+
+    def complete(self, job_id: str, worker_id: str) -> Optional[AnalysisJob]:
+        return self._finish(job_id, worker_id, JobStatus.SUCCEEDED)
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = True) -> Optional[AnalysisJob]:
+        """Requeue a failed job while it has attempts left, otherwise mark it failed"""
+        job = self.get(job_id)
+        if retry and job and job.attempts < self.max_attempts:
+            return self._finish(job_id, worker_id, JobStatus.QUEUED, error)
+        return self._finish(job_id, worker_id, JobStatus.FAILED, error)
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs in each status"""
+        db = self.SessionLocal()
+        try:
+            rows = db.query(AnalysisJobDB.status, func.count(AnalysisJobDB.id)) \
+                .group_by(AnalysisJobDB.status).all()
+            counts = {status.value: 0 for status in JobStatus}
+            counts.update({status.value: count for status, count in rows})
+            return counts
+        finally:
+            db.close()
+
+
+class AnalysisWorkerPool:
+    """
+    A fixed number of asyncio workers that run queued analyses.
+
+    Runs inside the API process (JOB_WORKERS > 0) or on its own through
+    scripts/run_worker.py. Idle workers poll the queue every
+    job_poll_interval seconds; in-process submissions wake them at once.
+    A running job's lease is renewed every third of job_lease_seconds, so
+    waiting behind interactive LLM calls doesn't let another worker take it.
+    """
+
+    WEBHOOK_RETRIES = 3
+
+    def __init__(self, queue: AnalysisJobQueue, analysis_service, scenario_service, storage_service,
+                 concurrency: int = None):
+        self.queue = queue
+        self.analysis_service = analysis_service
+        self.scenario_service = scenario_service
+        self.storage_service = storage_service
+        self.concurrency = concurrency if concurrency is not None else settings.job_workers
+        self.poll_interval = settings.job_poll_interval
+        self.name = f"worker_{uuid.uuid4().hex[:8]}"
+        self._tasks: List[asyncio.Task] = []
+        self._callbacks: set = set()
+        # job_id -> worker_id of the jobs being run, so stop() can hand them back
+        self._claimed: Dict[str, str] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._http: Optional[httpx.AsyncClient] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self):
+        if self._tasks or self.concurrency <= 0:
+            return
+        self._wakeup = asyncio.Event()
+        # A redirect could point the POST at an address check_callback_url would refuse
+        self._http = httpx.AsyncClient(timeout=settings.job_webhook_timeout, follow_redirects=False)
+        self._tasks = [
+            asyncio.create_task(self._work(f"{self.name}_{n}"))
+            for n in range(self.concurrency)
+        ]
+        print(f"Started {self.concurrency} analysis job workers")
+
+    async def stop(self):
+        """
+        Cancel the workers and put the jobs they were running back in the queue.
+
+        Webhooks already under way are for finished jobs, so they are given up
+        to job_webhook_timeout to be delivered before they are cancelled.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job_id, worker_id in list(self._claimed.items()):
+            try:
+                if await asyncio.to_thread(self.queue.release, job_id, worker_id):
+                    print(f"Returned analysis job {job_id} to the queue")
+            except Exception as e:
+                print(f"Could not return analysis job {job_id} to the queue: {e}")
+        self._claimed.clear()
+
+        if self._callbacks:
+            _, undelivered = await asyncio.wait(set(self._callbacks), timeout=settings.job_webhook_timeout)
+            for task in undelivered:
+                task.cancel()
+            if undelivered:
+                print(f"Gave up on {len(undelivered)} webhook deliveries at shutdown")
+                await asyncio.gather(*undelivered, return_exceptions=True)
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def notify(self):
+        """Wake idle workers after a job was enqueued in this process"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _work(self, worker_id: str):
+        while True:
+            self._wakeup.clear()
+            try:
+                claimed = await asyncio.to_thread(self.queue.claim, worker_id)
+            except Exception as e:
+                print(f"Error claiming analysis job: {e}")
+                claimed = None
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._claimed[claimed.job_id] = worker_id
+            heartbeat = asyncio.create_task(self._heartbeat(claimed.job_id, worker_id))
+            stopping = False
+            try:
+                await self.run_job(claimed, worker_id)
+            except asyncio.CancelledError:
+                stopping = True
+                raise
+            except Exception as e:
+                # Recording the failure failed too; the job is retried once its lease lapses
+                print(f"Error running analysis job {claimed.job_id}: {e}")
+            finally:
+                heartbeat.cancel()
+                if not stopping:
+                    # Only jobs interrupted by stop() are handed back
+                    self._claimed.pop(claimed.job_id, None)
+
+    async def _heartbeat(self, job_id: str, worker_id: str):
+        """Renew the job's lease until cancelled"""
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                if not await asyncio.to_thread(self.queue.renew, job_id, worker_id):
+                    print(f"Lost the lease on analysis job {job_id}")
+                    return
+            except Exception as e:
+                print(f"Error renewing the lease on analysis job {job_id}: {e}")
+
+    async def run_job(self, claimed: ClaimedJob, worker_id: str):
+        attempt = claimed.attempt
+        feedback = None
+        try:
+            # A previous run may have saved the result and died before completing the job
+            feedback = await asyncio.to_thread(self.storage_service.get_feedback_by_attempt_id, attempt.id)
+            if feedback is None:
+                scenario = self.scenario_service.get_scenario(attempt.scenario_id)
+                if not scenario:
+                    job = await asyncio.to_thread(
+                        self.queue.fail, claimed.job_id, worker_id, "Scenario not found", False
+                    )
+                    self._schedule_callback(claimed, job)
+                    return
+                # An earlier run in this process may have written this attempt's calls as failed
+                self.storage_service.llm_usage.retry(attempt.id)
+                # Nobody is waiting on the response, so interactive submissions go first
+                with llm_priority(BATCH):
+                    feedback = await self.analysis_service.analyze_response_async(
+                        attempt_id=attempt.id,
+                        scenario=scenario,
+                        user_response=attempt.user_response,
+                        user_id=attempt.user_id
+                    )
+                if not await asyncio.to_thread(self.storage_service.save_result, attempt, feedback):
+                    raise RuntimeError("Could not save result")
+            job = await asyncio.to_thread(self.queue.complete, claimed.job_id, worker_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Analysis job {claimed.job_id} failed (attempt {claimed.attempts}): {e}")
+            await asyncio.to_thread(
+                self.storage_service.llm_usage.save_failed, [(attempt.id, attempt.scenario_id, attempt.user_id)]
+            )
+            job = await asyncio.to_thread(self.queue.fail, claimed.job_id, worker_id, str(e))
+            feedback = None
+
+        if job is not None and job.status == JobStatus.SUCCEEDED:
+            job.feedback = feedback
+        self._schedule_callback(claimed, job)
+
+    def _schedule_callback(self, claimed: ClaimedJob, job: Optional[AnalysisJob]):
+        """Deliver the webhook in the background so a slow receiver doesn't hold up a worker"""
+        if not claimed.callback_url or job is None or job.status not in (JobStatus.SUCCEEDED, JobStatus.FAILED):
+            return
+        task = asyncio.create_task(self._notify_callback(claimed.callback_url, job))
+        self._callbacks.add(task)
+        task.add_done_callback(self._callbacks.discard)
+
+    async def _notify_callback(self, callback_url: str, job: AnalysisJob):
+        """POST a finished job to its callback URL, retrying on errors"""
+        try:
+            # Checked again because DNS may have changed since the job was queued
+            await asyncio.to_thread(check_callback_url, callback_url)
+        except CallbackURLError as e:
+            print(f"Not delivering webhook for {job.job_id}: {e}")
+            return
+        body = json.dumps(job.model_dump(mode="json")).encode("utf-8")
+        headers = {"Content-Type": "application/json", "X-Job-Id": job.job_id}
+        if settings.job_webhook_secret:
+            signature = hmac.new(settings.job_webhook_secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+            headers["X-Signature"] = f"sha256={signature}"
+
+        for retry in range(self.WEBHOOK_RETRIES):
+            try:
+                response = await self._http.post(callback_url, content=body, headers=headers)
+                if response.status_code < 500:
+                    return
+                print(f"Webhook for {job.job_id} returned {response.status_code}")
+            except httpx.HTTPError as e:
+                print(f"Webhook for {job.job_id} failed: {e}")
+            await asyncio.sleep(2 ** retry)
@@ -0,0 +1,320 @@
+"""
+Content-addressed cache for LLM responses.
+
+Keys are sha256 digests of everything that determines a model's answer
+(prompt text, model, scenario content, normalized response, RAG context),
+so identical submissions reuse the structured output of an earlier call.
+Values are stored as JSON behind a small backend interface: an in-process
+LRU, a SQLite file shared by local workers, or a Redis-compatible server.
+"""
+
+import abc
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Type, Union
+from pydantic import BaseModel
+from core.config import settings
+
+# Bump when the shape of cached values or the key layout changes
+CACHE_FORMAT_VERSION = 1
+LLM_CACHE_BACKENDS = ("memory", "sqlite", "redis", "none")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_response_text(text: str) -> str:
+    """Collapse whitespace so trivially different copies of a response share a key"""
+    return _WHITESPACE.sub(" ", text or "").strip()
+
+
+class CacheBackend(abc.ABC):
+    """Interface for cache storage. Values are JSON strings."""
+
+    name = "base"
+    # Whether calls do I/O and should be run off the event loop
+    blocking = False
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Return the stored value, or None if missing or expired"""
+
+    @abc.abstractmethod
+    def set(self, key: str, value: str, ttl: float):
+        """Store a value for ttl seconds"""
+
+    @abc.abstractmethod
+    def clear(self) -> int:
+        """Remove every entry and return how many were removed"""
+
+    @abc.abstractmethod
+    def size(self) -> int:
+        """Number of stored entries"""
+
+    def close(self):
+        pass
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Per-process LRU with per-entry expiry"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """SQLite file shared by every worker on the host, evicting least recently used rows"""
+
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_llm_response_cache_accessed_at "
+            "ON llm_response_cache (accessed_at)"
+        )
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM llm_response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE llm_response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_response_cache (key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            self._conn.execute("DELETE FROM llm_response_cache WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM llm_response_cache WHERE key IN ("
+                "SELECT key FROM llm_response_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM llm_response_cache").rowcount
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_response_cache").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Redis, or any server speaking its protocol (Valkey, KeyDB, a local stand-in).
+
+    Expiry uses SETEX; LRU eviction is left to the server's
+    maxmemory-policy (e.g. allkeys-lru). Requires the optional redis package.
+    """
+
+    name = "redis"
+    blocking = True
+
+    def __init__(self, url: str, prefix: str = "llm_cache:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("The redis LLM cache backend requires the redis package (pip install redis)") from e
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+        # Keeps caches sharing one server apart, including for clear()
+        self.PREFIX = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(self.PREFIX + key)
+
+    def set(self, key: str, value: str, ttl: float):
+        self._client.setex(self.PREFIX + key, max(1, int(ttl)), value)
+
+    def clear(self) -> int:
+        keys = list(self._client.scan_iter(match=self.PREFIX + "*", count=500))
+        if keys:
+            self._client.delete(*keys)
+        return len(keys)
+
+    def size(self) -> int:
+        return sum(1 for _ in self._client.scan_iter(match=self.PREFIX + "*", count=500))
+
+    def close(self):
+        self._client.close()
+
+
+class LLMResponseCache:
+    """Typed get/set of structured LLM outputs with hit/miss counters"""
+
+    def __init__(self, backend: Optional[CacheBackend], ttl: float = 86400.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @staticmethod
+    def make_key(**parts: Any) -> str:
+        """Hash the parts that determine an LLM answer into a stable key"""
+        payload = json.dumps(
+            {"format": CACHE_FORMAT_VERSION, **parts},
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, attribute: str):
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + 1)
+
+    def get(self, key: str, schema: Optional[Type[BaseModel]] = None) -> Optional[Union[BaseModel, str]]:
+        """Cached value parsed as schema, or the raw string when no schema is given"""
+        if not self.enabled:
+            return None
+        try:
+            value = self.backend.get(key)
+            if value is not None:
+                result = schema.model_validate_json(value) if schema else value
+                self._count("hits")
+                return result
+        except Exception as e:
+            # A broken cache must never fail an analysis; treat it as a miss
+            self._count("errors")
+            print(f"LLM cache read failed: {e}")
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: Union[BaseModel, str]):
+        if not self.enabled:
+            return
+        try:
+            stored = value if isinstance(value, str) else value.model_dump_json()
+            self.backend.set(key, stored, self.ttl)
+        except Exception as e:
+            self._count("errors")
+            print(f"LLM cache write failed: {e}")
+
+    def clear(self) -> int:
+        if not self.enabled:
+            return 0
+        with self._lock:
+            self.hits = self.misses = self.errors = 0
+        return self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        size = None
+        if self.enabled:
+            try:
+                size = self.backend.size()
+            except Exception as e:
+                print(f"LLM cache size lookup failed: {e}")
+        return {
+            "backend": self.backend.name if self.enabled else "none",
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": size,
+            "ttl_seconds": self.ttl,
+        }
+
+    def close(self):
+        if self.enabled:
+            self.backend.close()
+
+
+def create_llm_cache(backend: Optional[str] = None, path: Optional[str] = None,
+                     max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                     namespace: str = "llm_cache") -> LLMResponseCache:
+    """Build a response cache; arguments default to the llm_cache_* settings"""
+    backend = (backend or settings.llm_cache_backend).lower()
+    if backend not in LLM_CACHE_BACKENDS:
+        raise ValueError(f"cache backend must be one of {', '.join(LLM_CACHE_BACKENDS)}")
+    max_entries = max_entries or settings.llm_cache_max_entries
+
+    if backend == "memory":
+        store = MemoryCacheBackend(max_entries)
+    elif backend == "sqlite":
+        store = SQLiteCacheBackend(path or settings.llm_cache_path, max_entries)
+    elif backend == "redis":
+        store = RedisCacheBackend(settings.llm_cache_redis_url, prefix=f"{namespace}:")
+    else:
+        store = None
+    return LLMResponseCache(store, ttl=ttl or settings.llm_cache_ttl_seconds)
+
+
+def create_transcript_cache() -> LLMResponseCache:
+    """Build the transcript cache selected by the transcript_cache_* settings"""
+    return create_llm_cache(
+        backend=settings.transcript_cache_backend,
+        path=settings.transcript_cache_path,
+        max_entries=settings.transcript_cache_max_entries,
+        ttl=settings.transcript_cache_ttl_seconds,
+        namespace="transcript_cache"
+    )
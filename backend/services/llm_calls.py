@@ -0,0 +1,211 @@
+"""
+Timeouts, retries and hedging for individual LLM calls.
+
+LLMCallPolicy runs each named call (a specialist, weights, transcription) as
+one or more attempts. Every attempt takes a slot from the LLMScheduler and is
+bounded by the call's timeout. Attempts that fail with a transient error
+(timeouts, connection errors, 429s and 5xx answers) are retried after a
+jittered exponential backoff. With hedging on, an async call that is still
+running after its p95 latency gets a duplicate attempt and the first
+successful answer wins; the other attempt is cancelled. Hedges are only sent
+while the scheduler has free slots, so they never queue behind real work.
+
+Latency percentiles and counters are kept per call name and served by
+GET /practice/llm_calls/stats.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+import openai
+
+from core.config import settings
+from services.llm_scheduler import LLMScheduler
+
+# Latencies a call needs before its p95 is trusted for hedging
+HEDGE_MIN_SAMPLES = 20
+
+TRANSIENT_ERRORS = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+    httpx.TransportError,
+    TimeoutError,
+    asyncio.TimeoutError,
+)
+
+
+class CallStats:
+    """Latency window and counters of one named call"""
+
+    def __init__(self, window: int):
+        self.latencies = deque(maxlen=window)
+        self.counters = {"calls": 0, "attempts": 0, "retries": 0, "timeouts": 0,
+                         "hedges": 0, "hedge_wins": 0, "failures": 0}
+        self._lock = threading.Lock()
+
+    def count(self, counter: str):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def quantile(self, q: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            if len(self.latencies) < max(1, min_samples):
+                return None
+            values = sorted(self.latencies)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        latency = {
+            f"p{round(q * 100)}_ms": round(value * 1000, 2) if value is not None else None
+            for q, value in ((q, self.quantile(q)) for q in (0.5, 0.95, 0.99))
+        }
+        with self._lock:
+            return {**self.counters, "samples": len(self.latencies), **latency}
+
+
+class LLMCallPolicy:
+    """Runs LLM calls with per-call timeouts, jittered retries and optional hedging"""
+
+    def __init__(self, scheduler: Optional[LLMScheduler] = None, max_retries: int = None,
+                 hedging: bool = None, latency_window: int = None):
+        self.scheduler = scheduler or LLMScheduler()
+        self.max_retries = settings.llm_max_retries if max_retries is None else max_retries
+        self.hedging = settings.llm_hedging if hedging is None else hedging
+        self.latency_window = latency_window or settings.llm_latency_window
+        self._stats: Dict[str, CallStats] = {}
+        self._lock = threading.Lock()
+
+    def stats_for(self, name: str) -> CallStats:
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = CallStats(self.latency_window)
+            return stats
+
+    def timeout(self, name: str) -> float:
+        return settings.llm_call_timeouts.get(name, settings.llm_call_timeout_seconds)
+
+    def _backoff(self, retry: int, error: Exception) -> float:
+        """Full jitter: uniform up to base * 2^retry, capped; never sooner than a Retry-After"""
+        delay = random.uniform(0, min(settings.llm_retry_max_delay, settings.llm_retry_base_delay * 2 ** retry))
+        if isinstance(error, openai.RateLimitError):
+            retry_after = error.response.headers.get("retry-after")
+            try:
+                delay = max(delay, min(float(retry_after), settings.llm_retry_max_delay)) if retry_after else delay
+            except ValueError:
+                pass
+        return delay
+
+    def _retryable(self, error: Exception, stats: CallStats, retry: int) -> bool:
+        if isinstance(error, (TimeoutError, asyncio.TimeoutError, openai.APITimeoutError)):
+            stats.count("timeouts")
+        if retry >= self.max_retries or not isinstance(error, TRANSIENT_ERRORS):
+            stats.count("failures")
+            return False
+        stats.count("retries")
+        return True
+
+    # -- async --
+
+    async def _attempt(self, call: Callable[[], Awaitable[Any]], stats: CallStats, timeout: float):
+        stats.count("attempts")
+        async with self.scheduler.aslot():
+            # Timed inside the slot, so the timeout and the latency window cover the call, not the queue
+            started = time.perf_counter()
+            result = await asyncio.wait_for(call(), timeout)
+        stats.observe(time.perf_counter() - started)
+        return result
+
+    async def _hedged(self, call: Callable[[], Awaitable[Any]], stats: CallStats, timeout: float):
+        hedge_after = stats.quantile(settings.llm_hedge_quantile, HEDGE_MIN_SAMPLES) if self.hedging else None
+        if hedge_after is None:
+            return await self._attempt(call, stats, timeout)
+
+        primary = asyncio.ensure_future(self._attempt(call, stats, timeout))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done and self.scheduler.has_capacity():
+                stats.count("hedges")
+                tasks.add(asyncio.ensure_future(self._attempt(call, stats, timeout)))
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            stats.count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def arun(self, name: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Await call() under the policy; call must start a fresh request each time it is invoked"""
+        stats = self.stats_for(name)
+        stats.count("calls")
+        timeout = self.timeout(name)
+        retry = 0
+        while True:
+            try:
+                return await self._hedged(call, stats, timeout)
+            except Exception as e:
+                if not self._retryable(e, stats, retry):
+                    raise
+                delay = self._backoff(retry, e)
+                print(f"LLM call {name} failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                retry += 1
+
+    # -- sync --
+
+    def run(self, name: str, call: Callable[[], Any]) -> Any:
+        """
+        Sync variant of arun, for code running in worker threads.
+
+        A blocked thread can't be interrupted, so attempts rely on the HTTP
+        client's timeout instead of the per-call timeout, and are not hedged.
+        """
+        stats = self.stats_for(name)
+        stats.count("calls")
+        retry = 0
+        while True:
+            stats.count("attempts")
+            try:
+                with self.scheduler.slot():
+                    started = time.perf_counter()
+                    result = call()
+                stats.observe(time.perf_counter() - started)
+                return result
+            except Exception as e:
+                if not self._retryable(e, stats, retry):
+                    raise
+                delay = self._backoff(retry, e)
+                print(f"LLM call {name} failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                retry += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        return {
+            "hedging": self.hedging,
+            "max_retries": self.max_retries,
+            "calls": {
+                name: {**call_stats.snapshot(), "timeout_seconds": self.timeout(name)}
+                for name, call_stats in sorted(stats.items())
+            },
+        }
@@ -0,0 +1,354 @@
+"""
+Admission control for outbound LLM calls.
+
+Every LLM call (specialist analyses, weight generation, transcription) takes
+a slot from the process-wide LLMScheduler before it goes out. The scheduler
+combines:
+
+- a token bucket capping the request rate sent to the provider,
+- a cap on calls in flight that adapts AIMD-style: it grows by one per
+  window of successful calls and is cut back when the provider answers 429
+  or calls time out or take longer than llm_latency_threshold_seconds,
+- a priority queue, so interactive submissions are admitted ahead of batch
+  work (batch submissions, queued jobs, cache warming), and
+- deadlines: a call that can't be admitted within its priority's queue
+  timeout, or that is estimated not to be, fails with LLMOverloadedError,
+  which the API turns into 503 with Retry-After.
+
+Call sites mark batch work with `llm_priority(BATCH)`; the priority lives in
+a context variable, so it reaches the tasks and threads the pipeline starts.
+
+The scheduler only sees its own process. The configured concurrency and
+rate limits are for the whole deployment and are divided by llm_processes,
+so several uvicorn workers and job worker processes stay within them together.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional
+
+import httpx
+import openai
+
+from core.config import settings
+from core.metrics import span
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = ("interactive", "batch")
+# Multiplicative decrease applied to the in-flight limit on a congestion signal
+BACKOFF_FACTOR = 0.7
+# Weight of the newest call in the moving average of call latency
+LATENCY_EWMA_ALPHA = 0.2
+
+_priority: ContextVar[int] = ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: int) -> Iterator[None]:
+    """Run the LLM calls made in the enclosed block at the given priority"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class LLMOverloadedError(Exception):
+    """The LLM call was not admitted; try again after retry_after seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """Reservation-based token bucket; callers wait the returned delay instead of polling"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def reserve(self, now: float) -> float:
+        """Take a token and return the seconds until it may be used"""
+        pause = self.paused_for(now)
+        if self.rate <= 0:
+            return pause
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        return max(pause, -self._tokens / self.rate if self._tokens < 0 else 0.0)
+
+    def refund(self):
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def paused_for(self, now: float) -> float:
+        return max(0.0, self._paused_until - now)
+
+    def pause(self, now: float, seconds: float):
+        """Hold back every call for seconds, e.g. for the provider's Retry-After"""
+        self._paused_until = max(self._paused_until, now + seconds)
+
+
+class _Waiter:
+    __slots__ = ("priority", "wake", "granted", "abandoned")
+
+    def __init__(self, priority: int, wake):
+        self.priority = priority
+        self.wake = wake
+        self.granted = False
+        self.abandoned = False
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LLMScheduler:
+    """Shared admission control for LLM calls from both threads and the event loop"""
+
+    def __init__(self, max_concurrency: int = None, min_concurrency: int = None, rate: float = None,
+                 burst: float = None, max_queued: int = None, latency_threshold: float = None,
+                 processes: int = None):
+        # This process's share of the deployment-wide limits
+        self.processes = max(1, processes or settings.llm_processes)
+        self.max_concurrency = max(1, (max_concurrency or settings.llm_max_concurrency) // self.processes)
+        self.min_concurrency = min(
+            max(1, (min_concurrency or settings.llm_min_concurrency) // self.processes), self.max_concurrency
+        )
+        self.max_queued = settings.llm_max_queued if max_queued is None else max_queued
+        self.latency_threshold = settings.llm_latency_threshold_seconds if latency_threshold is None else latency_threshold
+        self.queue_timeouts = (settings.llm_queue_timeout_seconds, settings.llm_batch_queue_timeout_seconds)
+        self.bucket = TokenBucket(
+            (settings.llm_rate_limit_per_second if rate is None else rate) / self.processes,
+            (settings.llm_rate_limit_burst if burst is None else burst) / self.processes
+        )
+
+        self._lock = threading.Lock()
+        self._limit = float(self.max_concurrency)
+        self._in_flight = 0
+        self._heap: List[tuple] = []
+        self._queued = [0] * len(PRIORITY_NAMES)
+        self._sequence = itertools.count()
+        self._latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._counters = {"admitted": 0, "rejected": 0, "rate_limited": 0, "timeouts": 0, "slow": 0, "decreases": 0}
+
+    # -- bookkeeping, called with the lock held --
+
+    def _capacity(self) -> int:
+        return max(self.min_concurrency, int(self._limit))
+
+    def _estimated_wait(self, priority: int) -> float:
+        """Rough queueing delay for a new waiter: the calls ahead of it spread over the slots"""
+        if self._latency is None:
+            return 0.0
+        ahead = sum(self._queued[:priority + 1])
+        return (ahead + 1) / self._capacity() * self._latency
+
+    def _retry_after(self, priority: int, now: float) -> float:
+        return max(1.0, self._estimated_wait(priority), self.bucket.paused_for(now))
+
+    def _enqueue(self, priority: int, timeout: float, wake) -> Optional[_Waiter]:
+        """Take a free slot (returns None) or join the queue; raises if the call can't be admitted in time"""
+        if not self._heap and self._in_flight < self._capacity():
+            self._in_flight += 1
+            return None
+        estimate = self._estimated_wait(priority)
+        if sum(self._queued) >= self.max_queued or estimate > timeout:
+            self._counters["rejected"] += 1
+            raise LLMOverloadedError(
+                f"LLM capacity exhausted ({self._in_flight} calls in flight, {sum(self._queued)} queued)",
+                self._retry_after(priority, time.monotonic())
+            )
+        waiter = _Waiter(priority, wake)
+        heapq.heappush(self._heap, (priority, next(self._sequence), waiter))
+        self._queued[priority] += 1
+        # The limit may have grown since the last release
+        self._grant()
+        return waiter
+
+    def _grant(self):
+        """Hand free slots to the queued calls in priority order"""
+        while self._heap and self._in_flight < self._capacity():
+            _, _, waiter = heapq.heappop(self._heap)
+            if waiter.abandoned:
+                continue
+            self._queued[waiter.priority] -= 1
+            self._in_flight += 1
+            waiter.granted = True
+            waiter.wake()
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Leave the queue; False if the waiter was granted a slot in the meantime"""
+        if waiter.granted:
+            return False
+        waiter.abandoned = True
+        self._queued[waiter.priority] -= 1
+        return True
+
+    def _congested(self, now: float):
+        # Concurrent calls see the same overload; cut back once per round trip, not once per call
+        if now - self._last_decrease >= max(self._latency or 0.0, 1.0):
+            self._limit = max(float(self.min_concurrency), self._limit * BACKOFF_FACTOR)
+            self._last_decrease = now
+            self._counters["decreases"] += 1
+
+    def _rate_limited(self, now: float, retry_after: Optional[float]):
+        self._counters["rate_limited"] += 1
+        if retry_after:
+            self.bucket.pause(now, retry_after)
+        self._congested(now)
+
+    def _release(self, started: float, error: Optional[BaseException] = None):
+        now = time.monotonic()
+        latency = now - started
+        with self._lock:
+            self._in_flight -= 1
+            if isinstance(error, openai.RateLimitError):
+                self._rate_limited(now, _retry_after_seconds(error.response.headers.get("retry-after")))
+            elif isinstance(error, (openai.APITimeoutError, httpx.TimeoutException, TimeoutError)):
+                self._counters["timeouts"] += 1
+                self._congested(now)
+            elif error is None:
+                self._latency = latency if self._latency is None else (
+                    LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * self._latency
+                )
+                if self.latency_threshold and latency > self.latency_threshold:
+                    self._counters["slow"] += 1
+                    self._congested(now)
+                else:
+                    # Additive increase: about one more slot per window of successful calls
+                    self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+            self._grant()
+
+    def _reserve_token(self, priority: int, deadline: float) -> float:
+        """Seconds to wait for the rate limit, or raise if that runs past the deadline"""
+        with self._lock:
+            now = time.monotonic()
+            delay = self.bucket.reserve(now)
+            # A call granted right at its deadline still goes ahead if it needn't wait for a token
+            if delay <= max(0.0, deadline - now):
+                self._counters["admitted"] += 1
+                return delay
+            self.bucket.refund()
+            self._in_flight -= 1
+            self._counters["rejected"] += 1
+            self._grant()
+        raise LLMOverloadedError(f"LLM rate limit reached; next call possible in {delay:.1f}s", delay)
+
+    def _overloaded(self, priority: int, timeout: float) -> LLMOverloadedError:
+        self._counters["rejected"] += 1
+        return LLMOverloadedError(
+            f"No LLM capacity within {timeout:g}s ({sum(self._queued)} calls queued)",
+            self._retry_after(priority, time.monotonic())
+        )
+
+    # -- admission --
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold an admitted slot for one LLM call; blocks the calling thread while queued"""
+        priority = _priority.get()
+        timeout = self.queue_timeouts[priority]
+        deadline = time.monotonic() + timeout
+        with span("llm_queue"):
+            event = threading.Event()
+            with self._lock:
+                waiter = self._enqueue(priority, timeout, event.set)
+            if waiter is not None and not event.wait(timeout):
+                with self._lock:
+                    if self._abandon(waiter):
+                        raise self._overloaded(priority, timeout)
+            delay = self._reserve_token(priority, deadline)
+            if delay:
+                time.sleep(delay)
+
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self._release(started, e)
+            raise
+        self._release(started)
+
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[None]:
+        """Async variant of slot; waits without blocking the event loop"""
+        priority = _priority.get()
+        timeout = self.queue_timeouts[priority]
+        deadline = time.monotonic() + timeout
+        with span("llm_queue"):
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            with self._lock:
+                waiter = self._enqueue(priority, timeout, lambda: loop.call_soon_threadsafe(_resolve, future))
+            if waiter is not None:
+                try:
+                    await asyncio.wait_for(future, timeout)
+                except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                    with self._lock:
+                        abandoned = self._abandon(waiter)
+                        if abandoned and isinstance(e, asyncio.TimeoutError):
+                            raise self._overloaded(priority, timeout)
+                    if isinstance(e, asyncio.CancelledError):
+                        if not abandoned:
+                            # Granted just as the caller went away
+                            self._release(time.monotonic(), e)
+                        raise
+                    # Otherwise the slot was granted right at the deadline; use it
+            try:
+                delay = self._reserve_token(priority, deadline)
+                if delay:
+                    await asyncio.sleep(delay)
+            except asyncio.CancelledError as e:
+                self._release(time.monotonic(), e)
+                raise
+
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self._release(started, e)
+            raise
+        self._release(started)
+
+    def has_capacity(self) -> bool:
+        """Whether a call would be admitted right now without queueing"""
+        with self._lock:
+            return not any(self._queued) and self._in_flight < self._capacity()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": self._capacity(),
+                "max_concurrency": self.max_concurrency,
+                "processes": self.processes,
+                "in_flight": self._in_flight,
+                "queued": dict(zip(PRIORITY_NAMES, self._queued)),
+                "average_latency_ms": round(self._latency * 1000, 2) if self._latency is not None else None,
+                "rate_limit_per_second": self.bucket.rate or None,
+                **self._counters,
+            }
@@ -0,0 +1,314 @@
+"""
+Token and latency accounting for LLM calls.
+
+Call sites wrap each LLM call in `LLMUsageRecorder.track(stage, ...)` and
+pass the tracked call's callback handler to the chain, which picks up the
+token counts the model reports. Calls made for an attempt are held in memory
+until StorageService saves that attempt's feedback and are written to the
+`llm_usage` table in the same transaction; if the analysis fails, the caller
+writes them on their own with `failed` set through save_failed. Calls that
+belong to no attempt (e.g. weight generation) are written by their caller
+through save_unattributed as soon as they finish.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from sqlalchemy import case, func
+from core.config import settings
+from core.models import AttemptUsage, LLMCall, LLMUsageDB, UsageReport, UsageRollup
+
+USAGE_GROUPS = {
+    "scenario": LLMUsageDB.scenario_id,
+    "user": LLMUsageDB.user_id,
+    "stage": LLMUsageDB.stage,
+    "model": LLMUsageDB.model,
+}
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Sums the token usage reported by the chat model runs of one call"""
+
+    # Only adds up numbers, so it can run inline instead of in an executor
+    run_inline = True
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.model: Optional[str] = None
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any):
+        counted = False
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    self.prompt_tokens += usage.get("input_tokens", 0)
+                    self.completion_tokens += usage.get("output_tokens", 0)
+                    counted = True
+                if message is not None and not self.model:
+                    self.model = message.response_metadata.get("model_name")
+        llm_output = response.llm_output or {}
+        if not counted:
+            token_usage = llm_output.get("token_usage") or {}
+            self.prompt_tokens += token_usage.get("prompt_tokens", 0)
+            self.completion_tokens += token_usage.get("completion_tokens", 0)
+        self.model = self.model or llm_output.get("model_name")
+
+
+def with_callback(config: Optional[Dict[str, Any]], handler: BaseCallbackHandler) -> Dict[str, Any]:
+    """Add a handler to a runnable config, keeping the callbacks it already has"""
+    config = dict(config or {})
+    callbacks = config.get("callbacks")
+    if callbacks is None:
+        callbacks = [handler]
+    elif isinstance(callbacks, list):
+        callbacks = callbacks + [handler]
+    else:
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=True)
+    config["callbacks"] = callbacks
+    return config
+
+
+class TrackedCall:
+    """An LLM call in progress; pass `handler` to the chain, or set `cached` on a cache hit"""
+
+    def __init__(self, stage: str, model: Optional[str]):
+        self.stage = stage
+        self.model = model
+        self.cached = False
+        self.handler = UsageCallbackHandler()
+        self.started = time.perf_counter()
+
+    def config(self, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return with_callback(config, self.handler)
+
+    def result(self) -> LLMCall:
+        prompt, completion = self.handler.prompt_tokens, self.handler.completion_tokens
+        return LLMCall(
+            stage=self.stage,
+            model=self.handler.model or self.model,
+            prompt_tokens=prompt,
+            completion_tokens=completion,
+            total_tokens=prompt + completion,
+            duration_ms=round((time.perf_counter() - self.started) * 1000, 2),
+            cached=self.cached
+        )
+
+
+class LLMUsageRecorder:
+    """Collects LLM calls until they are saved, and answers usage queries"""
+
+    def __init__(self, session_factory, max_pending_attempts: int = 10000):
+        self.SessionLocal = session_factory
+        self.max_pending_attempts = max_pending_attempts
+        self._pending: "OrderedDict[str, List[LLMCall]]" = OrderedDict()
+        # (call, scenario_id, user_id) of calls that belong to no attempt
+        self._unattributed: List[Tuple[LLMCall, Optional[str], Optional[str]]] = []
+        # Attempts already written by save_failed, whose other calls may still be finishing
+        self._failed: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self, stage: str, model: Optional[str] = None, attempt_id: Optional[str] = None,
+              scenario_id: Optional[str] = None, user_id: Optional[str] = None) -> Iterator[TrackedCall]:
+        """Time an LLM call and record it when the block exits, including when it fails"""
+        call = TrackedCall(stage, model)
+        try:
+            yield call
+        finally:
+            self.record(call.result(), attempt_id, scenario_id, user_id)
+
+    def record(self, call: LLMCall, attempt_id: Optional[str] = None,
+               scenario_id: Optional[str] = None, user_id: Optional[str] = None):
+        with self._lock:
+            if attempt_id is None:
+                self._unattributed.append((call, scenario_id, user_id))
+                return
+            failed = self._failed.get(attempt_id)
+            if failed is None:
+                self._pending.setdefault(attempt_id, []).append(call)
+                self._pending.move_to_end(attempt_id)
+                # Attempts that are never saved or failed don't keep their calls forever
+                while len(self._pending) > self.max_pending_attempts:
+                    self._pending.popitem(last=False)
+                return
+        # A parallel call that finished after its analysis failed and was written
+        rows = self._to_rows([(call, attempt_id, *failed)], failed=True)
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self._insert, rows, f"attempt {attempt_id}")
+        except RuntimeError:
+            self._insert(rows, f"attempt {attempt_id}")
+
+    def _to_rows(self, pending: List[Tuple[LLMCall, Optional[str], Optional[str], Optional[str]]],
+                 failed: bool = False) -> List[LLMUsageDB]:
+        return [
+            LLMUsageDB(attempt_id=attempt_id, scenario_id=scenario_id, user_id=user_id,
+                       **call.model_dump(exclude={"failed"}), failed=failed)
+            for call, attempt_id, scenario_id, user_id in pending
+        ]
+
+    def _insert(self, rows: List[LLMUsageDB], description: str) -> int:
+        """Write rows in their own transaction; usage is best effort, so errors are only logged"""
+        if not rows:
+            return 0
+        db = self.SessionLocal()
+        try:
+            db.add_all(rows)
+            db.commit()
+            return len(rows)
+        except Exception as e:
+            db.rollback()
+            print(f"Error saving {len(rows)} LLM usage rows for {description}: {e}")
+            return 0
+        finally:
+            db.close()
+
+    def _take(self, attempts: List[Tuple[str, str, str]]) -> list:
+        with self._lock:
+            return [(call, attempt_id, scenario_id, user_id)
+                    for attempt_id, scenario_id, user_id in attempts
+                    for call in self._pending.pop(attempt_id, [])]
+
+    def take_rows(self, attempts: List[Tuple[str, str, str]]) -> List[LLMUsageDB]:
+        """Remove the calls of (attempt_id, scenario_id, user_id) attempts from the buffer as rows to insert"""
+        return self._to_rows(self._take(attempts))
+
+    def save_failed(self, attempts: List[Tuple[str, str, str]]) -> int:
+        """
+        Write the buffered calls of attempts whose analysis failed, marked
+        failed. Calls of these attempts that finish later are written as they
+        are recorded. Returns rows written.
+        """
+        with self._lock:
+            for attempt_id, scenario_id, user_id in attempts:
+                self._failed[attempt_id] = (scenario_id, user_id)
+                self._failed.move_to_end(attempt_id)
+            while len(self._failed) > self.max_pending_attempts:
+                self._failed.popitem(last=False)
+        return self._insert(self._to_rows(self._take(attempts), failed=True), f"{len(attempts)} failed attempts")
+
+    def retry(self, attempt_id: str):
+        """Record the calls of an attempt that failed as pending again, before it is analyzed once more"""
+        with self._lock:
+            self._failed.pop(attempt_id, None)
+
+    def save_unattributed(self) -> int:
+        """Write the buffered calls that belong to no attempt. Returns rows written."""
+        with self._lock:
+            pending = [(call, None, scenario_id, user_id) for call, scenario_id, user_id in self._unattributed]
+            self._unattributed = []
+        return self._insert(self._to_rows(pending), "calls without an attempt")
+
+    def _cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return round(
+            (prompt_tokens * settings.llm_input_cost_per_million
+             + completion_tokens * settings.llm_output_cost_per_million) / 1_000_000, 6
+        )
+
+    def _rollup_columns(self):
+        return (
+            func.count(LLMUsageDB.id),
+            func.sum(case((LLMUsageDB.cached, 1), else_=0)),
+            func.sum(case((LLMUsageDB.failed, 1), else_=0)),
+            func.count(func.distinct(LLMUsageDB.attempt_id)),
+            func.sum(LLMUsageDB.prompt_tokens),
+            func.sum(LLMUsageDB.completion_tokens),
+            func.sum(LLMUsageDB.total_tokens),
+            # Cache hits take no model time, so they are left out of the latency figures
+            func.avg(case((LLMUsageDB.cached, None), else_=LLMUsageDB.duration_ms)),
+            func.max(case((LLMUsageDB.cached, None), else_=LLMUsageDB.duration_ms)),
+        )
+
+    def _rollup(self, key: Optional[str], row) -> UsageRollup:
+        calls, cached, failed, attempts, prompt, completion, total, average, maximum = row
+        prompt, completion = prompt or 0, completion or 0
+        return UsageRollup(
+            key=key,
+            calls=calls or 0,
+            cached_calls=cached or 0,
+            failed_calls=failed or 0,
+            attempts=attempts or 0,
+            prompt_tokens=prompt,
+            completion_tokens=completion,
+            total_tokens=total or 0,
+            average_duration_ms=round(average, 2) if average is not None else None,
+            max_duration_ms=maximum,
+            estimated_cost=self._cost(prompt, completion)
+        )
+
+    def get_report(self, group_by: str = "scenario", user_id: Optional[str] = None,
+                   scenario_id: Optional[str] = None, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> UsageReport:
+        """Usage totals, and per group ordered by total tokens"""
+        if group_by not in USAGE_GROUPS:
+            raise ValueError(f"group_by must be one of {', '.join(USAGE_GROUPS)}")
+        db = self.SessionLocal()
+        try:
+            def base(*columns):
+                query = db.query(*columns).select_from(LLMUsageDB)
+                if user_id is not None:
+                    query = query.filter(LLMUsageDB.user_id == user_id)
+                if scenario_id is not None:
+                    query = query.filter(LLMUsageDB.scenario_id == scenario_id)
+                if start is not None:
+                    query = query.filter(LLMUsageDB.timestamp >= start)
+                if end is not None:
+                    query = query.filter(LLMUsageDB.timestamp < end)
+                return query
+
+            totals = self._rollup(None, base(*self._rollup_columns()).one())
+            group_column = USAGE_GROUPS[group_by]
+            rows = base(group_column, *self._rollup_columns()) \
+                .group_by(group_column).order_by(func.sum(LLMUsageDB.total_tokens).desc()).all()
+            return UsageReport(
+                group_by=group_by,
+                totals=totals,
+                groups=[self._rollup(row[0], row[1:]) for row in rows]
+            )
+        finally:
+            db.close()
+
+    def get_attempt_usage(self, attempt_id: str) -> Optional[AttemptUsage]:
+        """Every recorded call of one attempt, oldest first"""
+        db = self.SessionLocal()
+        try:
+            rows = db.query(LLMUsageDB).filter(LLMUsageDB.attempt_id == attempt_id) \
+                .order_by(LLMUsageDB.timestamp, LLMUsageDB.id).all()
+            if not rows:
+                return None
+            calls = [
+                LLMCall(
+                    stage=row.stage, model=row.model, prompt_tokens=row.prompt_tokens,
+                    completion_tokens=row.completion_tokens, total_tokens=row.total_tokens,
+                    duration_ms=row.duration_ms, cached=row.cached, failed=row.failed, timestamp=row.timestamp
+                )
+                for row in rows
+            ]
+            live = [call.duration_ms for call in calls if not call.cached]
+            prompt = sum(call.prompt_tokens for call in calls)
+            completion = sum(call.completion_tokens for call in calls)
+            totals = UsageRollup(
+                key=attempt_id,
+                calls=len(calls),
+                cached_calls=len(calls) - len(live),
+                failed_calls=sum(1 for call in calls if call.failed),
+                attempts=1,
+                prompt_tokens=prompt,
+                completion_tokens=completion,
+                total_tokens=prompt + completion,
+                average_duration_ms=round(sum(live) / len(live), 2) if live else None,
+                max_duration_ms=max(live) if live else None,
+                estimated_cost=self._cost(prompt, completion)
+            )
+            return AttemptUsage(attempt_id=attempt_id, totals=totals, calls=calls)
+        finally:
+            db.close()
@@ -0,0 +1,155 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class JsonResultWriter:
+    """
+    Writes the JSON result files either inline or through a write-behind queue.
+
+    In write-behind mode the request thread only enqueues work; a single
+    background thread drains the bounded queue in batches, writes the JSON
+    files and applies all daily summary updates of a batch with one
+    read/write of the summary file. When the queue is full the caller falls
+    back to writing synchronously so nothing is dropped.
+    """
+
+    def __init__(self, save_json: Callable[[dict, str], bool],
+                 update_summaries: Callable[[List[tuple]], None],
+                 write_behind: bool = False, queue_size: int = 1000, batch_size: int = 50):
+        self._save_json = save_json
+        self._update_summaries = update_summaries
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "errors": 0,
+            "sync_fallbacks": 0,
+            "last_batch_size": 0,
+            "last_lag_seconds": 0.0,
+            "max_lag_seconds": 0.0,
+        }
+        self._oldest_pending: Optional[float] = None
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        if write_behind:
+            self._thread = threading.Thread(target=self._run, name="json-result-writer", daemon=True)
+            self._thread.start()
+
+    def write_json(self, data: dict, filepath: str):
+        """Write a JSON file, possibly deferred"""
+        self._submit(("json", (data, filepath)))
+
+    def update_summary(self, entry: tuple):
+        """Record an attempt in the daily summary, possibly deferred"""
+        self._submit(("summary", entry))
+
+    def write_many(self, files: List[Tuple[dict, str]], summary_entries: List[tuple]):
+        """Write several JSON files and summary entries; inline they are applied as one batch"""
+        jobs = [("json", payload) for payload in files] + [("summary", entry) for entry in summary_entries]
+        if not self.write_behind or self._closed:
+            self._process(jobs)
+            return
+        for job in jobs:
+            self._submit(job)
+
+    def _submit(self, job: Tuple[str, tuple]):
+        if not self.write_behind or self._closed:
+            self._process([job])
+            return
+        try:
+            self._queue.put_nowait((time.monotonic(), job))
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["sync_fallbacks"] += 1
+            self._process([job])
+            return
+        with self._stats_lock:
+            self._stats["enqueued"] += 1
+            if self._oldest_pending is None:
+                self._oldest_pending = time.monotonic()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    # Shutdown sentinel: finish this batch, then stop
+                    self._queue.put_nowait(None)
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+
+            self._process([job for _, job in batch])
+
+            lag = time.monotonic() - batch[0][0]
+            with self._stats_lock:
+                self._stats["batches"] += 1
+                self._stats["last_batch_size"] = len(batch)
+                self._stats["last_lag_seconds"] = round(lag, 4)
+                self._stats["max_lag_seconds"] = max(self._stats["max_lag_seconds"], round(lag, 4))
+                self._oldest_pending = None if self._queue.empty() else time.monotonic()
+            for _ in batch:
+                self._queue.task_done()
+
+    def _process(self, jobs: List[Tuple[str, tuple]]):
+        summaries = []
+        written = errors = 0
+        for kind, payload in jobs:
+            if kind == "summary":
+                summaries.append(payload)
+                continue
+            if self._save_json(*payload):
+                written += 1
+            else:
+                errors += 1
+        if summaries:
+            try:
+                self._update_summaries(summaries)
+                written += len(summaries)
+            except Exception as e:
+                print(f"Error updating daily summary: {e}")
+                errors += len(summaries)
+        with self._stats_lock:
+            self._stats["written"] += written
+            self._stats["errors"] += errors
+
+    def flush(self):
+        """Block until everything queued so far has been written"""
+        if self.write_behind:
+            self._queue.join()
+
+    def close(self):
+        """Flush pending writes and stop the background thread"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join()
+            self._oldest_pending = None
+
+    def metrics(self) -> Dict[str, float]:
+        """Queue depth, lag and throughput counters"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            oldest = self._oldest_pending
+        stats["write_behind"] = self.write_behind
+        stats["queue_depth"] = self._queue.qsize()
+        stats["queue_capacity"] = self._queue.maxsize
+        stats["oldest_pending_seconds"] = round(time.monotonic() - oldest, 4) if oldest else 0.0
+        return stats
+
@@ -1,41 +1,147 @@
 import json
 import os
-from typing import List, Optional
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
 from core.config import settings
+from core.metrics import span
 from core.models import Scenario
 
 class ScenarioService:
     def __init__(self):
         self.scenarios_dir = settings.scenarios_dir
+        self.refresh_interval = settings.scenario_refresh_interval
         self._ensure_scenarios_dir()
+
+        # In-memory catalog: scenarios are parsed once and served from these indexes
+        self._lock = threading.RLock()
+        self._scenarios: Dict[str, Scenario] = {}
+        self._file_mtimes: Dict[str, float] = {}
+        # Every parsed file, and the files claiming each id; only one of them is served
+        self._file_scenarios: Dict[str, Scenario] = {}
+        self._id_files: Dict[str, Set[str]] = defaultdict(set)
+        self._by_difficulty: Dict[str, Set[str]] = defaultdict(set)
+        self._by_medical_area: Dict[str, Set[str]] = defaultdict(set)
+        self._by_patient_type: Dict[str, Set[str]] = defaultdict(set)
+        self._sorted: List[Scenario] = []
+        self._last_refresh = 0.0
+
+        self.refresh()
     
     def _ensure_scenarios_dir(self):
         os.makedirs(self.scenarios_dir, exist_ok=True)
     
+    def _index_keys(self, scenario: Scenario):
+        return (
+            (self._by_difficulty, scenario.difficulty.value),
+            (self._by_medical_area, scenario.medical_area.lower()),
+            (self._by_patient_type, scenario.patient_type.lower()),
+        )
+    
+    def _reindex(self, scenario_id: str):
+        """Serve the winning file for an id from the primary and secondary indexes"""
+        current = self._scenarios.pop(scenario_id, None)
+        if current:
+            for index, key in self._index_keys(current):
+                index[key].discard(scenario_id)
+                if not index[key]:
+                    del index[key]
+
+        files = self._id_files.get(scenario_id)
+        if not files:
+            self._id_files.pop(scenario_id, None)
+            return
+        # <id>.json (the file save_scenario writes) wins, then the first file by name
+        ranked = sorted(files, key=lambda name: (name != f"{scenario_id}.json", name))
+        if len(ranked) > 1:
+            print(f"Duplicate scenario id {scenario_id} in {', '.join(ranked)}; using {ranked[0]}")
+        scenario = self._scenarios[scenario_id] = self._file_scenarios[ranked[0]]
+        for index, key in self._index_keys(scenario):
+            index[key].add(scenario_id)
+    
+    def _add_file(self, filename: str, scenario: Scenario):
+        self._file_scenarios[filename] = scenario
+        self._id_files[scenario.id].add(filename)
+        self._reindex(scenario.id)
+    
+    def _remove_file(self, filename: str):
+        """Forget a file, falling back to another file with the same id if there is one"""
+        self._file_mtimes.pop(filename, None)
+        scenario = self._file_scenarios.pop(filename, None)
+        if scenario:
+            self._id_files[scenario.id].discard(filename)
+            self._reindex(scenario.id)
+    
+    def refresh(self) -> int:
+        """Re-scan the scenarios directory, reloading only files whose mtime changed.
+
+        Returns the number of files that were (re)loaded or removed.
+        """
+        with self._lock:
+            changed = 0
+            seen = set()
+            if os.path.exists(self.scenarios_dir):
+                with os.scandir(self.scenarios_dir) as entries:
+                    for entry in entries:
+                        if not entry.name.endswith('.json') or not entry.is_file():
+                            continue
+                        seen.add(entry.name)
+                        mtime = entry.stat().st_mtime
+                        if self._file_mtimes.get(entry.name) == mtime:
+                            continue
+
+                        self._remove_file(entry.name)
+                        scenario = self.get_scenario_from_file(entry.name)
+                        self._file_mtimes[entry.name] = mtime
+                        if scenario:
+                            self._add_file(entry.name, scenario)
+                        changed += 1
+
+            for filename in list(self._file_mtimes):
+                if filename not in seen:
+                    self._remove_file(filename)
+                    changed += 1
+
+            if changed or not self._last_refresh:
+                self._sorted = sorted(self._scenarios.values(), key=lambda x: x.id)
+            self._last_refresh = time.monotonic()
+            return changed
+    
+    def _maybe_refresh(self):
+        """Pick up on-disk changes at most once per refresh interval"""
+        if self.refresh_interval > 0 and time.monotonic() - self._last_refresh >= self.refresh_interval:
+            self.refresh()
+    
     def get_all_scenarios(self) -> List[Scenario]:
         """Get all available scenarios"""
-        scenarios = []
-        if not os.path.exists(self.scenarios_dir):
-            return scenarios
-            
-        for filename in os.listdir(self.scenarios_dir):
-            if filename.endswith('.json'):
-                try:
-                    scenario = self.get_scenario_from_file(filename)
-                    if scenario:
-                        scenarios.append(scenario)
-                except Exception as e:
-                    print(f"Error loading scenario {filename}: {e}")
-        
-        return sorted(scenarios, key=lambda x: x.id)
+        self._maybe_refresh()
+        return list(self._sorted)
     
     def get_scenario(self, scenario_id: str) -> Optional[Scenario]:
         """Get a specific scenario by ID"""
-        scenarios = self.get_all_scenarios()
-        for scenario in scenarios:
-            if scenario.id == scenario_id:
-                return scenario
-        return None
+        with span("scenario_lookup"):
+            self._maybe_refresh()
+            return self._scenarios.get(scenario_id)
+    
+    def find_scenarios(self, difficulty: Optional[str] = None, medical_area: Optional[str] = None,
+                       patient_type: Optional[str] = None) -> List[Scenario]:
+        """Get scenarios matching all of the given attributes using the secondary indexes"""
+        self._maybe_refresh()
+        with self._lock:
+            candidates = None
+            for index, key in (
+                (self._by_difficulty, difficulty),
+                (self._by_medical_area, medical_area.lower() if medical_area else None),
+                (self._by_patient_type, patient_type.lower() if patient_type else None),
+            ):
+                if key is None:
+                    continue
+                ids = index.get(key, set())
+                candidates = set(ids) if candidates is None else candidates & ids
+            if candidates is None:
+                return list(self._sorted)
+            return sorted((self._scenarios[i] for i in candidates), key=lambda x: x.id)
     
     def get_scenario_from_file(self, filename: str) -> Optional[Scenario]:
         """Load scenario from JSON file"""
@@ -55,6 +161,11 @@ class ScenarioService:
         try:
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(scenario.dict(), f, indent=2, ensure_ascii=False)
+            with self._lock:
+                self._remove_file(filename)
+                self._file_mtimes[filename] = os.path.getmtime(filepath)
+                self._add_file(filename, scenario)
+                self._sorted = sorted(self._scenarios.values(), key=lambda x: x.id)
             return True
         except Exception as e:
             print(f"Error saving scenario {scenario.id}: {e}")
@@ -1,22 +1,97 @@
+import base64
 import json
 import os
 from datetime import datetime
-from typing import List, Optional
-from sqlalchemy import create_engine
+from typing import List, Optional, Tuple
+from pydantic import BaseModel
+from sqlalchemy import and_, or_
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 from core.config import settings
+from core.database import create_db_engine, create_session_factory
+from core.metrics import span
+from core.migrations import run_migrations
+from services.daily_summary_service import DailySummaryStore, SummaryEntry
+from services.feedback_index import FeedbackVectorIndex
+from services.llm_usage_service import LLMUsageRecorder
+from services.result_writer import JsonResultWriter
 from core.models import (
-    Base, PracticeAttempt, FeedbackAnalysis, PracticeAttemptDB, 
-    FeedbackAnalysisDB, ScoreDetail
+    PracticeAttempt, FeedbackAnalysis, PracticeAttemptDB, 
+    FeedbackAnalysisDB, ScoreDetail, FEEDBACK_CATEGORIES
 )
 
+def encode_cursor(timestamp: datetime, row_id) -> str:
+    """Opaque keyset cursor for the (timestamp, id) of the last row on a page"""
+    raw = json.dumps([timestamp.isoformat(), row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, object]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(timestamp), row_id
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class ResultFilters(BaseModel):
+    """Optional filters shared by the paginated results queries"""
+    user_id: Optional[str] = None
+    scenario_id: Optional[str] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    min_score: Optional[float] = None
+    max_score: Optional[float] = None
+
+    @property
+    def has_score_range(self) -> bool:
+        return self.min_score is not None or self.max_score is not None
+
+
+def filter_feedback_query(query, filters: ResultFilters):
+    """Restrict a query over FeedbackAnalysisDB to the given filters"""
+    if filters.user_id is not None:
+        query = query.join(PracticeAttemptDB, PracticeAttemptDB.id == FeedbackAnalysisDB.attempt_id) \
+            .filter(PracticeAttemptDB.user_id == filters.user_id)
+    if filters.scenario_id is not None:
+        query = query.filter(FeedbackAnalysisDB.scenario_id == filters.scenario_id)
+    if filters.start is not None:
+        query = query.filter(FeedbackAnalysisDB.timestamp >= filters.start)
+    if filters.end is not None:
+        query = query.filter(FeedbackAnalysisDB.timestamp < filters.end)
+    if filters.min_score is not None:
+        query = query.filter(FeedbackAnalysisDB.overall_score >= filters.min_score)
+    if filters.max_score is not None:
+        query = query.filter(FeedbackAnalysisDB.overall_score <= filters.max_score)
+    return query
+
+
 class StorageService:
-    def __init__(self):
-        self.engine = create_engine(settings.database_url)
-        Base.metadata.create_all(bind=self.engine)
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+    def __init__(self, engine: Optional[Engine] = None, session_factory: Optional[sessionmaker] = None):
+        # The app container passes its shared engine; standalone use creates (and migrates) its own
+        if engine is None:
+            engine = create_db_engine(settings.database_url)
+            run_migrations(engine)
+        self.engine = engine
+        self.SessionLocal = session_factory or create_session_factory(self.engine)
         self.results_dir = settings.results_dir
         self._ensure_results_dir()
+        self.daily_summaries = DailySummaryStore(
+            self.SessionLocal, os.path.join(self.results_dir, "daily_summaries")
+        )
+        # JSON mirrors go through a writer that can defer them off the request path
+        self.writer = JsonResultWriter(
+            self._save_to_json,
+            self._update_daily_summaries,
+            write_behind=settings.json_write_behind,
+            queue_size=settings.json_write_queue_size,
+            batch_size=settings.json_write_batch_size
+        )
+        # Vector index of past feedback items for scenario-relevant RAG
+        self.feedback_index = FeedbackVectorIndex(self.SessionLocal)
+        # LLM calls made for each attempt, written with its feedback
+        self.llm_usage = LLMUsageRecorder(self.SessionLocal)
     
     def _ensure_results_dir(self):
         """Ensure results directory exists with proper structure"""
@@ -25,6 +100,10 @@ class StorageService:
         os.makedirs(os.path.join(self.results_dir, "feedback"), exist_ok=True)
         os.makedirs(os.path.join(self.results_dir, "daily_summaries"), exist_ok=True)
     
+    def close(self):
+        """Flush queued JSON writes and stop the writer thread"""
+        self.writer.close()
+    
     def get_db(self):
         db = self.SessionLocal()
         try:
@@ -35,7 +114,7 @@ class StorageService:
     def _save_to_json(self, data: dict, filepath: str):
         """Save data to JSON file"""
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
+            with span("json_write"), open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2, default=str, ensure_ascii=False)
             return True
         except Exception as e:
@@ -45,71 +124,235 @@ class StorageService:
     def _get_daily_summary_path(self) -> str:
         """Get path for today's summary file"""
         today = datetime.now().strftime("%Y-%m-%d")
-        return os.path.join(self.results_dir, "daily_summaries", f"summary_{today}.json")
+        return self.daily_summaries.summary_path(today)
     
-    def _update_daily_summary(self, attempt_id: str, scenario_id: str, overall_score: float):
-        """Update daily summary file"""
-        summary_path = self._get_daily_summary_path()
-        
-        # Load existing summary or create new
-        if os.path.exists(summary_path):
-            with open(summary_path, 'r') as f:
-                summary = json.load(f)
-        else:
-            summary = {
-                "date": datetime.now().strftime("%Y-%m-%d"),
-                "total_attempts": 0,
-                "average_score": 0,
-                "attempts": [],
-                "scenarios_practiced": {}
+    def _update_daily_summaries(self, entries: List[SummaryEntry]):
+        """Append a batch of attempts to the daily logs and refresh the summary files"""
+        self.daily_summaries.write_entries(entries, self._save_to_json)
+    
+    def _attempt_to_db(self, attempt: PracticeAttempt) -> PracticeAttemptDB:
+        return PracticeAttemptDB(
+            id=attempt.id,
+            scenario_id=attempt.scenario_id,
+            user_response=attempt.user_response,
+            input_type=attempt.input_type,
+            timestamp=attempt.timestamp,
+            user_id=attempt.user_id
+        )
+    
+    def _attempt_from_db(self, attempt: PracticeAttemptDB) -> PracticeAttempt:
+        return PracticeAttempt(
+            id=attempt.id,
+            scenario_id=attempt.scenario_id,
+            user_response=attempt.user_response,
+            input_type=attempt.input_type,
+            timestamp=attempt.timestamp,
+            user_id=attempt.user_id
+        )
+    
+    def _feedback_to_db(self, feedback: FeedbackAnalysis) -> FeedbackAnalysisDB:
+        details = {}
+        scores = {}
+        for category in FEEDBACK_CATEGORIES:
+            detail: ScoreDetail = getattr(feedback, category)
+            scores[f"{category}_score"] = detail.score
+            details[category] = {
+                "explanation": detail.explanation,
+                "strengths": detail.strengths,
+                "improvements": detail.improvements,
+                "examples": detail.examples or []
             }
+        return FeedbackAnalysisDB(
+            attempt_id=feedback.attempt_id,
+            scenario_id=feedback.scenario_id,
+            details=details,
+            overall_score=feedback.overall_score,
+            general_feedback=feedback.general_feedback,
+            timestamp=feedback.timestamp,
+            **scores
+        )
+    
+    def _feedback_from_db(self, feedback: FeedbackAnalysisDB) -> FeedbackAnalysis:
+        details = feedback.details or {}
+        return FeedbackAnalysis(
+            attempt_id=feedback.attempt_id,
+            scenario_id=feedback.scenario_id,
+            overall_score=feedback.overall_score,
+            general_feedback=feedback.general_feedback,
+            timestamp=feedback.timestamp,
+            **{
+                category: ScoreDetail(
+                    score=getattr(feedback, f"{category}_score"),
+                    **details.get(category, {"explanation": "", "strengths": [], "improvements": []})
+                )
+                for category in FEEDBACK_CATEGORIES
+            }
+        )
+    
+    def _feedback_to_json(self, feedback: FeedbackAnalysis) -> dict:
+        """Build the full feedback structure written to the JSON results"""
+        return {
+            "attempt_id": feedback.attempt_id,
+            "scenario_id": feedback.scenario_id,
+            "timestamp": feedback.timestamp.isoformat(),
+            "overall_score": feedback.overall_score,
+            "general_feedback": feedback.general_feedback,
+            "detailed_scores": {
+                category: {
+                    "score": detail.score,
+                    "explanation": detail.explanation,
+                    "strengths": detail.strengths,
+                    "improvements": detail.improvements,
+                    "examples": detail.examples or []
+                }
+                for category, detail in (
+                    ("medical_accuracy", feedback.medical_accuracy),
+                    ("communication_clarity", feedback.communication_clarity),
+                    ("empathy_tone", feedback.empathy_tone),
+                    ("completeness", feedback.completeness),
+                )
+            }
+        }
+    
+    def _attempt_json_file(self, attempt_data: dict) -> Tuple[dict, str]:
+        json_path = os.path.join(
+            self.results_dir, 
+            "attempts", 
+            f"{attempt_data['id']}.json"
+        )
+        return attempt_data, json_path
+
+    def _save_attempt_json(self, attempt_data: dict):
+        self.writer.write_json(*self._attempt_json_file(attempt_data))
+    
+    def _feedback_json_jobs(self, feedback: FeedbackAnalysis, feedback_data: dict,
+                            attempt_data: Optional[dict], summary_date: str) -> Tuple[List[Tuple[dict, str]], SummaryEntry]:
+        """The feedback and combined result files plus the daily summary entry for one feedback"""
+        # Individual feedback JSON
+        files = [(feedback_data, os.path.join(
+            self.results_dir, 
+            "feedback", 
+            f"feedback_{feedback.attempt_id}.json"
+        ))]
         
-        # Update summary
-        summary["total_attempts"] += 1
-        summary["attempts"].append({
-            "attempt_id": attempt_id,
-            "scenario_id": scenario_id,
-            "score": overall_score,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        # Update scenario count
-        if scenario_id in summary["scenarios_practiced"]:
-            summary["scenarios_practiced"][scenario_id] += 1
-        else:
-            summary["scenarios_practiced"][scenario_id] = 1
-        
-        # Recalculate average
-        total_score = sum(attempt["score"] for attempt in summary["attempts"])
-        summary["average_score"] = round(total_score / summary["total_attempts"], 2)
+        # Also save a combined result file
+        if attempt_data is not None:
+            combined_path = os.path.join(
+                self.results_dir,
+                f"complete_result_{feedback.attempt_id}.json"
+            )
+            combined_data = {
+                "attempt": attempt_data,
+                "feedback": feedback_data,
+                "metadata": {
+                    "created_at": datetime.now().isoformat(),
+                    "version": "1.0"
+                }
+            }
+            files.append((combined_data, combined_path))
+
+        # Appended to the daily attempt log; the summary snapshot is refreshed from it
+        summary_entry = (
+            summary_date,
+            feedback.attempt_id, 
+            feedback.scenario_id, 
+            feedback.overall_score,
+            feedback.timestamp.isoformat()
+        )
+        return files, summary_entry
+
+    def _save_feedback_json(self, feedback: FeedbackAnalysis, feedback_data: dict,
+                            attempt_data: Optional[dict], summary_date: str):
+        """Write the feedback, daily summary and combined result JSON files"""
+        files, summary_entry = self._feedback_json_jobs(feedback, feedback_data, attempt_data, summary_date)
+        self.writer.write_many(files, [summary_entry])
+    
+    def _record_daily_summary(self, db, feedback: FeedbackAnalysis) -> str:
+        """Add the feedback to the daily aggregates within the current transaction"""
+        return self.daily_summaries.record(
+            db, feedback.scenario_id, feedback.overall_score, feedback.timestamp
+        )
+    
+    def save_result(self, attempt: PracticeAttempt, feedback: FeedbackAnalysis) -> bool:
+        """Save an attempt and its feedback in a single transaction, then write the JSON results.
+
+        The combined result file is built from the in-memory objects instead of
+        re-reading the attempt JSON from disk.
+        """
+        db = next(self.get_db())
+        try:
+            db.add(self._attempt_to_db(attempt))
+            db.add(self._feedback_to_db(feedback))
+            db.add_all(self.llm_usage.take_rows([(attempt.id, attempt.scenario_id, attempt.user_id)]))
+            summary_date = self._record_daily_summary(db, feedback)
+            with span("db_commit.save_result"):
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error saving result for {attempt.id}: {e}")
+            return False
+        finally:
+            db.close()
+        self.feedback_index.add_feedback(attempt.user_id, feedback)
         
-        # Save updated summary
-        self._save_to_json(summary, summary_path)
+        attempt_data = attempt.model_dump()
+        self._save_attempt_json(attempt_data)
+        self._save_feedback_json(feedback, self._feedback_to_json(feedback), attempt_data, summary_date)
+        return True
+    
+    def save_results(self, results: List[Tuple[PracticeAttempt, FeedbackAnalysis]]) -> bool:
+        """Save many attempts and their feedback with one bulk insert and one commit.
+
+        Daily aggregates get one upsert per distinct day/scenario/bucket, and
+        the JSON files of the whole batch are handed to the writer together.
+        """
+        if not results:
+            return True
+        db = next(self.get_db())
+        try:
+            db.add_all([self._attempt_to_db(attempt) for attempt, _ in results])
+            db.add_all([self._feedback_to_db(feedback) for _, feedback in results])
+            db.add_all(self.llm_usage.take_rows([
+                (attempt.id, attempt.scenario_id, attempt.user_id) for attempt, _ in results
+            ]))
+            summary_dates = self.daily_summaries.record_many(db, [
+                (feedback.scenario_id, feedback.overall_score, feedback.timestamp)
+                for _, feedback in results
+            ])
+            with span("db_commit.save_results"):
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error saving batch of {len(results)} results: {e}")
+            return False
+        finally:
+            db.close()
+        for attempt, feedback in sorted(results, key=lambda result: result[0].timestamp):
+            self.feedback_index.add_feedback(attempt.user_id, feedback)
+
+        files, summary_entries = [], []
+        for (attempt, feedback), summary_date in zip(results, summary_dates):
+            attempt_data = attempt.model_dump()
+            feedback_files, summary_entry = self._feedback_json_jobs(
+                feedback, self._feedback_to_json(feedback), attempt_data, summary_date
+            )
+            files.append(self._attempt_json_file(attempt_data))
+            files.extend(feedback_files)
+            summary_entries.append(summary_entry)
+        self.writer.write_many(files, summary_entries)
+        return True
     
     def save_attempt(self, attempt: PracticeAttempt) -> bool:
         """Save practice attempt to both database and JSON"""
         # Save to database
         db = next(self.get_db())
         try:
-            db_attempt = PracticeAttemptDB(
-                id=attempt.id,
-                scenario_id=attempt.scenario_id,
-                user_response=attempt.user_response,
-                input_type=attempt.input_type,
-                timestamp=attempt.timestamp,
-                user_id=attempt.user_id
-            )
-            db.add(db_attempt)
-            db.commit()
+            db.add(self._attempt_to_db(attempt))
+            with span("db_commit.save_attempt"):
+                db.commit()
             
             # Save to JSON
-            attempt_data = attempt.model_dump()
-            json_path = os.path.join(
-                self.results_dir, 
-                "attempts", 
-                f"{attempt.id}.json"
-            )
-            self._save_to_json(attempt_data, json_path)
+            self._save_attempt_json(attempt.model_dump())
             
             return True
         except Exception as e:
@@ -124,120 +367,20 @@ class StorageService:
         db = next(self.get_db())
         try:
             # Save to database
-            db_feedback = FeedbackAnalysisDB(
-                attempt_id=feedback.attempt_id,
-                scenario_id=feedback.scenario_id,
-                
-                medical_accuracy_score=feedback.medical_accuracy.score,
-                medical_accuracy_explanation=feedback.medical_accuracy.explanation,
-                medical_accuracy_strengths=json.dumps(feedback.medical_accuracy.strengths),
-                medical_accuracy_improvements=json.dumps(feedback.medical_accuracy.improvements),
-                medical_accuracy_examples=json.dumps(feedback.medical_accuracy.examples or []),
-                
-                communication_clarity_score=feedback.communication_clarity.score,
-                communication_clarity_explanation=feedback.communication_clarity.explanation,
-                communication_clarity_strengths=json.dumps(feedback.communication_clarity.strengths),
-                communication_clarity_improvements=json.dumps(feedback.communication_clarity.improvements),
-                communication_clarity_examples=json.dumps(feedback.communication_clarity.examples or []),
-                
-                empathy_tone_score=feedback.empathy_tone.score,
-                empathy_tone_explanation=feedback.empathy_tone.explanation,
-                empathy_tone_strengths=json.dumps(feedback.empathy_tone.strengths),
-                empathy_tone_improvements=json.dumps(feedback.empathy_tone.improvements),
-                empathy_tone_examples=json.dumps(feedback.empathy_tone.examples or []),
-                
-                completeness_score=feedback.completeness.score,
-                completeness_explanation=feedback.completeness.explanation,
-                completeness_strengths=json.dumps(feedback.completeness.strengths),
-                completeness_improvements=json.dumps(feedback.completeness.improvements),
-                completeness_examples=json.dumps(feedback.completeness.examples or []),
-                
-                overall_score=feedback.overall_score,
-                general_feedback=feedback.general_feedback,
-                timestamp=feedback.timestamp
-            )
-            db.add(db_feedback)
-            db.commit()
-            
-            # Save to JSON with full structure
-            feedback_data = {
-                "attempt_id": feedback.attempt_id,
-                "scenario_id": feedback.scenario_id,
-                "timestamp": feedback.timestamp.isoformat(),
-                "overall_score": feedback.overall_score,
-                "general_feedback": feedback.general_feedback,
-                "detailed_scores": {
-                    "medical_accuracy": {
-                        "score": feedback.medical_accuracy.score,
-                        "explanation": feedback.medical_accuracy.explanation,
-                        "strengths": feedback.medical_accuracy.strengths,
-                        "improvements": feedback.medical_accuracy.improvements,
-                        "examples": feedback.medical_accuracy.examples or []
-                    },
-                    "communication_clarity": {
-                        "score": feedback.communication_clarity.score,
-                        "explanation": feedback.communication_clarity.explanation,
-                        "strengths": feedback.communication_clarity.strengths,
-                        "improvements": feedback.communication_clarity.improvements,
-                        "examples": feedback.communication_clarity.examples or []
-                    },
-                    "empathy_tone": {
-                        "score": feedback.empathy_tone.score,
-                        "explanation": feedback.empathy_tone.explanation,
-                        "strengths": feedback.empathy_tone.strengths,
-                        "improvements": feedback.empathy_tone.improvements,
-                        "examples": feedback.empathy_tone.examples or []
-                    },
-                    "completeness": {
-                        "score": feedback.completeness.score,
-                        "explanation": feedback.completeness.explanation,
-                        "strengths": feedback.completeness.strengths,
-                        "improvements": feedback.completeness.improvements,
-                        "examples": feedback.completeness.examples or []
-                    }
-                }
-            }
+            attempt = db.get(PracticeAttemptDB, feedback.attempt_id)
+            user_id = attempt.user_id if attempt is not None else None
+            # Built from the row so the attempt's JSON file need not be written yet
+            attempt_data = self._attempt_from_db(attempt).model_dump() if attempt is not None else None
+            db.add(self._feedback_to_db(feedback))
+            db.add_all(self.llm_usage.take_rows([(feedback.attempt_id, feedback.scenario_id, user_id)]))
+            summary_date = self._record_daily_summary(db, feedback)
+            with span("db_commit.save_feedback"):
+                db.commit()
             
-            # Save individual feedback JSON
-            json_path = os.path.join(
-                self.results_dir, 
-                "feedback", 
-                f"feedback_{feedback.attempt_id}.json"
-            )
-            self._save_to_json(feedback_data, json_path)
+            if user_id is not None:
+                self.feedback_index.add_feedback(user_id, feedback)
             
-            # Update daily summary
-            self._update_daily_summary(
-                feedback.attempt_id, 
-                feedback.scenario_id, 
-                feedback.overall_score
-            )
-            
-            # Also save a combined result file
-            combined_path = os.path.join(
-                self.results_dir,
-                f"complete_result_{feedback.attempt_id}.json"
-            )
-            
-            # Load the attempt data to create combined result
-            attempt_path = os.path.join(
-                self.results_dir, 
-                "attempts", 
-                f"{feedback.attempt_id}.json"
-            )
-            if os.path.exists(attempt_path):
-                with open(attempt_path, 'r') as f:
-                    attempt_data = json.load(f)
-                
-                combined_data = {
-                    "attempt": attempt_data,
-                    "feedback": feedback_data,
-                    "metadata": {
-                        "created_at": datetime.now().isoformat(),
-                        "version": "1.0"
-                    }
-                }
-                self._save_to_json(combined_data, combined_path)
+            self._save_feedback_json(feedback, self._feedback_to_json(feedback), attempt_data, summary_date)
             
             return True
         except Exception as e:
@@ -252,16 +395,7 @@ class StorageService:
         db = next(self.get_db())
         try:
             attempts = db.query(PracticeAttemptDB).order_by(PracticeAttemptDB.timestamp.desc()).limit(limit).all()
-            return [
-                PracticeAttempt(
-                    id=attempt.id,
-                    scenario_id=attempt.scenario_id,
-                    user_response=attempt.user_response,
-                    input_type=attempt.input_type,
-                    timestamp=attempt.timestamp,
-                    user_id=attempt.user_id
-                ) for attempt in attempts
-            ]
+            return [self._attempt_from_db(attempt) for attempt in attempts]
         finally:
             db.close()
     
@@ -273,41 +407,7 @@ class StorageService:
             if not feedback:
                 return None
             
-            return FeedbackAnalysis(
-                attempt_id=feedback.attempt_id,
-                scenario_id=feedback.scenario_id,
-                medical_accuracy=ScoreDetail(
-                    score=feedback.medical_accuracy_score,
-                    explanation=feedback.medical_accuracy_explanation,
-                    strengths=json.loads(feedback.medical_accuracy_strengths),
-                    improvements=json.loads(feedback.medical_accuracy_improvements),
-                    examples=json.loads(feedback.medical_accuracy_examples)
-                ),
-                communication_clarity=ScoreDetail(
-                    score=feedback.communication_clarity_score,
-                    explanation=feedback.communication_clarity_explanation,
-                    strengths=json.loads(feedback.communication_clarity_strengths),
-                    improvements=json.loads(feedback.communication_clarity_improvements),
-                    examples=json.loads(feedback.communication_clarity_examples)
-                ),
-                empathy_tone=ScoreDetail(
-                    score=feedback.empathy_tone_score,
-                    explanation=feedback.empathy_tone_explanation,
-                    strengths=json.loads(feedback.empathy_tone_strengths),
-                    improvements=json.loads(feedback.empathy_tone_improvements),
-                    examples=json.loads(feedback.empathy_tone_examples)
-                ),
-                completeness=ScoreDetail(
-                    score=feedback.completeness_score,
-                    explanation=feedback.completeness_explanation,
-                    strengths=json.loads(feedback.completeness_strengths),
-                    improvements=json.loads(feedback.completeness_improvements),
-                    examples=json.loads(feedback.completeness_examples)
-                ),
-                overall_score=feedback.overall_score,
-                general_feedback=feedback.general_feedback,
-                timestamp=feedback.timestamp
-            )
+            return self._feedback_from_db(feedback)
         finally:
             db.close()
     
@@ -316,113 +416,76 @@ class StorageService:
         db = next(self.get_db())
         try:
             feedbacks = db.query(FeedbackAnalysisDB).order_by(FeedbackAnalysisDB.timestamp.desc()).limit(limit).all()
-            result = []
-            for feedback in feedbacks:
-                result.append(FeedbackAnalysis(
-                    attempt_id=feedback.attempt_id,
-                    scenario_id=feedback.scenario_id,
-                    medical_accuracy=ScoreDetail(
-                        score=feedback.medical_accuracy_score,
-                        explanation=feedback.medical_accuracy_explanation,
-                        strengths=json.loads(feedback.medical_accuracy_strengths),
-                        improvements=json.loads(feedback.medical_accuracy_improvements),
-                        examples=json.loads(feedback.medical_accuracy_examples)
-                    ),
-                    communication_clarity=ScoreDetail(
-                        score=feedback.communication_clarity_score,
-                        explanation=feedback.communication_clarity_explanation,
-                        strengths=json.loads(feedback.communication_clarity_strengths),
-                        improvements=json.loads(feedback.communication_clarity_improvements),
-                        examples=json.loads(feedback.communication_clarity_examples)
-                    ),
-                    empathy_tone=ScoreDetail(
-                        score=feedback.empathy_tone_score,
-                        explanation=feedback.empathy_tone_explanation,
-                        strengths=json.loads(feedback.empathy_tone_strengths),
-                        improvements=json.loads(feedback.empathy_tone_improvements),
-                        examples=json.loads(feedback.empathy_tone_examples)
-                    ),
-                    completeness=ScoreDetail(
-                        score=feedback.completeness_score,
-                        explanation=feedback.completeness_explanation,
-                        strengths=json.loads(feedback.completeness_strengths),
-                        improvements=json.loads(feedback.completeness_improvements),
-                        examples=json.loads(feedback.completeness_examples)
-                    ),
-                    overall_score=feedback.overall_score,
-                    general_feedback=feedback.general_feedback,
-                    timestamp=feedback.timestamp
-                ))
-            return result
+            return [self._feedback_from_db(feedback) for feedback in feedbacks]
         finally:
             db.close()
 
-    def get_recent_feedback_for_user(self, user_id: str, limit: int = 3) -> List[str]:
-        """Retrieves the general feedback from the most recent attempts for a given user."""
+    def _keyset_page(self, query, timestamp_col, id_col, limit: int, cursor: Optional[str]):
+        """Apply (timestamp, id) keyset pagination, newest first. Returns (rows, next_cursor)."""
+        if cursor:
+            cursor_ts, cursor_id = decode_cursor(cursor)
+            query = query.filter(or_(
+                timestamp_col < cursor_ts,
+                and_(timestamp_col == cursor_ts, id_col < cursor_id)
+            ))
+        rows = query.order_by(timestamp_col.desc(), id_col.desc()).limit(limit + 1).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+        return rows, next_cursor
+
+    def get_feedback_page(self, limit: int = 50, cursor: Optional[str] = None,
+                          filters: Optional[ResultFilters] = None) -> Tuple[List[FeedbackAnalysis], Optional[str]]:
+        """Get a page of feedback matching the filters, newest first"""
+        filters = filters or ResultFilters()
         db = next(self.get_db())
         try:
-            recent_attempts = db.query(PracticeAttemptDB.id).filter(
-                PracticeAttemptDB.user_id == user_id
-            ).order_by(PracticeAttemptDB.timestamp.desc()).limit(limit).all()
-
-            if not recent_attempts:
-                return []
+            query = filter_feedback_query(db.query(FeedbackAnalysisDB), filters)
             
-            attempt_ids = [attempt.id for attempt in recent_attempts]
-            feedbacks = db.query(FeedbackAnalysisDB.general_feedback).filter(
-                FeedbackAnalysisDB.attempt_id.in_(attempt_ids)
-            ).all()
-
-            return [fb.general_feedback for fb in feedbacks]
-        except Exception as e:
-            print(f"Error retrieving past feedback for user {user_id}: {e}")
-            return []
+            rows, next_cursor = self._keyset_page(
+                query, FeedbackAnalysisDB.timestamp, FeedbackAnalysisDB.id, limit, cursor
+            )
+            return [self._feedback_from_db(row) for row in rows], next_cursor
         finally:
             db.close()
-    
-    def export_all_results_to_csv(self) -> str:
-        """Export all results to a CSV file"""
-        import csv
-        from datetime import datetime
-        
+
+    def get_attempts_page(self, limit: int = 50, cursor: Optional[str] = None,
+                          filters: Optional[ResultFilters] = None) -> Tuple[List[PracticeAttempt], Optional[str]]:
+        """Get a page of attempts matching the filters, newest first"""
+        filters = filters or ResultFilters()
         db = next(self.get_db())
         try:
-            # Get all feedback with attempts
-            feedbacks = db.query(FeedbackAnalysisDB).all()
+            query = db.query(PracticeAttemptDB)
+            if filters.user_id is not None:
+                query = query.filter(PracticeAttemptDB.user_id == filters.user_id)
+            if filters.scenario_id is not None:
+                query = query.filter(PracticeAttemptDB.scenario_id == filters.scenario_id)
+            if filters.start is not None:
+                query = query.filter(PracticeAttemptDB.timestamp >= filters.start)
+            if filters.end is not None:
+                query = query.filter(PracticeAttemptDB.timestamp < filters.end)
+            if filters.has_score_range:
+                query = query.join(FeedbackAnalysisDB, FeedbackAnalysisDB.attempt_id == PracticeAttemptDB.id)
+                if filters.min_score is not None:
+                    query = query.filter(FeedbackAnalysisDB.overall_score >= filters.min_score)
+                if filters.max_score is not None:
+                    query = query.filter(FeedbackAnalysisDB.overall_score <= filters.max_score)
             
-            # Create CSV file
-            csv_path = os.path.join(
-                self.results_dir,
-                f"export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            rows, next_cursor = self._keyset_page(
+                query, PracticeAttemptDB.timestamp, PracticeAttemptDB.id, limit, cursor
             )
-            
-            with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = [
-                    'attempt_id', 'scenario_id', 'timestamp', 'overall_score',
-                    'medical_accuracy_score', 'communication_clarity_score',
-                    'empathy_tone_score', 'completeness_score', 'user_id'
-                ]
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                
-                for feedback in feedbacks:
-                    # Get the attempt to get user_id
-                    attempt = db.query(PracticeAttemptDB).filter(
-                        PracticeAttemptDB.id == feedback.attempt_id
-                    ).first()
-                    
-                    writer.writerow({
-                        'attempt_id': feedback.attempt_id,
-                        'scenario_id': feedback.scenario_id,
-                        'timestamp': feedback.timestamp,
-                        'overall_score': feedback.overall_score,
-                        'medical_accuracy_score': feedback.medical_accuracy_score,
-                        'communication_clarity_score': feedback.communication_clarity_score,
-                        'empathy_tone_score': feedback.empathy_tone_score,
-                        'completeness_score': feedback.completeness_score,
-                        'user_id': attempt.user_id if attempt else 'unknown'
-                    })
-            
-            return csv_path
+            return [self._attempt_from_db(row) for row in rows], next_cursor
         finally:
-            db.close()
\ No newline at end of file
+            db.close()
+
+    def export_all_results_to_csv(self) -> str:
+        """Export all results to a CSV file"""
+        from services.export_service import ResultsExporter
+        
+        csv_path = os.path.join(
+            self.results_dir,
+            f"export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        )
+        ResultsExporter(self.SessionLocal).export_to_file(csv_path, "csv")
+        return csv_path
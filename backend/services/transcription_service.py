@@ -1,56 +1,294 @@
+import array
+import asyncio
 import base64
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import wave
+from typing import List, Optional, Tuple
 from fastapi import UploadFile
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage
 from core.config import settings
+from core.metrics import span
+from core.models import LLMCall
+from services.llm_cache import LLMResponseCache, create_transcript_cache
+from services.llm_calls import LLMCallPolicy
+from services.llm_scheduler import LLMOverloadedError
+from services.llm_usage_service import LLMUsageRecorder
+
+TRANSCRIPTION_PROMPT = "Transcribe this audio recording of a person speaking. Provide only the text content of the speech."
+SPOOL_READ_SIZE = 1024 * 1024
+# Length of the windows whose loudness is compared against the silence threshold
+LEVEL_WINDOW_SECONDS = 0.03
+
+# array typecodes for the PCM sample widths that can be scanned for silence
+_SAMPLE_TYPES = {1: "B", 2: "h", 4: "i"}
+
+
+class AudioTooLargeError(ValueError):
+    """The upload is larger than settings.max_upload_bytes"""
+
+
+def _window_level(frames: bytes, sample_width: int) -> float:
+    """Mean absolute amplitude of a window of PCM frames, as a fraction of full scale"""
+    samples = array.array(_SAMPLE_TYPES[sample_width], frames)
+    if not samples:
+        return 0.0
+    if sample_width == 1:
+        # 8-bit WAV is unsigned, centred on 128
+        return sum(abs(s - 128) for s in samples) / len(samples) / 128
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return sum(map(abs, samples)) / len(samples) / (1 << (8 * sample_width - 1))
+
+
+def plan_chunks(path: str, chunk_seconds: float, max_chunk_seconds: float,
+                silence_threshold: float, min_silence_ms: int) -> List[Tuple[int, int]]:
+    """
+    Split a PCM WAV file into (start_frame, end_frame) ranges.
+
+    A chunk ends in the middle of the first pause of at least min_silence_ms
+    once it is chunk_seconds long, or at max_chunk_seconds if nobody pauses.
+    The file is scanned one short window at a time. Raises wave.Error for
+    files that are not PCM WAV.
+    """
+    with wave.open(path, 'rb') as reader:
+        framerate = reader.getframerate()
+        sample_width = reader.getsampwidth()
+        total_frames = reader.getnframes()
+        target = int(chunk_seconds * framerate)
+        maximum = max(int(max_chunk_seconds * framerate), target, 1)
+        if sample_width not in _SAMPLE_TYPES or total_frames <= maximum:
+            return [(0, total_frames)] if total_frames else []
+
+        window = max(int(LEVEL_WINDOW_SECONDS * framerate), 1)
+        min_silent_windows = max(int(min_silence_ms / 1000 / LEVEL_WINDOW_SECONDS), 1)
+        chunks = []
+        start = position = silent_windows = 0
+        while True:
+            frames = reader.readframes(window)
+            if not frames:
+                break
+            position += len(frames) // (sample_width * reader.getnchannels())
+            if _window_level(frames, sample_width) < silence_threshold:
+                silent_windows += 1
+            else:
+                silent_windows = 0
+
+            if position - start >= target and silent_windows >= min_silent_windows:
+                cut = position - (silent_windows * window) // 2
+                chunks.append((start, cut))
+                start, silent_windows = cut, 0
+            elif position - start >= maximum:
+                chunks.append((start, position))
+                start, silent_windows = position, 0
+        if position > start:
+            chunks.append((start, position))
+        return chunks
+
+
+def read_wav_chunk(path: str, start: int, end: int) -> bytes:
+    """A standalone WAV file holding frames [start, end) of path"""
+    with wave.open(path, 'rb') as reader:
+        reader.setpos(start)
+        frames = reader.readframes(end - start)
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as writer:
+            writer.setparams(reader.getparams())
+            writer.writeframes(frames)
+    return buffer.getvalue()
+
 
 class TranscriptionService:
     """
     A service to handle audio transcription.
+
+    Uploads are spooled to a temporary file, split into bounded chunks at
+    pauses in the speech and transcribed concurrently, so memory use depends
+    on the chunk size and concurrency rather than on the recording length.
+    Transcripts are cached by a BLAKE2 hash of the audio computed while
+    spooling, so re-sent recordings are not transcribed again.
     """
 
-    def __init__(self):
-        self.client = ChatOpenAI(
+    def __init__(self, client: Optional[ChatOpenAI] = None, transcript_cache: Optional[LLMResponseCache] = None,
+                 usage_recorder: Optional[LLMUsageRecorder] = None, call_policy: Optional[LLMCallPolicy] = None):
+        self.client = client or ChatOpenAI(
             model=settings.llm_model,
             api_key=settings.gemini_api_key,
             base_url=settings.gemini_base_url
         )
+        self.transcript_cache = transcript_cache or create_transcript_cache()
+        # Token usage of each chunk is recorded here when given (the app passes StorageService's recorder)
+        self.usage_recorder = usage_recorder
+        # Admission control, timeouts and retries shared with the analysis calls (the app passes the container's)
+        self.llm_calls = call_policy or LLMCallPolicy()
+
+    def _model_name(self) -> str:
+        return getattr(self.client, "model_name", None) or settings.llm_model
+
+    async def spool_upload(self, audio_file: UploadFile) -> Tuple[str, str]:
+        """Copy an upload to a temporary file in fixed-size reads. Returns its path and BLAKE2 digest."""
+        max_bytes = settings.max_upload_bytes
+        spool = tempfile.NamedTemporaryFile(
+            prefix="upload_", suffix=".wav", dir=settings.upload_spool_dir, delete=False
+        )
+        digest = hashlib.blake2b(digest_size=32)
+        size = 0
+        try:
+            with spool:
+                while True:
+                    data = await audio_file.read(SPOOL_READ_SIZE)
+                    if not data:
+                        break
+                    size += len(data)
+                    if size > max_bytes:
+                        raise AudioTooLargeError(f"Audio upload exceeds the {max_bytes} byte limit")
+                    digest.update(data)
+                    await asyncio.to_thread(spool.write, data)
+        except BaseException:
+            os.remove(spool.name)
+            raise
+        return spool.name, digest.hexdigest()
+
+    def _transcript_cache_key(self, audio_digest: str) -> str:
+        return self.transcript_cache.make_key(
+            kind="transcript",
+            model=self._model_name(),
+            prompt=TRANSCRIPTION_PROMPT,
+            audio_blake2b=audio_digest
+        )
+
+    async def transcribe_upload(self, audio_file: UploadFile, attempt_id: Optional[str] = None) -> Tuple[str, bool]:
+        """
+        Transcribe an upload, reusing the transcript of identical audio.
+
+        LLM usage is recorded against attempt_id, if given.
+
+        Returns:
+            The transcribed text and whether it came from the cache.
+
+        Raises:
+            AudioTooLargeError: The upload exceeds settings.max_upload_bytes.
+            LLMOverloadedError: The transcription calls were not admitted by the scheduler.
+        """
+        with span("upload_spool"):
+            path, audio_digest = await self.spool_upload(audio_file)
+        try:
+            with span("transcription") as timing:
+                cache = self.transcript_cache
+                key = self._transcript_cache_key(audio_digest)
+                cached = await asyncio.to_thread(cache.get, key) if cache.enabled else None
+                if cached:
+                    timing.outcome = "hit"
+                    if self.usage_recorder is not None:
+                        self.usage_recorder.record(
+                            LLMCall(stage="transcription", model=self._model_name(), cached=True), attempt_id
+                        )
+                    print(f"Transcript cache hit for audio {audio_digest[:12]}")
+                    return cached, True
+
+                timing.outcome = "miss" if cache.enabled else "ok"
+                transcribed_text = await self.transcribe_file(path, attempt_id)
+                if transcribed_text and cache.enabled:
+                    # Failed transcriptions come back empty and are not cached
+                    await asyncio.to_thread(cache.set, key, transcribed_text)
+                return transcribed_text, False
+        finally:
+            os.remove(path)
 
     async def transcribe_audio(self, audio_file: UploadFile) -> str:
         """
         Transcribes an audio file to text using a multimodal model via LangChain.
-        
+
         Args:
             audio_file: The audio file uploaded from the frontend.
-            
+
         Returns:
             The transcribed text as a string.
+
+        Raises:
+            AudioTooLargeError: The upload exceeds settings.max_upload_bytes.
         """
+        transcribed_text, _ = await self.transcribe_upload(audio_file)
+        return transcribed_text
+
+    async def transcribe_file(self, path: str, attempt_id: Optional[str] = None) -> str:
+        """Transcribe an audio file on disk chunk by chunk and join the text in order"""
         try:
-            audio_bytes = await audio_file.read()
-            base64_audio = base64.b64encode(audio_bytes).decode('utf-8')
-            audio_url = f"data:audio/wav;base64,{base64_audio}"
-
-            message = HumanMessage(
-                content=[
-                    {
-                        "type": "text",
-                        "text": "Transcribe this audio recording of a person speaking. Provide only the text content of the speech.",
-                    },
-                    {
-                        "type": "image_url", 
-                        "image_url": {
-                            "url": audio_url
-                        }
-                    },
-                ]
-            )
-
-            response = self.client.invoke([message])
-            transcribed_text = response.content
+            try:
+                chunks = await asyncio.to_thread(
+                    plan_chunks, path,
+                    settings.transcription_chunk_seconds,
+                    settings.transcription_max_chunk_seconds,
+                    settings.transcription_silence_threshold,
+                    settings.transcription_min_silence_ms
+                )
+            except (wave.Error, EOFError):
+                # Not PCM WAV, so it cannot be split; the upload limit bounds its size
+                chunks = None
+
+            if chunks is None:
+                with span("transcription_chunk"), open(path, 'rb') as f:
+                    transcribed_text = await self._transcribe_bytes(f.read(), attempt_id)
+            else:
+                semaphore = asyncio.Semaphore(settings.transcription_concurrency)
+
+                async def transcribe_chunk(start: int, end: int) -> str:
+                    # Read inside the semaphore so only `concurrency` chunks are in memory at once
+                    async with semaphore:
+                        with span("transcription_chunk"):
+                            audio_bytes = await asyncio.to_thread(read_wav_chunk, path, start, end)
+                            return await self._transcribe_bytes(audio_bytes, attempt_id)
+
+                tasks = [asyncio.create_task(transcribe_chunk(start, end)) for start, end in chunks]
+                try:
+                    parts = await asyncio.gather(*tasks)
+                except BaseException:
+                    # One chunk failed (or the request went away): stop the rest so they
+                    # give back their scheduler slots instead of finishing for nothing
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                    raise
+                transcribed_text = " ".join(part.strip() for part in parts if part and part.strip())
+                if len(chunks) > 1:
+                    print(f"Transcribed {len(chunks)} audio chunks")
+
             print(f"Transcription result: {transcribed_text}")
             return transcribed_text
 
+        except LLMOverloadedError:
+            raise
         except Exception as e:
             print(f"Error during audio transcription with LangChain: {e}")
-            return ""
\ No newline at end of file
+            return ""
+
+    async def _transcribe_bytes(self, audio_bytes: bytes, attempt_id: Optional[str] = None) -> str:
+        audio_url = f"data:audio/wav;base64,{base64.b64encode(audio_bytes).decode('utf-8')}"
+
+        message = HumanMessage(
+            content=[
+                {
+                    "type": "text",
+                    "text": TRANSCRIPTION_PROMPT,
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": audio_url
+                    }
+                },
+            ]
+        )
+
+        if self.usage_recorder is None:
+            response = await self.llm_calls.arun("transcription", lambda: self.client.ainvoke([message]))
+        else:
+            with self.usage_recorder.track("transcription", self._model_name(), attempt_id) as usage:
+                response = await self.llm_calls.arun(
+                    "transcription", lambda: self.client.ainvoke([message], usage.config())
+                )
+        return response.content
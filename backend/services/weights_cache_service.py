@@ -0,0 +1,211 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from core.config import settings
+from core.models import ScenarioWeights, ScenarioWeightsDB
+
+
+class ScenarioWeightsCache:
+    """
+    Scenario weights cache shared across workers through the database.
+
+    Weights are kept in a per-process dict in front of the
+    `scenario_weights_cache` table. Entries in the dict are trusted for
+    weights_cache_memory_ttl_seconds, after which the table is read again, so
+    an invalidation made by another process is seen within that time.
+    Concurrent misses for the same key are
+    coalesced into a single generation call: within a process through
+    in-flight tasks/locks, and across processes through a short lease row
+    that other workers wait on until the weights are written.
+    """
+
+    POLL_INTERVAL = 0.2
+
+    def __init__(self, session_factory):
+        self.SessionLocal = session_factory
+        self.lease_seconds = settings.weights_cache_lease_seconds
+        self.memory_ttl = settings.weights_cache_memory_ttl_seconds
+        # cache_key -> (weights, monotonic time they were read or written)
+        self._memory: Dict[str, Tuple[ScenarioWeights, float]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _cached(self, cache_key: str) -> Optional[ScenarioWeights]:
+        """Weights from the per-process dict, unless they are older than the TTL"""
+        entry = self._memory.get(cache_key)
+        if entry is None:
+            return None
+        weights, stored_at = entry
+        if time.monotonic() - stored_at >= self.memory_ttl:
+            self._memory.pop(cache_key, None)
+            return None
+        return weights
+
+    def get(self, cache_key: str) -> Optional[ScenarioWeights]:
+        """Get cached weights from memory or the shared table"""
+        weights = self._cached(cache_key)
+        if weights:
+            return weights
+        weights, _ = self._load(cache_key)
+        return weights
+
+    def _load(self, cache_key: str) -> Tuple[Optional[ScenarioWeights], bool]:
+        """Return (weights, lease_active) for a key from the database"""
+        db = self.SessionLocal()
+        try:
+            row = db.get(ScenarioWeightsDB, cache_key)
+            if not row:
+                return None, False
+            if row.weights:
+                weights = ScenarioWeights.model_validate_json(row.weights)
+                self._memory[cache_key] = (weights, time.monotonic())
+                return weights, False
+            return None, bool(row.lease_expires_at and row.lease_expires_at > datetime.now())
+        finally:
+            db.close()
+
+    def _try_acquire_lease(self, cache_key: str) -> bool:
+        """Claim the right to generate weights for a key across all workers"""
+        now = datetime.now()
+        expires = now + timedelta(seconds=self.lease_seconds)
+        db = self.SessionLocal()
+        try:
+            db.add(ScenarioWeightsDB(cache_key=cache_key, lease_expires_at=expires, updated_at=now))
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            # The row exists: take it over only if its lease has lapsed
+            claimed = db.query(ScenarioWeightsDB).filter(
+                ScenarioWeightsDB.cache_key == cache_key,
+                ScenarioWeightsDB.weights.is_(None),
+                or_(ScenarioWeightsDB.lease_expires_at.is_(None),
+                    ScenarioWeightsDB.lease_expires_at < now)
+            ).update({"lease_expires_at": expires, "updated_at": now}, synchronize_session=False)
+            db.commit()
+            return claimed == 1
+        finally:
+            db.close()
+
+    def _release_lease(self, cache_key: str):
+        """Drop an unfinished lease so another worker can retry generation"""
+        db = self.SessionLocal()
+        try:
+            db.query(ScenarioWeightsDB).filter(
+                ScenarioWeightsDB.cache_key == cache_key,
+                ScenarioWeightsDB.weights.is_(None)
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def set(self, cache_key: str, weights: ScenarioWeights):
+        """Store weights in memory and in the shared table"""
+        self._memory[cache_key] = (weights, time.monotonic())
+        db = self.SessionLocal()
+        try:
+            db.merge(ScenarioWeightsDB(
+                cache_key=cache_key,
+                weights=weights.model_dump_json(),
+                lease_expires_at=None,
+                updated_at=datetime.now()
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+    def invalidate(self, cache_key: Optional[str] = None) -> int:
+        """Remove one key, or every key when none is given. Returns rows deleted."""
+        db = self.SessionLocal()
+        try:
+            query = db.query(ScenarioWeightsDB)
+            if cache_key is not None:
+                query = query.filter(ScenarioWeightsDB.cache_key == cache_key)
+                self._memory.pop(cache_key, None)
+            else:
+                self._memory.clear()
+            deleted = query.delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    def _key_lock(self, cache_key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._key_locks.setdefault(cache_key, threading.Lock())
+
+    def get_or_create(self, cache_key: str, factory: Callable[[], ScenarioWeights]) -> ScenarioWeights:
+        """Return cached weights, calling factory at most once across concurrent callers"""
+        weights = self._cached(cache_key)
+        if weights:
+            return weights
+
+        with self._key_lock(cache_key):
+            deadline = time.monotonic() + self.lease_seconds
+            while True:
+                weights, lease_active = self._load(cache_key)
+                if weights:
+                    return weights
+                if not lease_active and self._try_acquire_lease(cache_key):
+                    break
+                if time.monotonic() > deadline:
+                    # The other worker is taking too long; generate locally
+                    break
+                time.sleep(self.POLL_INTERVAL)
+
+            try:
+                weights = factory()
+            except Exception:
+                self._release_lease(cache_key)
+                raise
+            self.set(cache_key, weights)
+            return weights
+
+    async def aget_or_create(self, cache_key: str,
+                             factory: Callable[[], Awaitable[ScenarioWeights]]) -> ScenarioWeights:
+        """Async variant of get_or_create; DB access runs in a worker thread"""
+        weights = self._cached(cache_key)
+        if weights:
+            return weights
+
+        # The resolution runs as its own task, so a caller that is cancelled
+        # only stops waiting; the others coalesced on the key still get the result
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(self._aresolve(cache_key, factory))
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda done: self._forget(cache_key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, cache_key: str, task: asyncio.Task):
+        if self._inflight.get(cache_key) is task:
+            del self._inflight[cache_key]
+        if not task.cancelled():
+            # Mark a failure as retrieved when every caller was cancelled
+            task.exception()
+
+    async def _aresolve(self, cache_key: str,
+                        factory: Callable[[], Awaitable[ScenarioWeights]]) -> ScenarioWeights:
+        deadline = time.monotonic() + self.lease_seconds
+        while True:
+            weights, lease_active = await asyncio.to_thread(self._load, cache_key)
+            if weights:
+                return weights
+            if not lease_active and await asyncio.to_thread(self._try_acquire_lease, cache_key):
+                break
+            if time.monotonic() > deadline:
+                break
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+        try:
+            weights = await factory()
+        except BaseException:
+            await asyncio.to_thread(self._release_lease, cache_key)
+            raise
+        await asyncio.to_thread(self.set, cache_key, weights)
+        return weights
@@ -71,7 +71,16 @@ class ResultsViewer:
             return {"error": "No summary for today"}
         
         with open(summary_path, 'r') as f:
-            return json.load(f)
+            summary = json.load(f)
+        
+        # Newer summaries keep only aggregates; the attempts live in an append-only log
+        if "attempts" not in summary:
+            summary["attempts"] = []
+            log_path = os.path.join(self.results_dir, "daily_summaries", f"attempts_{today}.jsonl")
+            if os.path.exists(log_path):
+                with open(log_path, 'r') as f:
+                    summary["attempts"] = [json.loads(line) for line in f if line.strip()]
+        return summary
     
     def print_result_summary(self, result: Dict):
         """Pretty print a result summary"""
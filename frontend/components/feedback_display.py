@@ -3,6 +3,50 @@ from typing import Dict, Any
 import plotly.graph_objects as go
 import plotly.express as px
 
+CATEGORY_LABELS = [
+    ('medical_accuracy', 'Medical Accuracy'),
+    ('communication_clarity', 'Communication Clarity'),
+    ('empathy_tone', 'Empathy & Tone'),
+    ('completeness', 'Completeness')
+]
+
+def _display_category(category_name: str, category_data: Dict[str, Any], expanded: bool = False):
+    """Expander with the explanation, strengths, improvements and examples of one category"""
+    with st.expander(f"📊 {category_name} - {category_data.get('score', 0):.1f}/10", expanded=expanded):
+        
+        # Explanation
+        st.markdown("**Analysis:**")
+        st.write(category_data.get('explanation', 'No explanation available'))
+        
+        # Strengths
+        strengths = category_data.get('strengths', [])
+        if strengths:
+            st.markdown("**✅ Strengths:**")
+            for strength in strengths:
+                st.write(f"• {strength}")
+        
+        # Areas for improvement
+        improvements = category_data.get('improvements', [])
+        if improvements:
+            st.markdown("**🎯 Areas for Improvement:**")
+            for improvement in improvements:
+                st.write(f"• {improvement}")
+        
+        # Examples
+        examples = category_data.get('examples', [])
+        if examples:
+            st.markdown("**💡 Examples:**")
+            for example in examples:
+                st.write(f"• {example}")
+
+def display_partial_feedback(partial: Dict[str, Any]):
+    """Display the categories that have arrived so far while the analysis streams in"""
+    for key, category_name in CATEGORY_LABELS:
+        if key in partial:
+            _display_category(category_name, partial[key], expanded=True)
+        else:
+            st.info(f"⏳ {category_name}: analyzing...")
+
 def display_feedback(feedback: Dict[str, Any]):
     """Display AI feedback analysis"""
     if not feedback:
@@ -52,40 +96,8 @@ def display_feedback(feedback: Dict[str, Any]):
     st.plotly_chart(fig, use_container_width=True)
     
     # Detailed feedback for each category
-    categories_data = [
-        ('Medical Accuracy', feedback.get('medical_accuracy', {})),
-        ('Communication Clarity', feedback.get('communication_clarity', {})),
-        ('Empathy & Tone', feedback.get('empathy_tone', {})),
-        ('Completeness', feedback.get('completeness', {}))
-    ]
-    
-    for category_name, category_data in categories_data:
-        with st.expander(f"📊 {category_name} - {category_data.get('score', 0):.1f}/10"):
-            
-            # Explanation
-            st.markdown("**Analysis:**")
-            st.write(category_data.get('explanation', 'No explanation available'))
-            
-            # Strengths
-            strengths = category_data.get('strengths', [])
-            if strengths:
-                st.markdown("**✅ Strengths:**")
-                for strength in strengths:
-                    st.write(f"• {strength}")
-            
-            # Areas for improvement
-            improvements = category_data.get('improvements', [])
-            if improvements:
-                st.markdown("**🎯 Areas for Improvement:**")
-                for improvement in improvements:
-                    st.write(f"• {improvement}")
-            
-            # Examples
-            examples = category_data.get('examples', [])
-            if examples:
-                st.markdown("**💡 Examples:**")
-                for example in examples:
-                    st.write(f"• {example}")
+    for key, category_name in CATEGORY_LABELS:
+        _display_category(category_name, feedback.get(key, {}))
     
     # General feedback
     general_feedback = feedback.get('general_feedback', '')
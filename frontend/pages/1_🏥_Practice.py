@@ -2,7 +2,7 @@ import streamlit as st
 from datetime import datetime
 from utils.api_client import APIClient
 from components.scenario_display import display_scenario
-from components.feedback_display import display_feedback
+from components.feedback_display import display_feedback, display_partial_feedback
 from streamlit_mic_recorder import mic_recorder
 
 st.title("🏥 Practice Healthcare Communication")
@@ -76,13 +76,25 @@ if not st.session_state.feedback:
             st.toast("Please type something before submitting")
             st.stop()
         st.session_state.is_submitting = True
+        st.markdown("### 📊 AI Feedback Analysis")
+        progress = st.empty()
+        partial = {}
+        feedback = None
         with st.spinner("🤖 AI is analyzing your response..."):
-            feedback = api.submit_practice(
+            # Show each category as soon as its specialist finishes
+            for event, data in api.submit_practice_stream(
                 scenario_id=scenario_id,
                 user_response=user_response_text,
-                user_id="default_user",
-                input_type="text"
-            )
+                user_id="default_user"
+            ):
+                if event == "feedback":
+                    feedback = data
+                elif event == "error":
+                    st.error(data.get("detail", "Analysis failed"))
+                else:
+                    partial.update(data)
+                    with progress.container():
+                        display_partial_feedback(partial)
             st.session_state.feedback = feedback
         st.session_state.is_submitting = False
         st.rerun()
@@ -9,11 +9,12 @@ st.title("📊 Progress & Results")
 
 api = APIClient()
 
-# Get data
-feedback_data = api.get_all_feedback()
-attempts_data = api.get_all_attempts()
+# Get data: aggregates are computed by the backend, only a few recent items are downloaded
+analytics = api.get_analytics()
+feedback_data = api.get_all_feedback(limit=20)
+attempts_data = api.get_all_attempts(limit=20)
 
-if not feedback_data:
+if not analytics or not analytics['total_attempts'] or not feedback_data:
     st.info("No practice data available yet. Complete some practice scenarios to see your progress here!")
     st.stop()
 
@@ -23,46 +24,48 @@ df_attempts = pd.DataFrame(attempts_data)
 
 # Parse timestamps
 df_feedback['timestamp'] = pd.to_datetime(df_feedback['timestamp'])
-df_attempts['timestamp'] = pd.to_datetime(df_attempts['timestamp'])
+if len(df_attempts) > 0:
+    df_attempts['timestamp'] = pd.to_datetime(df_attempts['timestamp'])
 
 # Overview metrics
 st.markdown("### 📈 Overview")
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    total_attempts = len(df_attempts)
+    total_attempts = analytics['total_attempts']
     st.metric("Total Attempts", total_attempts)
 
 with col2:
-    avg_score = df_feedback['overall_score'].mean()
+    avg_score = analytics['overall']['average'] or 0
     st.metric("Average Score", f"{avg_score:.1f}")
 
 with col3:
-    recent_attempts = len(
-        df_attempts[df_attempts['timestamp'] > datetime.now() - timedelta(days=7)])
+    recent_attempts = analytics['attempts_last_7_days']
     st.metric("This Week", recent_attempts)
 
 with col4:
-    best_score = df_feedback['overall_score'].max()
+    best_score = analytics['overall']['maximum'] or 0
     st.metric("Best Score", f"{best_score:.1f}")
 
 st.markdown("---")
 
 # Progress over time
 st.markdown("### 📈 Progress Over Time")
-if len(df_feedback) > 1:
+trend = pd.DataFrame(analytics['trend'])
+if len(trend) > 1:
     fig_progress = px.line(
-        df_feedback.sort_values('timestamp'),
-        x='timestamp',
-        y='overall_score',
-        title='Overall Score Progression',
-        labels={'overall_score': 'Score', 'timestamp': 'Date'}
+        trend,
+        x='period',
+        y='average_score',
+        title='Average Score Progression',
+        labels={'average_score': 'Average Score', 'period': 'Date'},
+        hover_data=['attempts']
     )
     fig_progress.update_traces(mode='markers+lines')
     fig_progress.update_layout(showlegend=False)
     st.plotly_chart(fig_progress, use_container_width=True)
 else:
-    st.info("Complete more attempts to see progress trends.")
+    st.info("Practice on more days to see progress trends.")
 
 # Score breakdown
 st.markdown("### 🎯 Performance Breakdown")
@@ -72,12 +75,7 @@ with col1:
     # Average scores by category
     categories = ['medical_accuracy', 'communication_clarity',
                   'empathy_tone', 'completeness']
-    avg_scores = []
-
-    for category in categories:
-        scores = [item['score']
-                  for item in df_feedback[category] if isinstance(item, dict)]
-        avg_scores.append(sum(scores) / len(scores) if scores else 0)
+    avg_scores = [analytics['categories'][category]['average'] or 0 for category in categories]
 
     category_names = ['Medical Accuracy',
                       'Communication Clarity', 'Empathy & Tone', 'Completeness']
@@ -95,12 +93,13 @@ with col1:
 
 with col2:
     # Score distribution
-    fig_dist = px.histogram(
-        df_feedback,
-        x='overall_score',
-        nbins=10,
+    histogram = pd.DataFrame(analytics['histogram'])
+    fig_dist = px.bar(
+        histogram,
+        x='lower',
+        y='count',
         title='Score Distribution',
-        labels={'overall_score': 'Overall Score', 'count': 'Frequency'}
+        labels={'lower': 'Overall Score', 'count': 'Frequency'}
     )
     st.plotly_chart(fig_dist, use_container_width=True)
 
@@ -151,7 +150,7 @@ if len(df_feedback) > 0:
                                    == attempt_id].iloc[0]
 
         # Find the attempt data
-        attempt_row = df_attempts[df_attempts['id'] == attempt_id]
+        attempt_row = df_attempts[df_attempts['id'] == attempt_id] if len(df_attempts) > 0 else df_attempts
 
         if len(attempt_row) > 0:
             attempt_row = attempt_row.iloc[0]
@@ -192,10 +191,8 @@ with st.sidebar:
             f"**Focus Area:**\n{worst_category[0]} ({worst_category[1]:.1f})")
 
         # Progress indicator
-        if len(df_feedback) >= 2:
-            recent_avg = df_feedback.head(5)['overall_score'].mean()
-            older_avg = df_feedback.tail(5)['overall_score'].mean()
-            improvement = recent_avg - older_avg
+        if analytics['total_attempts'] >= 2:
+            improvement = analytics['recent_average'] - analytics['earlier_average']
 
             if improvement > 2:
                 st.success(f"📈 Improving! (+{improvement:.1f} points)")
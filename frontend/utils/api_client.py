@@ -1,16 +1,22 @@
+import json
+import time
 import requests
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import streamlit as st
 
 class APIClient:
-    def __init__(self, base_url: str = "http://localhost:8000"):
+    def __init__(self, base_url: str = "http://localhost:8000", timeout: float = 30.0,
+                 analysis_timeout: float = 180.0):
         self.base_url = base_url
         self.api_v1 = f"{base_url}/api/v1"
+        # (connect, read) timeouts; analysis calls wait on the LLM and get a longer read timeout
+        self.timeout = (5, timeout)
+        self.analysis_timeout = (5, analysis_timeout)
     
     def get_scenarios(self) -> List[Dict[str, Any]]:
         """Get all available scenarios"""
         try:
-            response = requests.get(f"{self.api_v1}/scenarios/")
+            response = requests.get(f"{self.api_v1}/scenarios/", timeout=self.timeout)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -20,7 +26,7 @@ class APIClient:
     def get_scenario(self, scenario_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific scenario"""
         try:
-            response = requests.get(f"{self.api_v1}/scenarios/{scenario_id}")
+            response = requests.get(f"{self.api_v1}/scenarios/{scenario_id}", timeout=self.timeout)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -36,32 +42,132 @@ class APIClient:
                 "input_type": input_type,
                 "user_id": user_id
             }
-            response = requests.post(f"{self.api_v1}/practice/submit", json=data)
+            response = requests.post(f"{self.api_v1}/practice/submit", json=data, timeout=self.analysis_timeout)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             st.error(f"Error submitting practice: {e}")
             return None
     
-    def get_all_feedback(self, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get all feedback results"""
+    def submit_practice_stream(self, scenario_id: str, user_response: str,
+                               user_id: str = "default_user") -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Submit a practice attempt and yield (event, data) pairs as the analysis streams in.
+
+        Events: medical_accuracy, communication (partial feedback keyed like the
+        final result), feedback (the complete result) and error.
+        """
+        data = {"scenario_id": scenario_id, "user_response": user_response, "user_id": user_id}
+        try:
+            with requests.post(f"{self.api_v1}/practice/submit_stream", json=data,
+                               stream=True, timeout=self.analysis_timeout) as response:
+                response.raise_for_status()
+                event = "message"
+                for line in response.iter_lines(decode_unicode=True):
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                    elif line.startswith("data:"):
+                        yield event, json.loads(line[len("data:"):])
+                        event = "message"
+        except requests.exceptions.RequestException as e:
+            st.error(f"Error submitting practice: {e}")
+    
+    def submit_practice_job(self, scenario_id: str, user_response: str, user_id: str = "default_user",
+                            callback_url: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Queue a practice attempt for analysis; returns the job (poll it with get_job)"""
+        try:
+            data = {"scenario_id": scenario_id, "user_response": user_response, "user_id": user_id}
+            if callback_url:
+                data["callback_url"] = callback_url
+            response = requests.post(f"{self.api_v1}/practice/jobs", json=data, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            st.error(f"Error submitting practice: {e}")
+            return None
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get the status of an analysis job (with feedback once it has succeeded)"""
         try:
-            response = requests.get(f"{self.api_v1}/results/feedback?limit={limit}")
+            response = requests.get(f"{self.api_v1}/practice/jobs/{job_id}", timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            st.error(f"Error fetching job: {e}")
+            return None
+    
+    def wait_for_job(self, job_id: str, poll_interval: float = 1.0) -> Optional[Dict[str, Any]]:
+        """Poll a job until it finishes or analysis_timeout passes. Returns the feedback."""
+        deadline = time.monotonic() + self.analysis_timeout[1]
+        while time.monotonic() < deadline:
+            job = self.get_job(job_id)
+            if job is None:
+                return None
+            if job["status"] == "succeeded":
+                return job["feedback"]
+            if job["status"] == "failed":
+                st.error(f"Analysis failed: {job.get('error')}")
+                return None
+            time.sleep(poll_interval)
+        st.error("Analysis is taking longer than expected; please try again later.")
+        return None
+    
+    def get_feedback_page(self, limit: int = 50, cursor: Optional[str] = None, **filters) -> Dict[str, Any]:
+        """Get one page of feedback results.
+
+        Filters: user_id, scenario_id, start, end (ISO timestamps), min_score, max_score.
+        Returns {"items": [...], "next_cursor": ...}.
+        """
+        try:
+            params = {"limit": limit, "cursor": cursor, **filters}
+            params = {k: v for k, v in params.items() if v is not None}
+            response = requests.get(f"{self.api_v1}/results/feedback", params=params, timeout=self.timeout)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             st.error(f"Error fetching feedback: {e}")
-            return []
+            return {"items": [], "next_cursor": None}
     
-    def get_all_attempts(self, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get all practice attempts"""
+    def get_attempts_page(self, limit: int = 50, cursor: Optional[str] = None, **filters) -> Dict[str, Any]:
+        """Get one page of practice attempts (same filters as get_feedback_page)"""
         try:
-            response = requests.get(f"{self.api_v1}/results/attempts?limit={limit}")
+            params = {"limit": limit, "cursor": cursor, **filters}
+            params = {k: v for k, v in params.items() if v is not None}
+            response = requests.get(f"{self.api_v1}/results/attempts", params=params, timeout=self.timeout)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             st.error(f"Error fetching attempts: {e}")
-            return []
+            return {"items": [], "next_cursor": None}
+    
+    def iter_feedback(self, page_size: int = 100, **filters) -> Iterator[Dict[str, Any]]:
+        """Iterate over all matching feedback, fetching one page at a time"""
+        cursor = None
+        while True:
+            page = self.get_feedback_page(limit=page_size, cursor=cursor, **filters)
+            yield from page["items"]
+            cursor = page.get("next_cursor")
+            if not cursor:
+                break
+    
+    def get_analytics(self, bucket: str = "day", **filters) -> Optional[Dict[str, Any]]:
+        """Get server-side aggregates for the dashboard (same filters as get_feedback_page)"""
+        try:
+            params = {"bucket": bucket, **filters}
+            params = {k: v for k, v in params.items() if v is not None}
+            response = requests.get(f"{self.api_v1}/results/analytics", params=params, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            st.error(f"Error fetching analytics: {e}")
+            return None
+    
+    def get_all_feedback(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get the most recent feedback results"""
+        return self.get_feedback_page(limit=limit)["items"]
+    
+    def get_all_attempts(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get the most recent practice attempts"""
+        return self.get_attempts_page(limit=limit)["items"]
 
     def submit_practice_voice(self, scenario_id: str, user_id: str, audio_bytes: bytes) -> Optional[Dict[str, Any]]:
         """Submit a voice practice attempt as a file upload."""
@@ -73,7 +179,8 @@ class APIClient:
             response = requests.post(
                 f"{self.api_v1}/practice/submit_voice",
                 files=files,
-                data=data
+                data=data,
+                timeout=self.analysis_timeout
             )
             response.raise_for_status()
             return response.json()
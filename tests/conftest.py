@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+sys.path.insert(0, BACKEND_DIR)
+
+from core.config import settings
+
+# Services read their settings when they are built, so point everything at a
+# throwaway directory before any test imports them
+_workdir = tempfile.mkdtemp(prefix="healthcare_tests_")
+settings.database_url = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+settings.results_dir = os.path.join(_workdir, "results")
+settings.scenarios_dir = os.path.join(BACKEND_DIR, "data", "scenarios")
+settings.llm_cache_backend = "none"
+settings.transcript_cache_backend = "none"
+settings.job_workers = 0
+settings.warm_weights_cache_on_startup = False
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """Migrated engine on a fresh SQLite file"""
+    from core.database import create_db_engine
+    from core.migrations import run_migrations
+
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    run_migrations(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    from core.database import create_session_factory
+
+    return create_session_factory(engine)
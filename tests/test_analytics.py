@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.models import FEEDBACK_CATEGORIES, FeedbackAnalysisDB
+from services.analytics_service import AnalyticsService
+from services.storage_service import ResultFilters
+
+
+def add_feedback(session_factory, rows):
+    """rows: (scenario_id, overall_score, timestamp)"""
+    db = session_factory()
+    try:
+        for n, (scenario_id, score, timestamp) in enumerate(rows):
+            db.add(FeedbackAnalysisDB(
+                attempt_id=f"attempt_{n}", scenario_id=scenario_id, overall_score=score, details={},
+                timestamp=timestamp, **{f"{category}_score": score for category in FEEDBACK_CATEGORIES}
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_summary_aggregates(session_factory):
+    now = datetime.now()
+    add_feedback(session_factory, [
+        ("s1", 4.0, now - timedelta(days=30)),
+        ("s1", 6.5, now - timedelta(days=2)),
+        ("s2", 7.9, now - timedelta(days=1)),
+        ("s2", 9.0, now),
+    ])
+    summary = AnalyticsService(session_factory).get_summary()
+
+    assert summary.total_attempts == 4
+    assert summary.attempts_last_7_days == 3
+    assert summary.overall.average == pytest.approx(6.85)
+    assert (summary.overall.minimum, summary.overall.maximum) == (4.0, 9.0)
+    assert summary.categories["empathy_tone"].average == pytest.approx(6.85)
+    assert [(b.lower, b.count) for b in summary.histogram] == [(4, 1), (6, 1), (7, 1), (9, 1)]
+    assert [(s.scenario_id, s.attempts) for s in summary.scenarios] == [("s1", 2), ("s2", 2)]
+    assert sum(point.attempts for point in summary.trend) == 4
+
+
+def test_filters_apply_to_every_statistic(session_factory):
+    now = datetime.now()
+    add_feedback(session_factory, [("s1", 4.0, now), ("s2", 8.0, now)])
+    summary = AnalyticsService(session_factory).get_summary(ResultFilters(scenario_id="s2"))
+    assert summary.total_attempts == 1
+    assert [s.scenario_id for s in summary.scenarios] == ["s2"]
+    assert [b.lower for b in summary.histogram] == [8]
+
+
+def test_weeks_are_iso_weeks_across_new_year(session_factory):
+    timestamps = [
+        datetime(2020, 12, 31, 9),   # Thursday: 2020-W53
+        datetime(2021, 1, 3, 21),    # Sunday: still 2020-W53
+        datetime(2021, 1, 4, 8),     # Monday: 2021-W01
+        datetime(2024, 12, 30, 12),  # Monday: 2025-W01
+        datetime(2025, 1, 5, 23),    # Sunday: 2025-W01
+    ]
+    add_feedback(session_factory, [("s1", 5.0, timestamp) for timestamp in timestamps])
+    trend = AnalyticsService(session_factory).get_summary(bucket="week").trend
+    assert [(point.period, point.attempts) for point in trend] == [
+        ("2020-W53", 2), ("2021-W01", 1), ("2025-W01", 2)
+    ]
+    for timestamp in timestamps:
+        year, week, _ = timestamp.isocalendar()
+        assert f"{year}-W{week:02d}" in {point.period for point in trend}
+
+
+def test_unknown_bucket_is_rejected(session_factory):
+    with pytest.raises(ValueError):
+        AnalyticsService(session_factory).get_summary(bucket="year")
@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+import pytest
+
+from core.models import DailySummaryDB
+from services.daily_summary_service import DailySummaryStore, score_bucket
+
+DATE = "2024-05-01"
+DAY = datetime(2024, 5, 1, 10)
+
+
+@pytest.fixture
+def store(session_factory, tmp_path):
+    return DailySummaryStore(session_factory, str(tmp_path))
+
+
+def record(store, attempts):
+    db = store.SessionLocal()
+    try:
+        store.record_many(db, attempts)
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_scores_fall_in_whole_point_buckets():
+    assert [score_bucket(s) for s in (-1, 0, 6.99, 7, 10, 12)] == [0, 0, 6, 7, 10, 10]
+
+
+def test_record_and_record_many_add_up(store):
+    db = store.SessionLocal()
+    try:
+        assert store.record(db, "s1", 6.5, DAY) == DATE
+        db.commit()
+    finally:
+        db.close()
+    record(store, [("s1", 8.0, DAY), ("s2", 8.5, DAY), ("s2", 3.0, datetime(2024, 5, 2))])
+
+    summary = store.get_summary(DATE)
+    assert summary["total_attempts"] == 3
+    assert summary["average_score"] == pytest.approx(7.67)
+    assert summary["scenarios_practiced"] == {"s1": 2, "s2": 1}
+    assert summary["score_histogram"] == {"6": 1, "8": 2}
+    assert store.get_summary("2024-05-02")["total_attempts"] == 1
+
+
+def test_concurrent_upserts_lose_no_increments(store):
+    def worker():
+        for _ in range(10):
+            record(store, [("s1", 5.0, DAY)])
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.get_summary(DATE)["total_attempts"] == 40
+
+
+def test_write_entries_appends_the_log_and_rewrites_the_snapshot(store):
+    record(store, [("s1", 6.0, DAY), ("s1", 8.0, DAY)])
+    saved = {}
+    store.write_entries([
+        (DATE, "a1", "s1", 6.0, DAY.isoformat()),
+        (DATE, "a2", "s1", 8.0, DAY.isoformat()),
+    ], lambda data, path: saved.update({path: data}))
+
+    with open(store.log_path(DATE)) as f:
+        assert [json.loads(line)["attempt_id"] for line in f] == ["a1", "a2"]
+    assert saved[store.summary_path(DATE)]["total_attempts"] == 2
+
+
+def test_legacy_summary_is_imported_once(store, session_factory):
+    legacy = {"date": DATE, "attempts": [
+        {"attempt_id": "old1", "scenario_id": "s1", "score": 4.0, "timestamp": DAY.isoformat()},
+        {"attempt_id": "old2", "scenario_id": "s2", "score": 9.0, "timestamp": DAY.isoformat()},
+    ]}
+    with open(store.summary_path(DATE), "w") as f:
+        json.dump(legacy, f)
+
+    # Two writers find the old-format file before either has written the log
+    store._import_legacy_summary(DATE)
+    os.remove(store.log_path(DATE))
+    store._import_legacy_summary(DATE)
+
+    db = session_factory()
+    try:
+        assert db.get(DailySummaryDB, DATE).total_attempts == 2
+    finally:
+        db.close()
+    summary = store.get_summary(DATE)
+    assert summary["scenarios_practiced"] == {"s1": 1, "s2": 1}
+    assert summary["score_histogram"] == {"4": 1, "9": 1}
@@ -0,0 +1,80 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import services.export_service as export_service
+from core.models import FEEDBACK_CATEGORIES, FeedbackAnalysisDB, PracticeAttemptDB
+from services.export_service import EXPORT_FIELDS, ExportFormatUnavailable, ResultsExporter
+from services.storage_service import ResultFilters
+
+
+@pytest.fixture
+def exporter(session_factory):
+    start = datetime(2024, 3, 1, 9)
+    db = session_factory()
+    try:
+        for n in range(7):
+            attempt_id = f"attempt_{n}"
+            timestamp = start + timedelta(hours=n)
+            # One result has no attempt row, as for feedback saved before attempts were kept
+            if n != 6:
+                db.add(PracticeAttemptDB(id=attempt_id, scenario_id="søren_scenario", user_response="...",
+                                         user_id=f"user_{n % 2}", timestamp=timestamp))
+            db.add(FeedbackAnalysisDB(
+                attempt_id=attempt_id, scenario_id="søren_scenario", overall_score=float(n), details={},
+                timestamp=timestamp, **{f"{category}_score": float(n) for category in FEEDBACK_CATEGORIES}
+            ))
+        db.commit()
+    finally:
+        db.close()
+    return ResultsExporter(session_factory, chunk_size=3)
+
+
+def test_csv_streams_every_row_in_chunks(exporter):
+    parts = list(exporter.iter_csv())
+    # Header with the first chunk, then one part per chunk and a final flush
+    assert len(parts) == 4
+    rows = list(csv.DictReader(io.StringIO("".join(parts))))
+    assert list(rows[0]) == EXPORT_FIELDS
+    assert [row["attempt_id"] for row in rows] == [f"attempt_{n}" for n in range(7)]
+    assert rows[-1]["user_id"] == "unknown"
+
+
+def test_jsonl_applies_filters(exporter):
+    rows = [json.loads(line) for line in "".join(exporter.iter_jsonl(ResultFilters(user_id="user_1"))).splitlines()]
+    assert [row["attempt_id"] for row in rows] == ["attempt_1", "attempt_3", "attempt_5"]
+    assert {row["user_id"] for row in rows} == {"user_1"}
+
+
+@pytest.mark.parametrize("export_format", ["csv", "jsonl"])
+def test_export_to_file_counts_bytes(exporter, tmp_path, export_format):
+    path = tmp_path / f"export.{export_format}"
+    written = exporter.export_to_file(str(path), export_format)
+    # The scenario id is not ASCII, so characters and bytes differ
+    assert written == os.path.getsize(path)
+    assert "søren_scenario" in path.read_text(encoding="utf-8")
+
+
+def test_parquet_export(exporter, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "export.parquet"
+    written = exporter.export_to_file(str(path), "parquet")
+    assert written == os.path.getsize(path)
+    table = pq.read_table(str(path))
+    assert table.num_rows == 7
+    assert table.column_names == EXPORT_FIELDS
+
+
+def test_missing_pyarrow_is_reported_before_the_file_is_opened(exporter, tmp_path, monkeypatch):
+    def missing():
+        raise ExportFormatUnavailable("Parquet export requires pyarrow")
+
+    monkeypatch.setattr(export_service, "_import_pyarrow", missing)
+    path = tmp_path / "export.parquet"
+    with pytest.raises(ExportFormatUnavailable):
+        exporter.export_to_file(str(path), "parquet")
+    assert not path.exists()
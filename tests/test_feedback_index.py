@@ -0,0 +1,175 @@
+import math
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.models import FeedbackAnalysis, FeedbackAnalysisDB, PracticeAttemptDB, ScoreDetail
+from services.feedback_index import FeedbackItem, FeedbackVectorIndex, UserFeedbackIndex, embed_text, feedback_items
+
+DIMENSIONS = 1 << 16
+
+
+def details(explanation: str, improvements=()):
+    return {"medical_accuracy": {"explanation": explanation, "improvements": list(improvements)}}
+
+
+def save(session_factory, attempt_id: str, user_id: str, scenario_id: str, timestamp: datetime, detail: dict):
+    db = session_factory()
+    try:
+        db.add(PracticeAttemptDB(id=attempt_id, scenario_id=scenario_id, user_response="...",
+                                 user_id=user_id, timestamp=timestamp))
+        db.add(FeedbackAnalysisDB(attempt_id=attempt_id, scenario_id=scenario_id, overall_score=5.0,
+                                  general_feedback="", details=detail, timestamp=timestamp))
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_embeddings_are_normalized_and_deterministic():
+    vector = embed_text("Ask the patient about allergies before giving medication", DIMENSIONS)
+    assert vector == embed_text("ask the patient about ALLERGIES before giving medication!", DIMENSIONS)
+    assert math.isclose(math.sqrt(sum(v * v for v in vector.values())), 1.0, rel_tol=1e-6)
+    assert embed_text("the and of", DIMENSIONS) == {}
+
+
+def test_search_ranks_relevant_items_first():
+    index = UserFeedbackIndex(DIMENSIONS)
+    now = datetime.now()
+    index.add_many([("a1", [
+        FeedbackItem("medical_accuracy", "Ask about allergies before giving medication", "s1", now),
+        FeedbackItem("empathy_tone", "Acknowledge the patient's anxiety about the procedure", "s1", now),
+        FeedbackItem("completeness", "Summarize the discharge plan at the end", "s1", now),
+    ])])
+    query = embed_text("allergies and current medication", DIMENSIONS)
+    results = index.search([query], None, k=3, min_similarity=0.1)
+    assert [item.text for item in results] == ["Ask about allergies before giving medication"]
+
+
+def test_same_scenario_items_get_a_bonus():
+    index = UserFeedbackIndex(DIMENSIONS)
+    now = datetime.now()
+    index.add_many([
+        ("a1", [FeedbackItem("completeness", "Explain the pain scale gently", "other", now)]),
+        ("a2", [FeedbackItem("completeness", "Explain the pain scale slowly", "current", now)]),
+    ])
+    query = embed_text("explain the pain scale", DIMENSIONS)
+    assert index.search([query], None, k=1, min_similarity=0)[0].scenario_id == "other"
+    assert index.search([query], "current", k=1, min_similarity=0)[0].scenario_id == "current"
+
+
+def test_repeated_texts_and_attempts_are_indexed_once():
+    index = UserFeedbackIndex(DIMENSIONS)
+    old, new = datetime(2024, 1, 1), datetime(2024, 2, 1)
+    index.add_many([("a1", [FeedbackItem("completeness", "Check understanding", "s1", old)])])
+    index.add_many([("a2", [FeedbackItem("completeness", "check understanding", "s2", new)])])
+    index.add_many([("a2", [FeedbackItem("completeness", "Something else", "s2", new)])])
+    assert len(index) == 1
+    assert index.items[0].scenario_id == "s2"
+    assert index.newest == new
+
+
+def test_indexed_attempt_ids_only_cover_the_refresh_overlap():
+    index = UserFeedbackIndex(DIMENSIONS)
+    start = datetime(2024, 1, 1)
+    for n in range(1000):
+        timestamp = start + timedelta(minutes=n)
+        index.add_many([(f"a{n}", [FeedbackItem("completeness", f"Point {n}", "s1", timestamp)])])
+    assert len(index) == 1000
+    assert len(index._attempt_ids) < 2 * UserFeedbackIndex.MIN_PRUNE
+    # Attempts a refresh can read again are still recognized
+    assert "a999" in index._attempt_ids
+    index.add_many([("a999", [FeedbackItem("completeness", "Changed", "s1", start)])])
+    assert len(index) == 1000
+
+def test_feedback_items_split_explanations_and_improvements():
+    items = feedback_items("s1", datetime.now(), details("Accurate dosage", ["Mention side effects", " "]))
+    assert [item.text for item in items] == ["Accurate dosage", "Mention side effects"]
+
+
+def test_index_loads_from_the_database_within_the_token_budget(session_factory):
+    now = datetime.now()
+    save(session_factory, "a1", "user_1", "s1", now, details("Ask about allergies", ["Confirm allergies in the chart"]))
+    save(session_factory, "a2", "user_2", "s1", now, details("Ask about allergies too"))
+    index = FeedbackVectorIndex(session_factory, dimensions=DIMENSIONS)
+
+    results = index.search("user_1", ["allergies"], k=5, token_budget=100, min_similarity=0.1)
+    assert {item.text for item in results} == {"Ask about allergies", "Confirm allergies in the chart"}
+    assert index.is_fresh("user_1")
+
+    budgeted = index.search("user_1", ["allergies"], k=5, token_budget=5, min_similarity=0.1)
+    assert [item.text for item in budgeted] == ["Ask about allergies"]
+
+
+def test_saves_from_other_processes_are_picked_up_after_the_refresh_interval(session_factory):
+    now = datetime.now()
+    save(session_factory, "a1", "user_1", "s1", now, details("Introduce yourself"))
+    index = FeedbackVectorIndex(session_factory, dimensions=DIMENSIONS, refresh_seconds=60)
+    assert index.search("user_1", ["pain scale"], min_similarity=0.1) == []
+
+    # Saved by another process: this index is not told about it
+    save(session_factory, "a2", "user_1", "s1", now + timedelta(seconds=1), details("Explain the pain scale"))
+    assert index.search("user_1", ["pain scale"], min_similarity=0.1) == []
+
+    index.refresh_seconds = 0
+    assert not index.is_fresh("user_1")
+    results = index.search("user_1", ["pain scale"], min_similarity=0.1)
+    assert [item.text for item in results] == ["Explain the pain scale"]
+
+
+def test_refresh_rereads_late_commits_within_the_overlap(session_factory):
+    now = datetime.now()
+    save(session_factory, "a1", "user_1", "s1", now, details("Introduce yourself"))
+    index = FeedbackVectorIndex(session_factory, dimensions=DIMENSIONS, refresh_seconds=0)
+    index.search("user_1", ["introduce"])
+
+    # Timestamped before the newest indexed row, but committed after the index loaded
+    save(session_factory, "a2", "user_1", "s1", now - timedelta(seconds=30), details("Explain the pain scale"))
+    results = index.search("user_1", ["pain scale"], min_similarity=0.1)
+    assert [item.text for item in results] == ["Explain the pain scale"]
+
+
+@pytest.mark.parametrize("loaded", [True, False])
+def test_add_feedback_only_updates_loaded_users(session_factory, loaded):
+    index = FeedbackVectorIndex(session_factory, dimensions=DIMENSIONS, refresh_seconds=60)
+    if loaded:
+        index.search("user_1", ["anything"])
+    detail = ScoreDetail(score=6, explanation="Use plain language", strengths=[], improvements=[])
+    feedback = FeedbackAnalysis(attempt_id="a1", scenario_id="s1", medical_accuracy=detail,
+                                communication_clarity=detail, empathy_tone=detail, completeness=detail,
+                                overall_score=6, general_feedback="")
+    index.add_feedback("user_1", feedback)
+    assert index.stats()["users"] == (1 if loaded else 0)
+    assert index.stats()["items"] == (1 if loaded else 0)
+
+
+def test_repeated_searches_reuse_results_until_feedback_is_added(session_factory):
+    now = datetime.now()
+    save(session_factory, "a1", "user_1", "s1", now, details("Ask about allergies"))
+    index = FeedbackVectorIndex(session_factory, dimensions=DIMENSIONS, refresh_seconds=60)
+
+    first = index.search("user_1", ["allergies"], "s1", min_similarity=0.1)
+    assert index.search("user_1", ["allergies"], "s1", min_similarity=0.1) == first
+    assert (index.stats()["result_hits"], index.stats()["result_misses"]) == (1, 1)
+
+    detail = ScoreDetail(score=6, explanation="Check allergies against the chart", strengths=[], improvements=[])
+    feedback = FeedbackAnalysis(attempt_id="a2", scenario_id="s1", medical_accuracy=detail,
+                                communication_clarity=detail, empathy_tone=detail, completeness=detail,
+                                overall_score=6, general_feedback="")
+    index.add_feedback("user_1", feedback)
+    results = index.search("user_1", ["allergies"], "s1", min_similarity=0.1)
+    assert "Check allergies against the chart" in {item.text for item in results}
+    assert index.stats()["result_misses"] == 2
+
+
+def test_refresh_that_finds_new_rows_drops_cached_results(session_factory):
+    now = datetime.now()
+    save(session_factory, "a1", "user_1", "s1", now, details("Ask about allergies"))
+    index = FeedbackVectorIndex(session_factory, dimensions=DIMENSIONS, refresh_seconds=0)
+    index.search("user_1", ["allergies"], min_similarity=0.1)
+    index.search("user_1", ["allergies"], min_similarity=0.1)
+    # Refreshed, but nothing new was found
+    assert index.stats()["result_hits"] == 1
+
+    save(session_factory, "a2", "user_1", "s1", now + timedelta(seconds=1), details("Document allergies"))
+    results = index.search("user_1", ["allergies"], min_similarity=0.1)
+    assert {item.text for item in results} == {"Ask about allergies", "Document allergies"}
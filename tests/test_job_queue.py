@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import hmac
+import json
+from datetime import datetime
+
+import httpx
+import pytest
+
+import services.job_queue_service as job_queue_service
+from core.config import settings
+from core.models import AnalysisJob, JobStatus, PracticeAttempt
+from services.job_queue_service import AnalysisJobQueue, AnalysisWorkerPool
+
+
+def enqueue(queue: AnalysisJobQueue, user_id: str = "user_1") -> AnalysisJob:
+    return queue.enqueue(PracticeAttempt(scenario_id="scenario_1", user_response="Hello", user_id=user_id))
+
+
+def test_only_one_worker_claims_a_job(session_factory):
+    queue = AnalysisJobQueue(session_factory)
+    job = enqueue(queue)
+
+    claimed = queue.claim("worker_a")
+    assert claimed.job_id == job.job_id
+    assert claimed.attempts == 1
+    assert queue.claim("worker_b") is None
+    assert queue.get(job.job_id).status == JobStatus.RUNNING
+
+
+def test_expired_lease_lets_another_worker_take_the_job(session_factory):
+    queue = AnalysisJobQueue(session_factory)
+    job = enqueue(queue)
+    queue.lease_seconds = -1
+    queue.claim("worker_a")
+
+    queue.lease_seconds = 60
+    claimed = queue.claim("worker_b")
+    assert claimed.job_id == job.job_id
+    assert claimed.attempts == 2
+    # The first worker no longer holds the job and can't finish or renew it
+    assert queue.complete(job.job_id, "worker_a") is None
+    assert not queue.renew(job.job_id, "worker_a")
+    assert queue.complete(job.job_id, "worker_b").status == JobStatus.SUCCEEDED
+
+
+def test_jobs_whose_workers_keep_dying_are_failed(session_factory):
+    queue = AnalysisJobQueue(session_factory)
+    queue.max_attempts = 2
+    job = enqueue(queue)
+    queue.lease_seconds = -1
+    assert queue.claim("worker_a") is not None
+    assert queue.claim("worker_b") is not None
+    assert queue.claim("worker_c") is None
+    assert queue.get(job.job_id).status == JobStatus.FAILED
+
+
+def test_released_job_is_requeued_without_using_an_attempt(session_factory):
+    queue = AnalysisJobQueue(session_factory)
+    job = enqueue(queue)
+    queue.claim("worker_a")
+    assert queue.release(job.job_id, "worker_a")
+    assert queue.claim("worker_b").attempts == 1
+
+
+def test_webhook_body_is_signed(session_factory, monkeypatch):
+    monkeypatch.setattr(settings, "job_webhook_secret", "s3cret")
+    monkeypatch.setattr(job_queue_service, "check_callback_url", lambda url: url)
+    received = []
+
+    def handler(request: httpx.Request):
+        received.append(request)
+        return httpx.Response(200)
+
+    pool = AnalysisWorkerPool(AnalysisJobQueue(session_factory), None, None, None, concurrency=0)
+    job = AnalysisJob(job_id="job_1", status=JobStatus.SUCCEEDED, attempt_id="a1", scenario_id="s1",
+                      user_id="u1", created_at=datetime(2024, 1, 1))
+
+    async def main():
+        pool._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        await pool._notify_callback("https://hooks.example.com/jobs", job)
+        await pool._http.aclose()
+
+    asyncio.run(main())
+    request, = received
+    expected = hmac.new(b"s3cret", request.content, hashlib.sha256).hexdigest()
+    assert request.headers["X-Signature"] == f"sha256={expected}"
+    assert request.headers["X-Job-Id"] == "job_1"
+    assert json.loads(request.content)["status"] == "succeeded"
+
+
+class BrokenUsage:
+    def retry(self, attempt_id):
+        pass
+
+    def save_failed(self, attempts):
+        raise RuntimeError("database is locked")
+
+
+class BrokenStorage:
+    llm_usage = BrokenUsage()
+
+    def get_feedback_by_attempt_id(self, attempt_id):
+        return None
+
+
+class FailingAnalysis:
+    async def analyze_response_async(self, **kwargs):
+        raise ValueError("bad output")
+
+
+class Scenarios:
+    def get_scenario(self, scenario_id):
+        return object()
+
+
+def test_worker_survives_errors_while_recording_a_failure(session_factory, monkeypatch):
+    monkeypatch.setattr(settings, "job_poll_interval", 0.01)
+    queue = AnalysisJobQueue(session_factory)
+    jobs = [enqueue(queue, f"user_{n}") for n in range(2)]
+    pool = AnalysisWorkerPool(queue, FailingAnalysis(), Scenarios(), BrokenStorage(), concurrency=1)
+
+    async def main():
+        pool.start()
+        # Both jobs are claimed and their failure paths have finished
+        for _ in range(500):
+            if not pool._claimed and all(queue.get(job.job_id).status == JobStatus.RUNNING for job in jobs):
+                break
+            await asyncio.sleep(0.01)
+        worker, = pool._tasks
+        assert not worker.done()
+        assert pool._claimed == {}
+        await pool.stop()
+
+    asyncio.run(main())
+    # Neither job is handed back at shutdown; their leases lapse and they are retried
+    assert [queue.get(job.job_id).status for job in jobs] == [JobStatus.RUNNING] * 2
+    assert [queue.get(job.job_id).attempts for job in jobs] == [1, 1]
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import pytest
+
+from core.models import MedicalAccuracyDetail, Scenario
+from scripts.fake_llm import FakeChatModel
+from services.advanced_analysis_service import AnalysisPipelineService
+from services.llm_cache import (LLMResponseCache, MemoryCacheBackend, SQLiteCacheBackend, create_llm_cache,
+                                normalize_response_text)
+from services.storage_service import StorageService
+
+DETAIL = MedicalAccuracyDetail(score=7, explanation="Accurate", strengths=["Safe"], improvements=[], examples=[])
+
+
+def test_keys_depend_on_content_not_argument_order():
+    key = LLMResponseCache.make_key(model="m", inputs={"a": 1, "b": "ø"})
+    assert key == LLMResponseCache.make_key(inputs={"b": "ø", "a": 1}, model="m")
+    assert key != LLMResponseCache.make_key(model="m", inputs={"a": 2, "b": "ø"})
+    assert len(key) == 64
+    assert normalize_response_text("  Hello,\n\tthere  ") == "Hello, there"
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        store = MemoryCacheBackend(max_entries=2)
+    else:
+        store = SQLiteCacheBackend(str(tmp_path / "cache" / "llm.db"), max_entries=2)
+    yield store
+    store.close()
+
+
+def test_backends_evict_least_recently_used(backend):
+    backend.set("a", "1", 60)
+    backend.set("b", "2", 60)
+    time.sleep(0.01)
+    assert backend.get("a") == "1"
+    backend.set("c", "3", 60)
+    assert backend.get("b") is None
+    assert (backend.get("a"), backend.get("c")) == ("1", "3")
+    assert backend.size() == 2
+    assert backend.clear() == 2
+    assert backend.size() == 0
+
+
+def test_backends_expire_entries(backend):
+    backend.set("a", "1", 0.05)
+    assert backend.get("a") == "1"
+    time.sleep(0.1)
+    assert backend.get("a") is None
+
+
+def test_sqlite_entries_outlive_the_connection(tmp_path):
+    path = str(tmp_path / "llm.db")
+    first = SQLiteCacheBackend(path)
+    first.set("a", "1", 60)
+    first.close()
+    second = SQLiteCacheBackend(path)
+    assert second.get("a") == "1"
+    second.close()
+
+
+def test_values_round_trip_through_the_schema():
+    cache = LLMResponseCache(MemoryCacheBackend())
+    cache.set("k", DETAIL)
+    assert cache.get("k", MedicalAccuracyDetail) == DETAIL
+    assert cache.get("k") == DETAIL.model_dump_json()
+    assert cache.get("missing", MedicalAccuracyDetail) is None
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_a_broken_backend_counts_as_a_miss():
+    class Broken(MemoryCacheBackend):
+        def get(self, key):
+            raise OSError("disk gone")
+
+        def set(self, key, value, ttl):
+            raise OSError("disk gone")
+
+    cache = LLMResponseCache(Broken())
+    cache.set("k", DETAIL)
+    assert cache.get("k", MedicalAccuracyDetail) is None
+    assert (cache.misses, cache.errors) == (1, 2)
+
+
+def test_disabled_cache_and_unknown_backend():
+    cache = create_llm_cache(backend="none")
+    assert not cache.enabled
+    cache.set("k", "v")
+    assert cache.get("k") is None
+    assert cache.stats()["backend"] == "none"
+    with pytest.raises(ValueError):
+        create_llm_cache(backend="memcached")
+
+
+def test_identical_submissions_reuse_specialist_outputs(engine):
+    cache = LLMResponseCache(MemoryCacheBackend())
+    service = AnalysisPipelineService(
+        llm=FakeChatModel(latency=0, jitter=0), storage_service=StorageService(engine=engine), response_cache=cache
+    )
+    scenario = Scenario(id="s1", title="Chest pain", description="", context="A patient with chest pain",
+                        difficulty="beginner", medical_area="Cardiology", patient_type="Adult",
+                        key_points=["Introduce yourself"])
+
+    async def analyze(attempt_id, response):
+        return await service.analyze_response_async(attempt_id, scenario, response, "user_1")
+
+    first = asyncio.run(analyze("a1", "Hello, I am   your nurse."))
+    assert (cache.hits, cache.misses) == (0, 2)
+    # Whitespace differences share a key; the specialists are served from the cache
+    second = asyncio.run(analyze("a2", "Hello, I am your\nnurse."))
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert second.overall_score == first.overall_score
+
+    asyncio.run(analyze("a3", "Something else entirely."))
+    assert (cache.hits, cache.misses) == (2, 4)
+    service.storage_service.close()
@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+from core.config import settings
+from services.llm_calls import HEDGE_MIN_SAMPLES, LLMCallPolicy
+from services.llm_scheduler import LLMScheduler
+
+
+@pytest.fixture
+def scheduler():
+    return LLMScheduler(max_concurrency=4, min_concurrency=1, rate=0, max_queued=10,
+                        latency_threshold=0, processes=1)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(settings, "llm_retry_base_delay", 0.0)
+
+
+def test_hedge_winner_cancels_the_loser(scheduler):
+    policy = LLMCallPolicy(scheduler, max_retries=0, hedging=True)
+    stats = policy.stats_for("medical")
+    for _ in range(HEDGE_MIN_SAMPLES):
+        stats.observe(0.01)
+
+    started, cancelled = [], []
+
+    async def call():
+        attempt = len(started)
+        started.append(attempt)
+        try:
+            # The first attempt stalls far past the p95; the hedge answers at once
+            await asyncio.sleep(5 if attempt == 0 else 0)
+        except asyncio.CancelledError:
+            cancelled.append(attempt)
+            raise
+        return attempt
+
+    async def main():
+        result = await asyncio.wait_for(policy.arun("medical", call), 2)
+        # Let the cancelled attempt unwind
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == 1
+    assert started == [0, 1]
+    assert cancelled == [0]
+    counters = policy.stats()["calls"]["medical"]
+    assert counters["hedges"] == 1
+    assert counters["hedge_wins"] == 1
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_no_hedge_without_enough_samples(scheduler):
+    policy = LLMCallPolicy(scheduler, max_retries=0, hedging=True)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    assert asyncio.run(policy.arun("medical", call)) == "ok"
+    assert len(calls) == 1
+    assert policy.stats()["calls"]["medical"]["hedges"] == 0
+
+
+def test_transient_errors_are_retried(scheduler):
+    policy = LLMCallPolicy(scheduler, max_retries=2, hedging=False)
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise TimeoutError("slow")
+        return "ok"
+
+    assert asyncio.run(policy.arun("weights", call)) == "ok"
+    counters = policy.stats()["calls"]["weights"]
+    assert counters["attempts"] == 2
+    assert counters["retries"] == 1
+    assert counters["timeouts"] == 1
+    assert counters["failures"] == 0
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_retries_stop_after_max_retries(scheduler):
+    policy = LLMCallPolicy(scheduler, max_retries=2, hedging=False)
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        raise TimeoutError("slow")
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(policy.arun("weights", call))
+    assert len(attempts) == 3
+    counters = policy.stats()["calls"]["weights"]
+    assert counters["retries"] == 2
+    assert counters["failures"] == 1
+
+
+def test_other_errors_are_not_retried(scheduler):
+    policy = LLMCallPolicy(scheduler, max_retries=2, hedging=False)
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        raise ValueError("bad output")
+
+    with pytest.raises(ValueError):
+        policy.run("medical", call)
+    assert len(attempts) == 1
+    assert policy.stats()["calls"]["medical"]["failures"] == 1
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_sync_calls_are_retried(scheduler):
+    policy = LLMCallPolicy(scheduler, max_retries=1, hedging=False)
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise TimeoutError("slow")
+        return "ok"
+
+    assert policy.run("transcription", call) == "ok"
+    assert len(attempts) == 2
+
+
+def test_call_timeout_counts_as_a_retryable_timeout(scheduler, monkeypatch):
+    monkeypatch.setattr(settings, "llm_call_timeouts", {"medical": 0.01})
+    policy = LLMCallPolicy(scheduler, max_retries=1, hedging=False)
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        await asyncio.sleep(0 if len(attempts) > 1 else 1)
+        return "ok"
+
+    assert asyncio.run(policy.arun("medical", call)) == "ok"
+    assert len(attempts) == 2
+    assert policy.stats()["calls"]["medical"]["timeouts"] == 1
@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from services.llm_scheduler import LLMOverloadedError, LLMScheduler
+
+
+def make_scheduler(max_concurrency: int = 1, queue_timeout: float = 5.0) -> LLMScheduler:
+    scheduler = LLMScheduler(max_concurrency=max_concurrency, min_concurrency=1, rate=0, burst=1,
+                             max_queued=10, latency_threshold=0, processes=1)
+    scheduler.queue_timeouts = (queue_timeout, queue_timeout)
+    return scheduler
+
+
+class GrantedAtDeadline(LLMScheduler):
+    """Grants a queued call a slot whose wake-up never arrives, as when the grant races the queue timeout"""
+
+    def _enqueue(self, priority, timeout, wake):
+        waiter = super()._enqueue(priority, timeout, lambda: None)
+        if waiter is not None:
+            self._limit += 1
+            self._grant()
+        return waiter
+
+
+def test_cancelled_waiter_releases_no_slot():
+    async def main():
+        scheduler = make_scheduler()
+        release_holder = asyncio.Event()
+
+        async def holder():
+            async with scheduler.aslot():
+                await release_holder.wait()
+
+        async def waiter():
+            async with scheduler.aslot():
+                pass
+
+        holding = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(waiter())
+        await asyncio.sleep(0.01)
+        assert scheduler.stats()["queued"]["interactive"] == 1
+
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        stats = scheduler.stats()
+        assert stats["queued"]["interactive"] == 0
+        assert stats["in_flight"] == 1
+
+        release_holder.set()
+        await holding
+        assert scheduler.stats()["in_flight"] == 0
+        # The cancelled waiter's place is not handed to anyone
+        async with scheduler.aslot():
+            assert scheduler.stats()["in_flight"] == 1
+        assert scheduler.stats()["in_flight"] == 0
+
+    asyncio.run(main())
+
+
+def test_waiter_cancelled_as_it_is_granted_gives_the_slot_back():
+    async def main():
+        scheduler = make_scheduler()
+        release_holder = asyncio.Event()
+
+        async def holder():
+            async with scheduler.aslot():
+                await release_holder.wait()
+
+        async def waiter():
+            async with scheduler.aslot():
+                pass
+
+        holding = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(waiter())
+        await asyncio.sleep(0.01)
+        # The holder's release grants the waiter a slot; cancel it before it wakes up
+        release_holder.set()
+        await holding
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert scheduler.stats()["in_flight"] == 0
+
+    asyncio.run(main())
+
+
+def test_async_waiter_granted_at_the_deadline_keeps_its_slot():
+    async def main():
+        scheduler = GrantedAtDeadline(max_concurrency=1, min_concurrency=1, rate=0, max_queued=10,
+                                      latency_threshold=0, processes=1)
+        scheduler.queue_timeouts = (0.05, 0.05)
+        async with scheduler.aslot():
+            async with scheduler.aslot():
+                assert scheduler.stats()["in_flight"] == 2
+            assert scheduler.stats()["in_flight"] == 1
+        assert scheduler.stats()["in_flight"] == 0
+        assert scheduler.stats()["rejected"] == 0
+
+    asyncio.run(main())
+
+
+def test_sync_waiter_granted_at_the_deadline_keeps_its_slot():
+    scheduler = GrantedAtDeadline(max_concurrency=1, min_concurrency=1, rate=0, max_queued=10,
+                                  latency_threshold=0, processes=1)
+    scheduler.queue_timeouts = (0.05, 0.05)
+    with scheduler.slot():
+        with scheduler.slot():
+            assert scheduler.stats()["in_flight"] == 2
+        assert scheduler.stats()["in_flight"] == 1
+    assert scheduler.stats()["in_flight"] == 0
+    assert scheduler.stats()["rejected"] == 0
+
+
+def test_queue_timeout_rejects_with_retry_after():
+    scheduler = make_scheduler(queue_timeout=0.05)
+    with scheduler.slot():
+        with pytest.raises(LLMOverloadedError) as excinfo:
+            with scheduler.slot():
+                pass
+    assert int(excinfo.value.retry_after_header) >= 1
+    stats = scheduler.stats()
+    assert stats["in_flight"] == 0
+    assert stats["queued"]["interactive"] == 0
+    assert stats["rejected"] == 1
+
+
+def test_limits_are_split_across_processes():
+    scheduler = LLMScheduler(max_concurrency=32, min_concurrency=2, rate=8, burst=4, processes=4)
+    assert scheduler.max_concurrency == 8
+    assert scheduler.min_concurrency == 1
+    assert scheduler.bucket.rate == 2
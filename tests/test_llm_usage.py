@@ -0,0 +1,124 @@
+import pytest
+from langchain_core.messages import HumanMessage
+
+from core.config import settings
+from core.models import FeedbackAnalysis, LLMCall, LLMUsageDB, PracticeAttempt, ScoreDetail
+from scripts.fake_llm import FakeChatModel
+from services.llm_usage_service import LLMUsageRecorder
+from services.storage_service import StorageService
+
+
+def make_result(user_id: str = "user_1", scenario_id: str = "scenario_1"):
+    attempt = PracticeAttempt(scenario_id=scenario_id, user_response="Hello, how are you feeling?", user_id=user_id)
+    detail = ScoreDetail(score=7, explanation="Clear introduction", strengths=[], improvements=[])
+    feedback = FeedbackAnalysis(
+        attempt_id=attempt.id, scenario_id=scenario_id, medical_accuracy=detail, communication_clarity=detail,
+        empathy_tone=detail, completeness=detail, overall_score=7, general_feedback="Good start"
+    )
+    return attempt, feedback
+
+
+def call(stage: str, prompt: int = 100, completion: int = 20, duration: float = 50.0, cached: bool = False):
+    return LLMCall(stage=stage, model="m", prompt_tokens=prompt, completion_tokens=completion,
+                   total_tokens=prompt + completion, duration_ms=duration, cached=cached)
+
+
+def usage_rows(session_factory):
+    db = session_factory()
+    try:
+        return db.query(LLMUsageDB).order_by(LLMUsageDB.id).all()
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def storage(engine, session_factory):
+    service = StorageService(engine=engine, session_factory=session_factory)
+    yield service
+    service.close()
+
+
+def test_tracked_calls_count_the_tokens_the_model_reports(storage):
+    recorder = storage.llm_usage
+    model = FakeChatModel(latency=0, jitter=0)
+    with recorder.track("transcription", "configured-model", attempt_id="a1", scenario_id="s1") as usage:
+        model.invoke([HumanMessage(content="x" * 400)], usage.config())
+    with recorder.track("llm.medical", attempt_id="a1") as usage:
+        usage.cached = True
+
+    taken = recorder.take_rows([("a1", "s1", "user_1")])
+    assert [(row.stage, row.cached, row.user_id) for row in taken] == [
+        ("transcription", False, "user_1"), ("llm.medical", True, "user_1")
+    ]
+    # The model's own name wins over the configured one
+    assert (taken[0].model, taken[0].prompt_tokens) == ("fake-chat-model", 100)
+    assert taken[0].total_tokens == taken[0].prompt_tokens + taken[0].completion_tokens
+    assert recorder.take_rows([("a1", "s1", "user_1")]) == []
+
+
+def test_usage_is_saved_with_the_feedback(storage, session_factory):
+    attempt, feedback = make_result()
+    storage.llm_usage.record(call("llm.medical"), attempt.id)
+    storage.llm_usage.record(call("llm.combined_communication"), attempt.id)
+    storage.llm_usage.record(call("llm.weights"), scenario_id="scenario_1")
+    assert storage.save_result(attempt, feedback)
+
+    usage = storage.llm_usage.get_attempt_usage(attempt.id)
+    assert [c.stage for c in usage.calls] == ["llm.medical", "llm.combined_communication"]
+    assert (usage.totals.calls, usage.totals.total_tokens, usage.totals.failed_calls) == (2, 240, 0)
+    assert {row.user_id for row in usage_rows(session_factory)} == {"user_1"}
+
+    assert storage.llm_usage.save_unattributed() == 1
+    assert storage.llm_usage.save_unattributed() == 0
+    assert usage_rows(session_factory)[-1].attempt_id is None
+
+
+def test_failed_attempts_write_late_calls_as_they_finish(storage, session_factory):
+    recorder = storage.llm_usage
+    recorder.record(call("llm.medical"), "a1")
+    assert recorder.save_failed([("a1", "s1", "user_1")]) == 1
+    # A parallel call that was still running when the analysis failed
+    recorder.record(call("llm.combined_communication"), "a1")
+    rows = usage_rows(session_factory)
+    assert [(row.stage, row.failed, row.user_id) for row in rows] == [
+        ("llm.medical", True, "user_1"), ("llm.combined_communication", True, "user_1")
+    ]
+
+    # Once retried, the attempt's calls wait for its feedback again
+    recorder.retry("a1")
+    recorder.record(call("llm.medical"), "a1")
+    assert len(usage_rows(session_factory)) == 2
+    assert [row.failed for row in recorder.take_rows([("a1", "s1", "user_1")])] == [False]
+
+
+def test_unsaved_attempts_are_dropped_oldest_first(session_factory):
+    recorder = LLMUsageRecorder(session_factory, max_pending_attempts=2)
+    for attempt_id in ("a1", "a2", "a3"):
+        recorder.record(call("llm.medical"), attempt_id)
+    attempts = [(attempt_id, "s1", "u") for attempt_id in ("a1", "a2", "a3")]
+    assert [row.attempt_id for row in recorder.take_rows(attempts)] == ["a2", "a3"]
+
+
+def test_report_rolls_up_by_group(storage, monkeypatch):
+    monkeypatch.setattr(settings, "llm_input_cost_per_million", 1.0)
+    monkeypatch.setattr(settings, "llm_output_cost_per_million", 2.0)
+    for user_id, stages in (("user_1", ["llm.medical", "llm.combined_communication"]), ("user_2", ["llm.medical"])):
+        attempt, feedback = make_result(user_id=user_id)
+        for n, stage in enumerate(stages):
+            storage.llm_usage.record(call(stage, duration=100.0 * (n + 1)), attempt.id)
+        storage.llm_usage.record(call("llm.medical", duration=1.0, cached=True), attempt.id)
+        assert storage.save_result(attempt, feedback)
+
+    report = storage.llm_usage.get_report(group_by="user")
+    assert (report.totals.calls, report.totals.cached_calls, report.totals.attempts) == (5, 2, 2)
+    assert [group.key for group in report.groups] == ["user_1", "user_2"]
+    user_1 = report.groups[0]
+    assert (user_1.prompt_tokens, user_1.completion_tokens) == (300, 60)
+    assert user_1.estimated_cost == pytest.approx((300 * 1.0 + 60 * 2.0) / 1_000_000)
+    # Cache hits take no model time and are left out of the latency figures
+    assert (user_1.average_duration_ms, user_1.max_duration_ms) == (150.0, 200.0)
+
+    stages = storage.llm_usage.get_report(group_by="stage", user_id="user_2")
+    assert {group.key: group.calls for group in stages.groups} == {"llm.medical": 2}
+    with pytest.raises(ValueError):
+        storage.llm_usage.get_report(group_by="day")
@@ -0,0 +1,93 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from api.middleware import ServerTimingMiddleware
+from core.metrics import Histogram, registry, server_timing_header, span
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "Test", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, stage='a "b"')
+    lines = histogram.render()
+    assert lines[:2] == ["# HELP test_seconds Test", "# TYPE test_seconds histogram"]
+    assert lines[2:] == [
+        'test_seconds_bucket{stage="a \\"b\\"",le="0.1"} 1',
+        'test_seconds_bucket{stage="a \\"b\\"",le="1.0"} 3',
+        'test_seconds_bucket{stage="a \\"b\\"",le="+Inf"} 4',
+        'test_seconds_sum{stage="a \\"b\\""} 6.05',
+        'test_seconds_count{stage="a \\"b\\""} 4',
+    ]
+
+
+def test_server_timing_sums_repeated_stages():
+    timings = [("llm.medical", 0.25, "miss"), ("transcription_chunk", 0.1, "ok"),
+               ("transcription_chunk", 0.2, "error"), ("transcription_chunk", 0.3, "ok")]
+    assert server_timing_header(timings, total=1.0) == (
+        'llm.medical;dur=250.0;desc="miss", transcription_chunk;dur=600.0;desc="x3 error", total;dur=1000.0'
+    )
+
+
+def make_app(header: bool) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(ServerTimingMiddleware, header=header)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        def in_thread():
+            with span("test.thread"):
+                pass
+
+        async def in_task():
+            with span("test.task") as timing:
+                timing.outcome = "hit"
+
+        await asyncio.to_thread(in_thread)
+        await asyncio.create_task(in_task())
+        with pytest.raises(ValueError), span("test.failing"):
+            raise ValueError
+        return {"id": item_id}
+
+    return app
+
+
+def get(app: FastAPI, path: str) -> httpx.Response:
+    async def request():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path)
+    return asyncio.run(request())
+
+
+def test_server_timing_header_covers_threads_and_tasks():
+    response = get(make_app(header=True), "/items/42")
+    assert response.status_code == 200
+    stages = {metric.split(";")[0]: metric for metric in response.headers["server-timing"].split(", ")}
+    assert set(stages) == {"test.thread", "test.task", "test.failing", "total"}
+    assert stages["test.task"].endswith('desc="hit"')
+    assert stages["test.failing"].endswith('desc="error"')
+
+
+def test_requests_are_recorded_by_route_template():
+    app = make_app(header=False)
+    response = get(app, "/items/7")
+    assert "server-timing" not in response.headers
+    assert get(app, "/nowhere").status_code == 404
+
+    rendered = registry.render()
+    assert 'http_request_duration_seconds_count{method="GET",route="/items/{item_id}",status="200"}' in rendered
+    assert 'route="/items/7"' not in rendered
+    assert 'http_request_duration_seconds_count{method="GET",route="unmatched",status="404"}' in rendered
+    assert 'stage_duration_seconds_count{stage="test.failing",outcome="error"}' in rendered
+
+
+def test_metrics_endpoint_serves_prometheus_text():
+    import main
+
+    response = get(main.app, "/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE stage_duration_seconds histogram" in response.text
@@ -0,0 +1,101 @@
+import json
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from core.database import create_db_engine
+from core.migrations import MIGRATIONS, run_migrations
+
+LEGACY_CATEGORIES = ("medical_accuracy", "communication_clarity", "empathy_tone", "completeness")
+
+# The tables as the first release created them, before any migration existed
+BASELINE_SCHEMA = [
+    """CREATE TABLE practice_attempts (
+        id VARCHAR PRIMARY KEY, scenario_id VARCHAR NOT NULL, user_response TEXT NOT NULL,
+        user_id VARCHAR, input_type VARCHAR(5), timestamp DATETIME
+    )""",
+    "CREATE TABLE feedback_analyses (id INTEGER PRIMARY KEY AUTOINCREMENT, attempt_id VARCHAR NOT NULL, "
+    "scenario_id VARCHAR NOT NULL, "
+    + "".join(
+        f"{category}_score FLOAT, {category}_explanation TEXT, {category}_strengths TEXT, "
+        f"{category}_improvements TEXT, {category}_examples TEXT, "
+        for category in LEGACY_CATEGORIES
+    )
+    + "overall_score FLOAT, general_feedback TEXT, timestamp DATETIME)",
+]
+
+
+def baseline_engine(path):
+    engine = create_db_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text(
+            "INSERT INTO practice_attempts VALUES ('attempt_1', 'scenario_1', 'Hello', 'user_1', 'TEXT', :ts)"
+        ), {"ts": datetime(2024, 1, 1, 9, 0)})
+        values = {"ts": datetime(2024, 1, 1, 9, 1)}
+        columns = []
+        for category in LEGACY_CATEGORIES:
+            columns += [f"{category}_score", f"{category}_explanation", f"{category}_strengths",
+                        f"{category}_improvements", f"{category}_examples"]
+            values.update({
+                f"{category}_score": 6.0,
+                f"{category}_explanation": f"{category} explanation",
+                f"{category}_strengths": json.dumps(["kind"]),
+                f"{category}_improvements": json.dumps([f"improve {category}"]),
+                f"{category}_examples": None,
+            })
+        conn.execute(text(
+            f"INSERT INTO feedback_analyses (attempt_id, scenario_id, {', '.join(columns)}, overall_score, "
+            f"general_feedback, timestamp) VALUES ('attempt_1', 'scenario_1', "
+            f"{', '.join(':' + c for c in columns)}, 6.0, 'Fine', :ts)"
+        ), values)
+    return engine
+
+
+def test_migrations_upgrade_a_baseline_database_once(tmp_path):
+    engine = baseline_engine(tmp_path / "baseline.db")
+
+    applied = run_migrations(engine)
+    assert applied == [name for _, name, _ in MIGRATIONS]
+    assert run_migrations(engine) == []
+    assert run_migrations(engine) == []
+
+    with engine.begin() as conn:
+        versions = conn.execute(text("SELECT version FROM schema_version ORDER BY version")).scalars().all()
+        details = conn.execute(text("SELECT details FROM feedback_analyses")).scalar_one()
+    assert versions == [version for version, _, _ in MIGRATIONS]
+    details = json.loads(details) if isinstance(details, str) else details
+    assert details["empathy_tone"] == {
+        "explanation": "empathy_tone explanation",
+        "strengths": ["kind"],
+        "improvements": ["improve empathy_tone"],
+        "examples": [],
+    }
+
+    columns = {c["name"] for c in inspect(engine).get_columns("feedback_analyses")}
+    assert "details" in columns
+    assert not any(column.endswith("_explanation") for column in columns)
+    assert "failed" in {c["name"] for c in inspect(engine).get_columns("llm_usage")}
+    engine.dispose()
+
+
+def test_migrations_are_noops_on_a_fresh_database(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    assert run_migrations(engine) == [name for _, name, _ in MIGRATIONS]
+    assert run_migrations(engine) == []
+    engine.dispose()
+
+
+def test_llm_usage_failed_column_is_added_to_an_existing_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE llm_usage DROP COLUMN failed"))
+        conn.execute(text("DELETE FROM schema_version WHERE version = 3"))
+        conn.execute(text(
+            "INSERT INTO llm_usage (stage, prompt_tokens, completion_tokens, total_tokens, duration_ms, cached) "
+            "VALUES ('weights', 10, 5, 15, 1.0, 0)"
+        ))
+
+    assert run_migrations(engine) == ["llm_usage_failed"]
+    with engine.begin() as conn:
+        assert conn.execute(text("SELECT failed FROM llm_usage")).scalars().all() == [0]
@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from core.config import settings
+from core.models import MedicalAccuracyDetail
+from scripts.fake_llm import FakeChatModel
+
+SCENARIO_ID = "scenario_001"
+
+
+class ScriptedChatModel(FakeChatModel):
+    """FakeChatModel that refuses any prompt containing FAIL and can hold back the medical specialist"""
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    medical_delay: float = 0.0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, response_schema=None, **kwargs):
+        if response_schema is MedicalAccuracyDetail:
+            await asyncio.sleep(self.medical_delay)
+        if any("FAIL" in str(message.content) for message in messages):
+            raise ValueError("model refused")
+        return await super()._agenerate(messages, stop, run_manager, response_schema=response_schema, **kwargs)
+
+
+@pytest.fixture
+def container(engine):
+    from core.container import AppContainer
+
+    container = AppContainer(engine=engine, llm=ScriptedChatModel())
+    yield container
+    container.storage_service.close()
+
+
+@pytest.fixture
+def post(container):
+    import main
+
+    main.app.state.container = container
+
+    def post(path: str, payload: dict):
+        async def request():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.post(f"{settings.api_v1_str}{path}", json=payload)
+        return asyncio.run(request())
+
+    yield post
+    main.app.state.container = None
+
+
+def test_batch_reports_each_item(container, post):
+    items = [
+        {"scenario_id": SCENARIO_ID, "user_response": "Hello, I'm your nurse today.", "user_id": "u1"},
+        {"scenario_id": "no_such_scenario", "user_response": "Hello", "user_id": "u1"},
+        {"scenario_id": SCENARIO_ID, "user_response": "FAIL this one", "user_id": "u2"},
+        {"scenario_id": SCENARIO_ID, "user_response": "Can you tell me where it hurts?", "user_id": "u2"},
+    ]
+    response = post("/practice/submit_batch", {"items": items, "max_concurrency": 2})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["succeeded"], body["failed"]) == (2, 2)
+
+    results = body["results"]
+    assert [result["index"] for result in results] == [0, 1, 2, 3]
+    assert [result["user_id"] for result in results] == ["u1", "u1", "u2", "u2"]
+    assert results[1]["error"] == "Scenario not found"
+    assert "model refused" in results[2]["error"]
+    assert results[0]["error"] is None and results[3]["error"] is None
+
+    # Successful items are saved, failed ones are not
+    saved = [results[0]["feedback"]["attempt_id"], results[3]["feedback"]["attempt_id"]]
+    for attempt_id in saved:
+        assert container.storage_service.get_feedback_by_attempt_id(attempt_id) is not None
+    assert sorted(attempt.id for attempt in container.storage_service.get_attempts()) == sorted(saved)
+
+
+def test_batch_limits(post, monkeypatch):
+    monkeypatch.setattr(settings, "batch_max_items", 2)
+    item = {"scenario_id": SCENARIO_ID, "user_response": "Hello"}
+    assert post("/practice/submit_batch", {"items": [item] * 3}).status_code == 413
+    assert post("/practice/submit_batch", {"items": []}).status_code == 422
+    assert post("/practice/submit_batch", {"items": [item], "max_concurrency": 0}).status_code == 422
+
+
+def sse_events(response) -> list:
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_sends_each_specialist_as_it_finishes(container, post):
+    container.llm.medical_delay = 0.2
+    response = post("/practice/submit_stream", {"scenario_id": SCENARIO_ID, "user_response": "Hello, I'm Sam."})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = sse_events(response)
+    assert [name for name, _ in events] == ["communication", "medical_accuracy", "feedback"]
+    communication, medical, feedback = (data for _, data in events)
+    assert set(communication) == {"communication_clarity", "empathy_tone", "completeness"}
+    # The partial events carry the same values as the final feedback
+    for partial, dimension in ((medical, "medical_accuracy"), (communication, "empathy_tone")):
+        for field in ("score", "explanation"):
+            assert feedback[dimension][field] == partial[dimension][field]
+    assert container.storage_service.get_feedback_by_attempt_id(feedback["attempt_id"]) is not None
+
+
+def test_stream_ends_with_an_error_event(container, post):
+    response = post("/practice/submit_stream", {"scenario_id": SCENARIO_ID, "user_response": "FAIL"})
+    events = sse_events(response)
+    assert events[-1][0] == "error"
+    assert "model refused" in events[-1][1]["detail"]
+    assert "feedback" not in [name for name, _ in events]
+    assert container.storage_service.get_attempts() == []
+
+
+def test_stream_unknown_scenario_is_404(post):
+    assert post("/practice/submit_stream", {"scenario_id": "no_such_scenario", "user_response": "Hi"}).status_code == 404
@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+import time
+
+from core.config import settings
+from core.database import create_db_engine
+from core.migrations import run_migrations
+from core.models import FeedbackAnalysis, PracticeAttempt, ScoreDetail
+from services.result_writer import JsonResultWriter
+from services.storage_service import StorageService
+
+
+def make_result(user_id: str = "user_1", scenario_id: str = "scenario_1", score: float = 7):
+    attempt = PracticeAttempt(scenario_id=scenario_id, user_response="Hello", user_id=user_id)
+    detail = ScoreDetail(score=score, explanation="Clear", strengths=[], improvements=[])
+    feedback = FeedbackAnalysis(
+        attempt_id=attempt.id, scenario_id=scenario_id, medical_accuracy=detail, communication_clarity=detail,
+        empathy_tone=detail, completeness=detail, overall_score=score, general_feedback=""
+    )
+    return attempt, feedback
+
+
+def test_write_behind_defers_writes_until_flushed():
+    written, summaries = [], []
+    release = threading.Event()
+
+    def save_json(data, path):
+        release.wait(5)
+        written.append(path)
+        return True
+
+    writer = JsonResultWriter(save_json, summaries.extend, write_behind=True, batch_size=10)
+    writer.write_many([({"n": 1}, "a.json"), ({"n": 2}, "b.json")], [("2024-01-01",)])
+    assert written == []
+
+    release.set()
+    writer.flush()
+    assert written == ["a.json", "b.json"]
+    assert summaries == [("2024-01-01",)]
+    metrics = writer.metrics()
+    assert metrics["written"] == 3
+    assert metrics["queue_depth"] == 0
+    writer.close()
+
+
+def test_full_queue_falls_back_to_a_synchronous_write():
+    written = []
+    release = threading.Event()
+
+    def save_json(data, path):
+        if path == "first.json":
+            release.wait(5)
+        written.append(path)
+        return True
+
+    writer = JsonResultWriter(save_json, lambda entries: None, write_behind=True, queue_size=1, batch_size=1)
+    writer.write_json({}, "first.json")
+    # Once the thread is blocked on the first file, fill the queue and overflow it
+    while writer.metrics()["queue_depth"]:
+        time.sleep(0.001)
+    writer.write_json({}, "queued.json")
+    writer.write_json({}, "overflow.json")
+    assert written == ["overflow.json"]
+    release.set()
+    writer.close()
+    assert sorted(written) == ["first.json", "overflow.json", "queued.json"]
+    assert writer.metrics()["sync_fallbacks"] == 1
+
+
+def test_writes_after_close_happen_inline():
+    written = []
+    writer = JsonResultWriter(lambda data, path: written.append(path) or True, lambda entries: None,
+                              write_behind=True)
+    writer.close()
+    writer.write_json({}, "late.json")
+    assert written == ["late.json"]
+
+
+def test_each_storage_service_writes_its_own_results(tmp_path, monkeypatch):
+    services = []
+    for name in ("one", "two"):
+        monkeypatch.setattr(settings, "results_dir", str(tmp_path / name))
+        engine = create_db_engine(f"sqlite:///{tmp_path / name}.db")
+        run_migrations(engine)
+        services.append(StorageService(engine=engine))
+    one, two = services
+    assert one.writer is not two.writer
+
+    attempt, feedback = make_result()
+    assert two.save_result(attempt, feedback)
+    two.close()
+    one.close()
+
+    date = feedback.timestamp.strftime("%Y-%m-%d")
+    summary_name = f"summary_{date}.json"
+    assert not os.path.exists(os.path.join(one.results_dir, "daily_summaries", summary_name))
+    with open(os.path.join(two.results_dir, "daily_summaries", summary_name)) as f:
+        assert json.load(f)["total_attempts"] == 1
+    assert os.path.exists(os.path.join(two.results_dir, "attempts", f"{attempt.id}.json"))
+    for service in services:
+        service.engine.dispose()
@@ -0,0 +1,70 @@
+import asyncio
+import base64
+
+import httpx
+import pytest
+
+from core.config import settings
+from scripts.fake_llm import FakeChatModel
+from core.models import FeedbackAnalysis, PracticeAttempt, ScoreDetail
+
+
+def make_result(user_id: str = "user_1", scenario_id: str = "scenario_1"):
+    attempt = PracticeAttempt(scenario_id=scenario_id, user_response="Hello, how are you feeling?", user_id=user_id)
+    detail = ScoreDetail(score=7, explanation="Clear introduction", strengths=[], improvements=["Check understanding"])
+    feedback = FeedbackAnalysis(
+        attempt_id=attempt.id, scenario_id=scenario_id, medical_accuracy=detail, communication_clarity=detail,
+        empathy_tone=detail, completeness=detail, overall_score=7, general_feedback="Good start"
+    )
+    return attempt, feedback
+
+
+@pytest.fixture
+def container(engine):
+    from core.container import AppContainer
+
+    return AppContainer(engine=engine, llm=FakeChatModel())
+
+
+@pytest.fixture
+def get(container):
+    import main
+
+    main.app.state.container = container
+
+    def get(path: str, **params):
+        async def request():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.get(f"{settings.api_v1_str}{path}", params=params)
+        return asyncio.run(request())
+
+    yield get
+    main.app.state.container = None
+
+
+@pytest.mark.parametrize("path", ["/results/feedback", "/results/attempts"])
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor",
+    base64.urlsafe_b64encode(b'{"not": "a list"}').decode(),
+    base64.urlsafe_b64encode(b'["yesterday", 1]').decode(),
+])
+def test_invalid_cursor_returns_400(get, path, cursor):
+    response = get(path, cursor=cursor)
+    assert response.status_code == 400
+    assert "Invalid cursor" in response.json()["detail"]
+
+
+def test_cursor_pages_through_every_result(container, get):
+    saved = [make_result(user_id=f"user_{i}") for i in range(5)]
+    assert container.storage_service.save_results(saved)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = get("/results/feedback", **params).json()
+        seen.extend(item["attempt_id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(feedback.attempt_id for _, feedback in saved)
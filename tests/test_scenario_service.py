@@ -0,0 +1,99 @@
+import json
+import os
+
+import pytest
+
+from core.config import settings
+from core.models import Scenario
+from services.scenario_service import ScenarioService
+
+
+def scenario_data(scenario_id: str, title: str = "Title", difficulty: str = "beginner",
+                  medical_area: str = "Cardiology", patient_type: str = "Adult") -> dict:
+    return {
+        "id": scenario_id, "title": title, "description": "", "context": "", "difficulty": difficulty,
+        "medical_area": medical_area, "patient_type": patient_type, "key_points": ["Introduce yourself"],
+    }
+
+
+def write(directory, filename: str, data: dict, mtime: float = None):
+    path = os.path.join(directory, filename)
+    with open(path, "w") as f:
+        json.dump(data, f)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def scenarios_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "scenarios_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "scenario_refresh_interval", 0)
+    return str(tmp_path)
+
+
+def test_lookups_use_the_catalog(scenarios_dir):
+    write(scenarios_dir, "b.json", scenario_data("s2", difficulty="advanced", medical_area="Oncology"))
+    write(scenarios_dir, "a.json", scenario_data("s1", patient_type="Child"))
+    write(scenarios_dir, "broken.json", {"id": "s3"})
+    service = ScenarioService()
+
+    assert [s.id for s in service.get_all_scenarios()] == ["s1", "s2"]
+    assert service.get_scenario("s2").medical_area == "Oncology"
+    assert service.get_scenario("s3") is None
+    assert [s.id for s in service.find_scenarios(medical_area="cardiology")] == ["s1"]
+    assert [s.id for s in service.find_scenarios(difficulty="advanced", patient_type="adult")] == ["s2"]
+    assert service.find_scenarios(difficulty="advanced", patient_type="child") == []
+
+
+def test_refresh_reloads_changed_and_removed_files(scenarios_dir):
+    write(scenarios_dir, "a.json", scenario_data("s1", title="Old"), mtime=1_000_000)
+    write(scenarios_dir, "b.json", scenario_data("s2"))
+    service = ScenarioService()
+
+    write(scenarios_dir, "a.json", scenario_data("s1", title="New", difficulty="advanced"), mtime=2_000_000)
+    os.remove(os.path.join(scenarios_dir, "b.json"))
+    assert service.refresh() == 2
+    assert service.get_scenario("s1").title == "New"
+    assert service.get_scenario("s2") is None
+    assert [s.id for s in service.find_scenarios(difficulty="advanced")] == ["s1"]
+    assert service.find_scenarios(difficulty="beginner") == []
+    assert service.refresh() == 0
+
+
+def test_duplicate_ids_pick_one_file_deterministically(scenarios_dir, capsys):
+    write(scenarios_dir, "z_copy.json", scenario_data("s1", title="Copy", medical_area="Oncology"))
+    write(scenarios_dir, "s1.json", scenario_data("s1", title="Original"))
+    write(scenarios_dir, "a_copy.json", scenario_data("s1", title="Other copy"))
+    service = ScenarioService()
+
+    # The file named after the id wins over files that sort earlier
+    assert service.get_scenario("s1").title == "Original"
+    assert [s.title for s in service.get_all_scenarios()] == ["Original"]
+    assert service.find_scenarios(medical_area="oncology") == []
+    assert "Duplicate scenario id s1" in capsys.readouterr().out
+
+
+def test_removing_a_duplicate_keeps_the_other_file(scenarios_dir):
+    write(scenarios_dir, "a.json", scenario_data("s1", title="A", medical_area="Oncology"))
+    write(scenarios_dir, "b.json", scenario_data("s1", title="B"), mtime=1_000_000)
+    service = ScenarioService()
+    assert service.get_scenario("s1").title == "A"
+
+    os.remove(os.path.join(scenarios_dir, "a.json"))
+    service.refresh()
+    assert service.get_scenario("s1").title == "B"
+    assert [s.id for s in service.find_scenarios(medical_area="cardiology")] == ["s1"]
+    assert service.find_scenarios(medical_area="oncology") == []
+
+    # Reloading the remaining file doesn't lose the id either
+    write(scenarios_dir, "b.json", scenario_data("s1", title="B2"), mtime=2_000_000)
+    service.refresh()
+    assert service.get_scenario("s1").title == "B2"
+
+
+def test_saved_scenarios_are_served_at_once(scenarios_dir):
+    service = ScenarioService()
+    scenario = Scenario(**scenario_data("s9", title="Saved"))
+    assert service.save_scenario(scenario)
+    assert service.get_scenario("s9") == scenario
+    assert service.refresh() == 0
@@ -0,0 +1,186 @@
+import array
+import asyncio
+import base64
+import io
+import wave
+
+import pytest
+from starlette.datastructures import UploadFile
+
+from core.config import settings
+from services.llm_cache import LLMResponseCache, MemoryCacheBackend
+from services.llm_calls import LLMCallPolicy
+from services.llm_scheduler import LLMScheduler
+from services.transcription_service import TranscriptionService, plan_chunks, read_wav_chunk
+
+RATE = 8000
+
+
+def write_wav(path, segments):
+    """segments: (seconds, amplitude) pairs; amplitude 0 is silence"""
+    samples = array.array("h")
+    for seconds, amplitude in segments:
+        count = int(seconds * RATE)
+        samples.extend((amplitude if n % 2 else -amplitude) for n in range(count))
+    with wave.open(str(path), "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(RATE)
+        writer.writeframes(samples.tobytes())
+    return str(path)
+
+
+class Response:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeClient:
+    """Answers with the number of frames in the audio, after an optional behaviour for the n-th call"""
+
+    model_name = "fake"
+
+    def __init__(self, behave=None):
+        self.behave = behave
+        self.calls = 0
+
+    async def ainvoke(self, messages, config=None):
+        self.calls += 1
+        call = self.calls
+        if self.behave is not None:
+            await self.behave(call)
+        audio_url = messages[0].content[1]["image_url"]["url"]
+        with wave.open(io.BytesIO(base64.b64decode(audio_url.split(",", 1)[1])), "rb") as reader:
+            return Response(str(reader.getnframes()))
+
+
+def make_service(client, transcript_cache=None):
+    scheduler = LLMScheduler(max_concurrency=8, min_concurrency=1, rate=0, max_queued=10,
+                             latency_threshold=0, processes=1)
+    return TranscriptionService(client=client, transcript_cache=transcript_cache,
+                                call_policy=LLMCallPolicy(scheduler, max_retries=0, hedging=False))
+
+
+def test_chunks_end_in_the_middle_of_pauses(tmp_path):
+    path = write_wav(tmp_path / "speech.wav", [(1.5, 8000), (0.5, 0), (1.5, 8000), (0.5, 0), (1.0, 8000)])
+    chunks = plan_chunks(path, chunk_seconds=1.0, max_chunk_seconds=3.0,
+                         silence_threshold=0.01, min_silence_ms=300)
+    assert len(chunks) == 3
+    assert chunks[0][0] == 0 and chunks[-1][1] == 5 * RATE
+    assert all(end == next_start for (_, end), (next_start, _) in zip(chunks, chunks[1:]))
+    # Each cut lands inside a pause
+    for cut, (pause_start, pause_end) in zip([end for _, end in chunks[:-1]], [(1.5, 2.0), (3.5, 4.0)]):
+        assert pause_start * RATE < cut < pause_end * RATE
+
+
+def test_speech_without_pauses_is_cut_at_the_maximum(tmp_path):
+    path = write_wav(tmp_path / "speech.wav", [(5.0, 8000)])
+    chunks = plan_chunks(path, chunk_seconds=1.0, max_chunk_seconds=2.0,
+                         silence_threshold=0.01, min_silence_ms=300)
+    assert [end - start for start, end in chunks][:2] == [pytest.approx(2 * RATE, abs=RATE * 0.05)] * 2
+    assert chunks[-1][1] == 5 * RATE
+
+
+def test_short_recordings_are_one_chunk(tmp_path):
+    path = write_wav(tmp_path / "speech.wav", [(1.0, 8000), (0.5, 0), (1.0, 8000)])
+    assert plan_chunks(path, 1.0, 3.0, 0.01, 300) == [(0, int(2.5 * RATE))]
+
+
+def test_read_wav_chunk_is_a_standalone_wav(tmp_path):
+    path = write_wav(tmp_path / "speech.wav", [(1.0, 8000), (1.0, 0)])
+    with wave.open(io.BytesIO(read_wav_chunk(path, RATE // 2, RATE + RATE // 2)), "rb") as reader:
+        assert reader.getnframes() == RATE
+        assert reader.getframerate() == RATE
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(settings, "transcription_chunk_seconds", 1.0)
+    monkeypatch.setattr(settings, "transcription_max_chunk_seconds", 3.0)
+    monkeypatch.setattr(settings, "transcription_concurrency", 4)
+
+
+def test_chunk_transcripts_are_joined_in_order(tmp_path, small_chunks):
+    path = write_wav(tmp_path / "speech.wav", [(1.5, 8000), (0.5, 0), (1.5, 8000), (0.5, 0), (1.0, 8000)])
+
+    async def later_calls_finish_first(call):
+        await asyncio.sleep(0.03 / call)
+
+    client = FakeClient(later_calls_finish_first)
+    text = asyncio.run(make_service(client).transcribe_file(path))
+    chunks = plan_chunks(path, 1.0, 3.0, settings.transcription_silence_threshold,
+                         settings.transcription_min_silence_ms)
+    assert len(chunks) == 3
+    assert text == " ".join(str(end - start) for start, end in chunks)
+
+
+def test_a_failed_chunk_cancels_the_others(tmp_path, small_chunks):
+    path = write_wav(tmp_path / "speech.wav", [(1.5, 8000), (0.5, 0), (1.5, 8000), (0.5, 0), (1.0, 8000)])
+    cancelled = []
+
+    async def first_call_fails(call):
+        if call == 1:
+            await asyncio.sleep(0.01)
+            raise ValueError("bad audio")
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(call)
+            raise
+
+    service = make_service(FakeClient(first_call_fails))
+
+    async def main():
+        assert await asyncio.wait_for(service.transcribe_file(path), 2) == ""
+        # Stopped before transcribe_file returned, not when the loop shuts down
+        assert sorted(cancelled) == [2, 3]
+        assert service.llm_calls.scheduler.stats()["in_flight"] == 0
+
+    asyncio.run(main())
+
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "spool"
+    directory.mkdir()
+    monkeypatch.setattr(settings, "upload_spool_dir", str(directory))
+    return directory
+
+
+def upload(path, filename="recording.wav"):
+    with open(path, "rb") as f:
+        return UploadFile(file=io.BytesIO(f.read()), filename=filename)
+
+
+def test_resent_audio_is_served_from_the_transcript_cache(tmp_path, spool_dir):
+    one = write_wav(tmp_path / "one.wav", [(1.0, 8000)])
+    two = write_wav(tmp_path / "two.wav", [(1.5, 8000)])
+    client = FakeClient()
+    cache = LLMResponseCache(MemoryCacheBackend())
+    service = make_service(client, cache)
+
+    assert asyncio.run(service.transcribe_upload(upload(one))) == (str(RATE), False)
+    # Same bytes under another name are a hit; the model is not called again
+    assert asyncio.run(service.transcribe_upload(upload(one, "again.wav"))) == (str(RATE), True)
+    assert client.calls == 1
+    assert asyncio.run(service.transcribe_upload(upload(two))) == (str(int(1.5 * RATE)), False)
+    assert client.calls == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert list(spool_dir.iterdir()) == []
+
+
+def test_failed_transcriptions_are_not_cached(tmp_path, spool_dir):
+    path = write_wav(tmp_path / "speech.wav", [(1.0, 8000)])
+
+    async def first_call_fails(call):
+        if call == 1:
+            raise ValueError("bad audio")
+
+    client = FakeClient(first_call_fails)
+    cache = LLMResponseCache(MemoryCacheBackend())
+    service = make_service(client, cache)
+
+    assert asyncio.run(service.transcribe_upload(upload(path))) == ("", False)
+    assert asyncio.run(service.transcribe_upload(upload(path))) == (str(RATE), False)
+    assert asyncio.run(service.transcribe_upload(upload(path))) == (str(RATE), True)
+    assert client.calls == 2
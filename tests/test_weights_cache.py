@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core.models import ScenarioWeights
+from services.weights_cache_service import ScenarioWeightsCache
+
+WEIGHTS = ScenarioWeights(medical_accuracy=0.4, communication_clarity=0.2, empathy_tone=0.2,
+                          completeness=0.2, rationale="Clinical scenario")
+
+
+def test_concurrent_threads_generate_once(session_factory):
+    cache = ScenarioWeightsCache(session_factory)
+    calls = []
+
+    def factory():
+        calls.append(1)
+        time.sleep(0.05)
+        return WEIGHTS
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_create("key", factory)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [WEIGHTS] * 5
+
+
+def test_concurrent_coroutines_generate_once(session_factory):
+    cache = ScenarioWeightsCache(session_factory)
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return WEIGHTS
+
+    async def main():
+        return await asyncio.gather(*(cache.aget_or_create("key", factory) for _ in range(5)))
+
+    assert asyncio.run(main()) == [WEIGHTS] * 5
+    assert len(calls) == 1
+    # Another instance (another process) reads the stored weights without generating them
+    assert ScenarioWeightsCache(session_factory).get("key") == WEIGHTS
+
+
+def test_cancelled_caller_does_not_cancel_other_waiters(session_factory):
+    cache = ScenarioWeightsCache(session_factory)
+
+    async def main():
+        started = asyncio.Event()
+        finish = asyncio.Event()
+
+        async def factory():
+            started.set()
+            await finish.wait()
+            return WEIGHTS
+
+        first = asyncio.create_task(cache.aget_or_create("key", factory))
+        await started.wait()
+        second = asyncio.create_task(cache.aget_or_create("key", factory))
+        await asyncio.sleep(0)
+
+        # The caller that started the resolution goes away
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        finish.set()
+        return await second
+
+    assert asyncio.run(main()) == WEIGHTS
+    assert cache.get("key") == WEIGHTS
+
+
+def test_failed_generation_releases_the_lease(session_factory):
+    cache = ScenarioWeightsCache(session_factory)
+
+    def failing():
+        raise ValueError("bad output")
+
+    with pytest.raises(ValueError):
+        cache.get_or_create("key", failing)
+    # The next caller is not kept waiting on the abandoned lease
+    assert cache.get_or_create("key", lambda: WEIGHTS) == WEIGHTS
+
+
+def test_memory_entries_expire_so_invalidations_are_seen(session_factory):
+    cache = ScenarioWeightsCache(session_factory)
+    cache.set("key", WEIGHTS)
+    ScenarioWeightsCache(session_factory).invalidate("key")
+    assert cache.get("key") == WEIGHTS
+
+    cache.memory_ttl = 0
+    assert cache.get("key") is None